@@ -0,0 +1,41 @@
+"""
+Helpers shared by the AI engines and the backend that drives them
+"""
+
+import json
+import time
+import hashlib
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Optional
+
+def canonical_digest(payload: Dict) -> str:
+    """Stable SHA-256 digest of a JSON-serialisable payload (key order independent)"""
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+def derive_seed(payload: Dict, seed: Optional[int] = None) -> int:
+    """Derive a 64-bit RNG seed from an explicit seed or the canonical hash of the inputs
+
+    Valid for both ``numpy.random.default_rng`` and ``torch.Generator.manual_seed``.
+    """
+    if seed is not None:
+        return int(seed) & 0xFFFFFFFFFFFFFFFF
+    return int(canonical_digest(payload)[:16], 16)
+
+# Stage observers are called as ``observer(stage, seconds, ok)`` after each pipeline stage
+StageObserver = Callable[[str, float, bool], None]
+_UNTIMED = nullcontext()
+
+@contextmanager
+def _timed(observer: StageObserver, stage: str):
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        observer(stage, time.perf_counter() - start, ok)
+
+def timed_stage(observer: Optional[StageObserver], stage: str):
+    """Context manager reporting the stage's duration to ``observer``; a shared no-op when it is None"""
+    return _UNTIMED if observer is None else _timed(observer, stage)
@@ -7,11 +7,15 @@ Integrates with Django backend to generate optimized building designs
 import torch
 import torch.nn as nn
 import json
+import time
+import hashlib
 import numpy as np
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
 import logging
 
+from engine_common import StageObserver, derive_seed, timed_stage
+
 logger = logging.getLogger(__name__)
 
 class DesignGeneratorModel(nn.Module):
@@ -131,12 +135,16 @@ class DesignInferenceEngine:
         with open(config_path, 'r') as f:
             self.config = json.load(f)
         
-        # Initialize model
-        self.model = DesignGeneratorModel(
-            input_dim=self.config['input_dim'],
-            hidden_dim=self.config['hidden_dim'],
-            output_dim=self.config['output_dim']
-        )
+        # Initialize model (seeded so untrained weights are reproducible too)
+        architecture = self.config.get('architecture', self.config)
+        self.model_input_dim = architecture['input_dim']
+        with torch.random.fork_rng(devices=[]):
+            torch.manual_seed(self.config.get('init_seed', 0))
+            self.model = DesignGeneratorModel(
+                input_dim=architecture['input_dim'],
+                hidden_dim=architecture['hidden_dim'],
+                output_dim=architecture['output_dim']
+            )
         
         # Load trained weights
         if Path(model_path).exists():
@@ -148,6 +156,24 @@ class DesignInferenceEngine:
         
         self.model.to(self.device)
         self.model.eval()
+        
+        # Optional per-stage latency hook (None keeps inference untimed)
+        self.stage_observer: Optional[StageObserver] = None
+    
+    @property
+    def version(self) -> str:
+        """Model version, used to label metrics"""
+        return str(self.config.get('version', '0'))
+    
+    def freeze(self) -> 'DesignInferenceEngine':
+        """Make the weights read-only for inference so forked workers can share them"""
+        for parameter in self.model.parameters():
+            parameter.requires_grad_(False)
+        self.model.eval()
+        return self
+    
+    def _stage(self, stage: str):
+        return timed_stage(self.stage_observer, stage)
     
     def preprocess_requirements(self, requirements: Dict) -> torch.Tensor:
         """Convert user requirements to model input tensor"""
@@ -224,7 +250,7 @@ class DesignInferenceEngine:
         total_area = sum(room['area'] for room in room_list)
         
         design = {
-            'id': f'design_{hash(str(layout[:10]))}',
+            'id': f"design_{hashlib.sha1(layout[:10].tobytes()).hexdigest()[:12]}",
             'name': f"{requirements.get('bedrooms', 3)}BR {requirements.get('style', 'Modern').title()} House",
             'description': f"AI-generated {requirements.get('bedrooms', 3)}-bedroom house design",
             'rooms': room_list,
@@ -234,9 +260,9 @@ class DesignInferenceEngine:
             'style': requirements.get('style', 'modern'),
             'estimated_cost': self._estimate_cost(total_area, requirements),
             'setbacks': {
-                'front': 3.0 + abs(layout[0]) * 2,
-                'rear': 3.0 + abs(layout[1]) * 2,
-                'side': 1.5 + abs(layout[2]) * 1,
+                'front': 3.0 + abs(float(layout[0])) * 2,
+                'rear': 3.0 + abs(float(layout[1])) * 2,
+                'side': 1.5 + abs(float(layout[2])) * 1,
             },
             'features': {
                 'garage': requirements.get('has_garage', False),
@@ -287,33 +313,50 @@ class DesignInferenceEngine:
             'cost_per_sqm': cost_per_sqm * multiplier
         }
     
-    def generate_design(self, requirements: Dict) -> List[Dict]:
-        """Generate multiple design options based on requirements"""
-        designs = []
+    def iter_designs(self, requirements: Dict, num_variations: int = 3,
+                     seed: Optional[int] = None, deadline: Optional[float] = None) -> Iterator[Dict]:
+        """Yield design options one at a time, each decoded and validated
+        
+        Variation noise comes from a per-request ``torch.Generator`` seeded with
+        ``seed`` or the canonical hash of ``requirements``, so the same
+        requirements always produce the same options. With a ``deadline``
+        (``time.monotonic()`` value) no new option is started once it has passed.
+        """
+        # Draw the noise for every variation in one block from a private generator
+        generator = torch.Generator(device='cpu')
+        generator.manual_seed(derive_seed(requirements, seed))
+        noise_block = torch.randn(
+            (max(num_variations - 1, 0), self.model_input_dim), generator=generator
+        ) * 0.1
         
-        # Generate 3 design variations
-        for i in range(3):
+        for i in range(num_variations):
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError("Design generation exceeded its inference timeout")
+            
             # Add some randomness for variation
             varied_requirements = requirements.copy()
             varied_requirements['variation_seed'] = i
             
             # Preprocess input
-            input_tensor = self.preprocess_requirements(varied_requirements)
+            with self._stage('preprocess_requirements'):
+                input_tensor = self.preprocess_requirements(varied_requirements)
             
             # Add noise for variation
             if i > 0:
-                noise = torch.randn_like(input_tensor) * 0.1
+                noise = noise_block[i - 1].unsqueeze(0).to(self.device)
                 input_tensor = input_tensor + noise
             
             # Generate design
-            with torch.no_grad():
+            with self._stage('forward'), torch.no_grad():
                 layout_output, rooms_output = self.model(input_tensor)
             
             # Postprocess output
-            design = self.postprocess_output(layout_output, rooms_output, varied_requirements)
+            with self._stage('postprocess_output'):
+                design = self.postprocess_output(layout_output, rooms_output, varied_requirements)
             
             # Validate against building codes
-            validation = self.validator.validate_design(design)
+            with self._stage('validate_design'):
+                validation = self.validator.validate_design(design)
             design['validation'] = validation
             
             # Adjust name for variations
@@ -321,7 +364,12 @@ class DesignInferenceEngine:
                 design['name'] += f" - Option {i+1}"
                 design['id'] += f"_opt{i+1}"
             
-            designs.append(design)
+            yield design
+    
+    def generate_design(self, requirements: Dict, seed: Optional[int] = None,
+                        num_variations: int = 3, deadline: Optional[float] = None) -> List[Dict]:
+        """Generate multiple design options based on requirements"""
+        designs = list(self.iter_designs(requirements, num_variations, seed, deadline))
         
         # Sort by compliance score
         designs.sort(key=lambda x: x['validation']['compliance_score'], reverse=True)
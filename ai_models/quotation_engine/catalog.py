@@ -0,0 +1,380 @@
+"""
+Columnar Price Catalog for the Quotation Engine
+Loads item prices, location factors and supplier factors from CSV/Parquet files
+(or in-memory records), caches them as memory-mapped numpy columns and hot-swaps
+the in-memory arrays when the source files change.
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import numpy as np
+from typing import Dict, List, Optional, Iterable
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Built-in catalog used when no catalog files are configured
+DEFAULT_BASE_PRICES = {
+    'concrete': {
+        'C001': 8500,  # KES per m3
+        'C002': 9200,
+        'C003': 10000
+    },
+    'steel': {
+        'S001': 83,  # KES per kg
+        'S002': 85,
+        'S003': 90
+    },
+    'blocks': {
+        'B001': 45  # KES per block
+    },
+    'roofing': {
+        'R001': 850  # KES per sheet
+    },
+    'finishing': {
+        'F001': 450,  # KES per liter
+        'F002': 1200  # KES per m2
+    },
+    'electrical': {
+        'E001': 25000  # KES per room
+    },
+    'plumbing': {
+        'P001': 35000  # KES per bathroom
+    }
+}
+
+DEFAULT_LOCATION_FACTORS = {
+    'nairobi': 1.0,
+    'mombasa': 1.05,
+    'nakuru': 0.95,
+    'kisumu': 0.90,
+    'eldoret': 0.88,
+    'default': 0.92
+}
+
+DEFAULT_SUPPLIER_FACTORS = {
+    'SUP001': 0.98,  # Bulk supplier - lower prices
+    'SUP002': 1.02,  # Premium supplier - higher prices
+    'SUP003': 1.05,  # Specialty supplier
+    'default': 1.0
+}
+
+# Accepted column names in catalog files, first match wins
+ITEM_CODE_COLUMNS = ('item_code', 'material_id', 'item_id')
+PRICE_COLUMNS = ('base_price', 'unit_price', 'price')
+FACTOR_COLUMNS = ('factor', 'location_factor', 'supplier_factor')
+
+COLUMN_FILES = (
+    'item_code', 'item_category', 'item_price',
+    'location_key', 'location_factor',
+    'supplier_key', 'supplier_factor',
+)
+
+
+class CatalogArrays:
+    """Immutable snapshot of the catalog columns
+
+    Keys are stored sorted as fixed-width byte strings so lookups are a
+    ``np.searchsorted`` over a (possibly memory-mapped) array.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], version: str):
+        self.item_code = columns['item_code']
+        self.item_category = columns['item_category']
+        self.item_price = columns['item_price']
+        self.location_key = columns['location_key']
+        self.location_factor = columns['location_factor']
+        self.supplier_key = columns['supplier_key']
+        self.supplier_factor = columns['supplier_factor']
+        self.version = version
+
+    @staticmethod
+    def _find(keys: np.ndarray, values: Iterable[str]) -> np.ndarray:
+        """Vectorized key lookup, returns row index or -1 when missing"""
+        queries = np.array(list(values), dtype=np.bytes_)
+        if len(keys) == 0 or len(queries) == 0:
+            return np.full(len(queries), -1, dtype=np.int64)
+        positions = np.searchsorted(keys, queries)
+        positions = np.minimum(positions, len(keys) - 1)
+        found = keys[positions] == queries
+        return np.where(found, positions, -1)
+
+    def item_rows(self, item_codes: Iterable[str]) -> np.ndarray:
+        return self._find(self.item_code, (code.encode('utf-8') for code in item_codes))
+
+    def location_rows(self, locations: Iterable[str]) -> np.ndarray:
+        return self._find(self.location_key, (loc.lower().encode('utf-8') for loc in locations))
+
+    def supplier_rows(self, supplier_ids: Iterable[str]) -> np.ndarray:
+        return self._find(self.supplier_key, (sid.encode('utf-8') for sid in supplier_ids))
+
+
+def _to_columns(items: List[Dict], location_factors: Dict[str, float],
+                supplier_factors: Dict[str, float]) -> Dict[str, np.ndarray]:
+    """Build sorted, fixed-width columns from plain records"""
+    by_code = {}
+    for item in items:
+        by_code[str(item['item_code'])] = (str(item.get('category', '')), float(item['base_price']))
+
+    codes = sorted(by_code)
+    locations = sorted((str(k).lower(), float(v)) for k, v in location_factors.items())
+    suppliers = sorted((str(k), float(v)) for k, v in supplier_factors.items())
+
+    return {
+        'item_code': np.array([c.encode('utf-8') for c in codes], dtype=np.bytes_),
+        'item_category': np.array([by_code[c][0].encode('utf-8') for c in codes], dtype=np.bytes_),
+        'item_price': np.array([by_code[c][1] for c in codes], dtype=np.float64),
+        'location_key': np.array([k.encode('utf-8') for k, _ in locations], dtype=np.bytes_),
+        'location_factor': np.array([v for _, v in locations], dtype=np.float64),
+        'supplier_key': np.array([k.encode('utf-8') for k, _ in suppliers], dtype=np.bytes_),
+        'supplier_factor': np.array([v for _, v in suppliers], dtype=np.float64),
+    }
+
+
+def _pick_column(frame, candidates) -> str:
+    for name in candidates:
+        if name in frame.columns:
+            return name
+    raise ValueError(f"Catalog file is missing one of the columns {list(candidates)}")
+
+
+def _read_table(path: Path):
+    """Read a CSV or Parquet table with pandas (imported lazily)"""
+    import pandas as pd
+
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+
+def read_item_prices(path: Path) -> List[Dict]:
+    """Read item prices; rows repeated per supplier collapse to the median price"""
+    frame = _read_table(path)
+    code_col = _pick_column(frame, ITEM_CODE_COLUMNS)
+    price_col = _pick_column(frame, PRICE_COLUMNS)
+    if 'category' not in frame.columns:
+        frame['category'] = ''
+    frame['category'] = frame['category'].fillna('').astype(str)
+    frame[code_col] = frame[code_col].astype(str)
+
+    grouped = frame.groupby(code_col, sort=True).agg(
+        category=('category', 'first'), base_price=(price_col, 'median')
+    )
+    return [
+        {'item_code': row.Index, 'category': row.category, 'base_price': row.base_price}
+        for row in grouped.itertuples()
+    ]
+
+
+def read_factors(path: Path, key_columns) -> Dict[str, float]:
+    frame = _read_table(path)
+    key_col = _pick_column(frame, key_columns)
+    factor_col = _pick_column(frame, FACTOR_COLUMNS)
+    return dict(zip(frame[key_col].astype(str), frame[factor_col].astype(float)))
+
+
+class PriceCatalog:
+    """Price catalog with a memory-mapped columnar cache and hot reload"""
+
+    def __init__(self, items_path: Optional[str] = None,
+                 location_factors_path: Optional[str] = None,
+                 supplier_factors_path: Optional[str] = None,
+                 cache_dir: Optional[str] = None, reload_interval: float = 30.0):
+        self.sources = {
+            'items': Path(items_path) if items_path else None,
+            'location_factors': Path(location_factors_path) if location_factors_path else None,
+            'supplier_factors': Path(supplier_factors_path) if supplier_factors_path else None,
+        }
+        self.cache_dir = Path(cache_dir or os.path.join(tempfile.gettempdir(), 'jmss_price_catalog'))
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._source_signature = None
+        self._arrays: Optional[CatalogArrays] = None
+        self.reload(force=True)
+
+    @classmethod
+    def from_config(cls, catalog_config: Optional[Dict], base_dir: Optional[Path] = None) -> 'PriceCatalog':
+        """Create a catalog from the ``pricing_model.catalog`` config section"""
+        catalog_config = catalog_config or {}
+
+        def resolve(key):
+            value = catalog_config.get(key)
+            if not value:
+                return None
+            path = Path(value)
+            return str(path if path.is_absolute() or base_dir is None else base_dir / path)
+
+        return cls(
+            items_path=resolve('items'),
+            location_factors_path=resolve('location_factors'),
+            supplier_factors_path=resolve('supplier_factors'),
+            cache_dir=resolve('cache_dir'),
+            reload_interval=catalog_config.get('reload_interval', 30.0)
+        )
+
+    @classmethod
+    def from_records(cls, items: List[Dict], location_factors: Optional[Dict[str, float]] = None,
+                     supplier_factors: Optional[Dict[str, float]] = None) -> 'PriceCatalog':
+        """Create an in-memory catalog from records (e.g. the Material/MaterialItem tables)"""
+        catalog = cls(reload_interval=float('inf'))
+        catalog.swap(items, location_factors, supplier_factors)
+        return catalog
+
+    @property
+    def arrays(self) -> CatalogArrays:
+        """Current snapshot; checks the sources for changes at most every ``reload_interval``"""
+        if time.monotonic() - self._last_check >= self.reload_interval:
+            self.reload()
+        return self._arrays
+
+    @property
+    def version(self) -> str:
+        return self.arrays.version
+
+    def swap(self, items: List[Dict], location_factors: Optional[Dict[str, float]] = None,
+             supplier_factors: Optional[Dict[str, float]] = None):
+        """Atomically replace the in-memory catalog with new records"""
+        columns = _to_columns(
+            items,
+            location_factors if location_factors is not None else DEFAULT_LOCATION_FACTORS,
+            supplier_factors if supplier_factors is not None else DEFAULT_SUPPLIER_FACTORS
+        )
+        digest = hashlib.sha256()
+        for name in COLUMN_FILES:
+            digest.update(columns[name].tobytes())
+        self._arrays = CatalogArrays(columns, digest.hexdigest()[:16])
+
+    def _signature(self) -> Optional[str]:
+        """Fingerprint of the source files (path, size, mtime), None when no files are configured"""
+        if all(path is None for path in self.sources.values()):
+            return None
+        parts = []
+        for name, path in sorted(self.sources.items()):
+            if path is None:
+                parts.append(f'{name}:builtin')
+                continue
+            stat = path.stat()
+            parts.append(f'{name}:{path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}')
+        return hashlib.sha256('|'.join(parts).encode('utf-8')).hexdigest()[:16]
+
+    def reload(self, force: bool = False) -> bool:
+        """Reload from the sources if they changed; returns True when the arrays were swapped"""
+        with self._lock:
+            self._last_check = time.monotonic()
+
+            try:
+                signature = self._signature()
+            except OSError as exc:
+                logger.error(f"Price catalog source unavailable, keeping current catalog: {exc}")
+                if self._arrays is None:
+                    self._load_builtin()
+                return False
+
+            if not force and signature == self._source_signature:
+                return False
+
+            if signature is None:
+                self._load_builtin()
+            else:
+                columns = self._load_cached(signature)
+                if columns is None:
+                    columns = self._build_cache(signature)
+                # Single reference assignment: readers see either the old or the new snapshot
+                self._arrays = CatalogArrays(columns, signature)
+                logger.info(f"Loaded price catalog {signature} ({len(columns['item_code'])} items)")
+
+            self._source_signature = signature
+            return True
+
+    def _load_builtin(self):
+        items = [
+            {'item_code': code, 'category': category, 'base_price': price}
+            for category, prices in DEFAULT_BASE_PRICES.items()
+            for code, price in prices.items()
+        ]
+        self.swap(items)
+
+    def _load_cached(self, signature: str) -> Optional[Dict[str, np.ndarray]]:
+        directory = self.cache_dir / signature
+        if not (directory / 'manifest.json').exists():
+            return None
+        try:
+            return {
+                name: np.load(directory / f'{name}.npy', mmap_mode='r')
+                for name in COLUMN_FILES
+            }
+        except (OSError, ValueError) as exc:
+            logger.warning(f"Discarding unreadable catalog cache {directory}: {exc}")
+            return None
+
+    def _build_cache(self, signature: str) -> Dict[str, np.ndarray]:
+        """Convert the sources to .npy columns, publish them atomically and memory-map them"""
+        items_path = self.sources['items']
+        items = read_item_prices(items_path) if items_path else [
+            {'item_code': code, 'category': category, 'base_price': price}
+            for category, prices in DEFAULT_BASE_PRICES.items()
+            for code, price in prices.items()
+        ]
+        location_factors = (read_factors(self.sources['location_factors'], ('location', 'town'))
+                            if self.sources['location_factors'] else DEFAULT_LOCATION_FACTORS)
+        supplier_factors = (read_factors(self.sources['supplier_factors'], ('supplier_id', 'supplier'))
+                            if self.sources['supplier_factors'] else DEFAULT_SUPPLIER_FACTORS)
+        columns = _to_columns(items, location_factors, supplier_factors)
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{signature}-', dir=self.cache_dir))
+        try:
+            for name in COLUMN_FILES:
+                np.save(staging / f'{name}.npy', columns[name])
+            with open(staging / 'manifest.json', 'w') as f:
+                json.dump({'signature': signature, 'items': len(columns['item_code'])}, f)
+            # Another worker may have published the same signature first; either copy is valid
+            os.replace(staging, self.cache_dir / signature)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        return self._load_cached(signature) or columns
+
+    def base_price(self, item_code: str) -> float:
+        arrays = self.arrays
+        row = arrays.item_rows([item_code])[0]
+        return float(arrays.item_price[row]) if row >= 0 else 0.0
+
+    def base_prices(self, item_codes: Iterable[str]) -> np.ndarray:
+        """Vectorized base price lookup, 0 for unknown items"""
+        arrays = self.arrays
+        rows = arrays.item_rows(item_codes)
+        if not len(arrays.item_price):
+            return np.zeros(len(rows))
+        return np.where(rows >= 0, arrays.item_price[np.maximum(rows, 0)], 0.0)
+
+    def location_factor(self, location: str) -> float:
+        arrays = self.arrays
+        row = arrays.location_rows([location])[0]
+        if row < 0:
+            row = arrays.location_rows(['default'])[0]
+        return float(arrays.location_factor[row]) if row >= 0 else 1.0
+
+    def supplier_factor(self, supplier_id: str) -> float:
+        arrays = self.arrays
+        row = arrays.supplier_rows([supplier_id])[0]
+        if row < 0:
+            row = arrays.supplier_rows(['default'])[0]
+        return float(arrays.supplier_factor[row]) if row >= 0 else 1.0
+
+    def supplier_factors(self, supplier_ids: Iterable[str]) -> np.ndarray:
+        """Vectorized supplier factor lookup, falling back to the default factor"""
+        arrays = self.arrays
+        rows = arrays.supplier_rows(supplier_ids)
+        default = self.supplier_factor('default')
+        if not len(arrays.supplier_factor):
+            return np.full(len(rows), default)
+        return np.where(rows >= 0, arrays.supplier_factor[np.maximum(rows, 0)], default)
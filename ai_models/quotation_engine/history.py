@@ -0,0 +1,241 @@
+"""
+Price History for the Quotation Engine
+Keeps dated unit prices per (item, supplier, location) as sorted numpy columns so
+"price as of date T" for a whole BOQ is one vectorized binary search, and
+derives monthly seasonal factors from the recorded prices.
+"""
+
+import csv
+import hashlib
+import numpy as np
+from datetime import date, datetime
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from pathlib import Path
+import logging
+
+from .roads import town_key
+
+logger = logging.getLogger(__name__)
+
+# Lookup levels, most specific first; blank supplier/location means market-wide
+LEVELS = ('supplier_location', 'supplier', 'location', 'market')
+
+# Accepted column names in history files, first match wins
+ITEM_CODE_COLUMNS = ('item_code', 'material_id', 'item_id')
+DATE_COLUMNS = ('effective_date', 'date', 'as_of')
+PRICE_COLUMNS = ('unit_price', 'price', 'base_price')
+
+_SEPARATOR = '\x1f'
+
+
+def to_days(values: Any) -> np.ndarray:
+    """Dates, datetimes or ISO strings to int64 days since the epoch"""
+    if isinstance(values, (date, datetime, str, np.datetime64)):
+        values = [values]
+    values = [value.date() if isinstance(value, datetime) else value for value in values]
+    return np.array(values, dtype='datetime64[D]').astype(np.int64)
+
+
+def _key(item_code: str, supplier_id: Optional[str], location: Optional[str]) -> bytes:
+    return _SEPARATOR.join((
+        str(item_code), str(supplier_id or ''), town_key(location) if location else ''
+    )).encode('utf-8')
+
+
+def read_price_history(path: Path) -> List[Dict]:
+    """Read ``item_code,supplier_id,location,effective_date,unit_price[,category]`` rows"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+
+        def pick(candidates):
+            for name in candidates:
+                if name in columns:
+                    return name
+            raise ValueError(f"Price history file is missing one of the columns {list(candidates)}")
+
+        code_col, date_col, price_col = pick(ITEM_CODE_COLUMNS), pick(DATE_COLUMNS), pick(PRICE_COLUMNS)
+        return [
+            {
+                'item_code': row[code_col],
+                'supplier_id': row.get('supplier_id') or None,
+                'location': row.get('location') or None,
+                'date': row[date_col],
+                'price': float(row[price_col]),
+                'category': row.get('category') or '',
+            }
+            for row in reader
+        ]
+
+
+class PriceHistory:
+    """Immutable sorted-array index of dated prices
+
+    Rows are sorted by series key, then date. Each row also carries an ordinal
+    ``series * span + day`` that increases along the whole array, so the as-of
+    row for any (series, day) query is a single ``np.searchsorted``.
+    """
+
+    def __init__(self, records: Iterable[Dict]):
+        keys, days, prices, categories = [], [], [], {}
+        for record in records:
+            key = _key(record['item_code'], record.get('supplier_id'), record.get('location'))
+            keys.append(key)
+            days.append(record['date'])
+            prices.append(float(record['price']))
+            if record.get('category'):
+                categories[key] = str(record['category'])
+
+        keys = np.array(keys, dtype=np.bytes_)
+        days = to_days(days) if len(days) else np.empty(0, dtype=np.int64)
+        prices = np.array(prices, dtype=np.float64)
+
+        # Step 1: Series ids in key order, rows sorted by (series, day, insertion order)
+        self.keys, series = np.unique(keys, return_inverse=True)
+        order = np.lexsort((np.arange(len(days)), days, series))
+        series, days, prices = series[order], days[order], prices[order]
+
+        # Step 2: Several prices for one series and day: the last recorded wins
+        if len(days):
+            last = np.ones(len(days), dtype=bool)
+            last[:-1] = (series[1:] != series[:-1]) | (days[1:] != days[:-1])
+            series, days, prices = series[last], days[last], prices[last]
+
+        self.series = series
+        self.days = days
+        self.prices = prices
+        self.first_day = int(days.min()) if len(days) else 0
+        self.span = (int(days.max()) - self.first_day + 2) if len(days) else 1
+        self.ordinal = series * self.span + (days - self.first_day)
+        self.categories = np.array(
+            [categories.get(key, '') for key in self.keys.tolist()], dtype=object
+        )
+
+        digest = hashlib.sha256()
+        for column in (self.keys, self.series, self.days, self.prices):
+            digest.update(np.ascontiguousarray(column).tobytes())
+        self.version = digest.hexdigest()[:16]
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    def _series_rows(self, keys: List[bytes]) -> np.ndarray:
+        """Series id for each key, -1 when the series has no history"""
+        queries = np.array(keys, dtype=np.bytes_)
+        if not len(self.keys) or not len(queries):
+            return np.full(len(queries), -1, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(self.keys, queries), len(self.keys) - 1)
+        return np.where(self.keys[positions] == queries, positions, -1)
+
+    def _as_of(self, series: np.ndarray, days: np.ndarray) -> np.ndarray:
+        """Row of the latest price of ``series`` on or before ``days``, -1 when there is none"""
+        offset = np.clip(days - self.first_day, -1, self.span - 1)
+        rows = np.searchsorted(self.ordinal, series * self.span + offset, side='right') - 1
+        found = (series >= 0) & (rows >= 0)
+        found[found] &= self.series[rows[found]] == series[found]
+        return np.where(found, rows, -1)
+
+    def lookup(self, item_codes: List[str], as_of: Any, supplier_ids: Optional[List[Optional[str]]] = None,
+               locations: Optional[List[Optional[str]]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Price of each item as of a date (or one date per item)
+
+        Falls back from the item's supplier-and-location series to the supplier's,
+        the location's and the market-wide one. Returns ``(prices, levels)``:
+        NaN and -1 where no series has a price by then, else the index into
+        ``LEVELS`` of the series used.
+        """
+        count = len(item_codes)
+        days = np.broadcast_to(to_days(as_of), (count,))
+        supplier_ids = supplier_ids if supplier_ids is not None else [None] * count
+        locations = locations if locations is not None else [None] * count
+
+        prices = np.full(count, np.nan)
+        levels = np.full(count, -1, dtype=np.int64)
+        if not len(self.prices):
+            return prices, levels
+
+        has_supplier = np.array([bool(supplier_id) for supplier_id in supplier_ids], dtype=bool)
+        has_location = np.array([bool(location) for location in locations], dtype=bool)
+        for level, (use_supplier, use_location) in enumerate(((True, True), (True, False),
+                                                              (False, True), (False, False))):
+            pending = levels < 0
+            if use_supplier:
+                pending &= has_supplier
+            if use_location:
+                pending &= has_location
+            pending = np.flatnonzero(pending)
+            if not len(pending):
+                continue
+            series = self._series_rows([
+                _key(item_codes[i], supplier_ids[i] if use_supplier else None,
+                     locations[i] if use_location else None)
+                for i in pending.tolist()
+            ])
+            rows = self._as_of(series, days[pending])
+            found = rows >= 0
+            prices[pending[found]] = self.prices[rows[found]]
+            levels[pending[found]] = level
+        return prices, levels
+
+    def seasonal_factors(self, years: int = 5, min_observations: int = 6) -> Dict[str, np.ndarray]:
+        """Average price in each calendar month relative to its trend, per category
+
+        Every series with at least ``min_observations`` months of recorded prices
+        in the last ``years`` years is sampled at month ends, detrended with a
+        centred 2x12 moving average and the ratios averaged by calendar month.
+        Returns 12 factors (January first, mean 1) per category, plus ``''`` for
+        all categories together; empty while there is less than a year of data.
+        """
+        if not len(self.prices):
+            return {}
+
+        # Step 1: Month-end sample grid covering the window
+        last_month = np.datetime64(int(self.days.max()), 'D').astype('datetime64[M]')
+        months = np.arange(last_month - 12 * years + 1, last_month + 1)
+        month_ends = ((months + 1).astype('datetime64[D]') - 1).astype(np.int64)
+        if len(months) < 25:
+            return {}
+
+        # Step 2: Series with enough distinct months of observations in the window
+        recent = self.days >= int(months[0].astype('datetime64[D]').astype(np.int64))
+        observed = np.unique(np.column_stack((
+            self.series[recent], self.days[recent].astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+        )), axis=0)
+        counts = np.bincount(observed[:, 0], minlength=len(self.keys)) if len(observed) else np.zeros(len(self.keys))
+        series = np.flatnonzero(counts >= min_observations)
+        if not len(series):
+            return {}
+
+        # Step 3: As-of price of every selected series at every month end
+        rows = self._as_of(np.repeat(series, len(months)), np.tile(month_ends, len(series)))
+        sampled = np.where(rows >= 0, self.prices[np.maximum(rows, 0)], np.nan).reshape(len(series), len(months))
+
+        # Step 4: Ratio to the centred 2x12 moving average (NaN wherever the window is incomplete)
+        weights = np.r_[0.5, np.ones(11), 0.5] / 12
+        windows = np.lib.stride_tricks.sliding_window_view(sampled, 13, axis=1)
+        trend = windows @ weights
+        ratios = sampled[:, 6:-6] / trend
+        calendar = (months[6:-6].astype(np.int64) % 12)
+
+        def monthly(selected: np.ndarray) -> Optional[np.ndarray]:
+            values = ratios[selected]
+            factors = np.array([
+                np.nanmean(values[:, calendar == month]) if np.isfinite(values[:, calendar == month]).any()
+                else np.nan
+                for month in range(12)
+            ])
+            if not np.isfinite(factors).all():
+                return None
+            return factors / factors.mean()
+
+        result = {}
+        overall = monthly(np.ones(len(series), dtype=bool))
+        if overall is None:
+            return {}
+        result[''] = overall
+        categories = self.categories[series]
+        for category in sorted(set(categories.tolist()) - {''}):
+            factors = monthly(categories == category)
+            if factors is not None:
+                result[category] = factors
+        return result
@@ -4,16 +4,30 @@ Generates detailed quotations with material sourcing, pricing, and transport opt
 """
 
 import json
-import pandas as pd
 import numpy as np
 from typing import Dict, List, Any, Optional, Tuple
 from pathlib import Path
 import logging
 from datetime import datetime, timedelta
 import math
+import time
+
+from engine_common import StageObserver, canonical_digest, derive_seed, timed_stage
+
+from .catalog import PriceCatalog
+from .history import LEVELS, PriceHistory, read_price_history, to_days
+from .roads import RoadNetwork, town_key
+from .suppliers import DEFAULT_SUPPLIERS, SupplierIndex, read_town_coordinates
+from .sourcing import SourcingOptimizer
+from .routing import FleetRouter
 
 logger = logging.getLogger(__name__)
 
+def check_deadline(deadline: Optional[float]) -> None:
+    """Raise ``TimeoutError`` once a ``time.monotonic()`` deadline has passed"""
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutError("Quotation generation exceeded its inference timeout")
+
 class MaterialClassifier:
     """Classifies and quantifies materials based on project specifications"""
     
@@ -156,57 +170,39 @@ class MaterialClassifier:
 class PricePredictor:
     """Predicts material prices based on location, supplier, and market conditions"""
     
-    def __init__(self):
-        self.base_prices = self._load_base_prices()
-        self.location_factors = {
-            'nairobi': 1.0,
-            'mombasa': 1.05,
-            'nakuru': 0.95,
-            'kisumu': 0.90,
-            'eldoret': 0.88,
-            'default': 0.92
-        }
+    def __init__(self, catalog: Optional[PriceCatalog] = None, history: Optional[PriceHistory] = None):
+        # Item prices, location and supplier factors come from the columnar catalog
+        self.catalog = catalog or PriceCatalog()
         
         self.seasonal_factors = {
             'dry_season': 1.0,
             'rainy_season': 1.15,  # Higher prices during rainy season
             'peak_construction': 1.1  # March-June, Oct-Dec
         }
+        
+        # Dated prices; once they span enough time, monthly factors measured from
+        # them (per category, '' for all) replace the fixed seasons above
+        self.history = history or PriceHistory([])
+        self.monthly_factors: Dict[str, np.ndarray] = {}
     
-    def _load_base_prices(self) -> Dict:
-        """Load base material prices from database/CSV files"""
-        return {
-            'concrete': {
-                'C001': 8500,  # KES per m3
-                'C002': 9200,
-                'C003': 10000
-            },
-            'steel': {
-                'S001': 83,  # KES per kg
-                'S002': 85,
-                'S003': 90
-            },
-            'blocks': {
-                'B001': 45  # KES per block
-            },
-            'roofing': {
-                'R001': 850  # KES per sheet
-            },
-            'finishing': {
-                'F001': 450,  # KES per liter
-                'F002': 1200  # KES per m2
-            },
-            'electrical': {
-                'E001': 25000  # KES per room
-            },
-            'plumbing': {
-                'P001': 35000  # KES per bathroom
-            }
-        }
+    def load_history(self, history: PriceHistory, years: int = 5, min_observations: int = 6):
+        """Swap in a new price history and re-derive the monthly seasonal factors"""
+        monthly_factors = history.seasonal_factors(years, min_observations)
+        self.history = history
+        self.monthly_factors = monthly_factors
+    
+    def seasonal_factor(self, category: str, as_of: Optional[datetime] = None) -> float:
+        """Measured factor for the category and month, else the fixed season's factor"""
+        factors = self.monthly_factors.get(category)
+        if factors is None:
+            factors = self.monthly_factors.get('')
+        if factors is not None:
+            return float(factors[(as_of or datetime.now()).month - 1])
+        return self.seasonal_factors[self.get_current_season(as_of)]
     
-    def get_current_season(self) -> str:
+    def get_current_season(self, as_of: Optional[datetime] = None) -> str:
         """Determine current season for pricing adjustments"""
-        current_month = datetime.now().month
+        current_month = (as_of or datetime.now()).month
         
         if current_month in [6, 7, 8, 9]:  # Dry season
             return 'dry_season'
@@ -216,21 +212,25 @@ class PricePredictor:
             return 'rainy_season'
     
     def predict_price(self, item_code: str, category: str, location: str, 
-                     supplier_id: str = None) -> Dict[str, float]:
-        """Predict price for a specific material item"""
-        base_price = self.base_prices.get(category, {}).get(item_code, 0)
+                     supplier_id: str = None, rng: Optional[np.random.Generator] = None,
+                     variation: Optional[float] = None,
+                     as_of: Optional[datetime] = None) -> Dict[str, float]:
+        """Predict price for a specific material item
+        
+        Market variation is drawn from ``rng`` (or taken from a pre-drawn
+        ``variation``) so that a seeded generator gives reproducible prices.
+        """
+        base_price = self.catalog.base_price(item_code)
         
         if base_price == 0:
             logger.warning(f"No base price found for {item_code}")
             return {'unit_price': 0, 'confidence': 0}
         
         # Apply location factor
-        location_factor = self.location_factors.get(location.lower(), 
-                                                   self.location_factors['default'])
+        location_factor = self.catalog.location_factor(location)
         
         # Apply seasonal factor
-        season = self.get_current_season()
-        seasonal_factor = self.seasonal_factors[season]
+        seasonal_factor = self.seasonal_factor(category, as_of)
         
         # Apply supplier margin (if available)
         supplier_factor = 1.0
@@ -241,7 +241,8 @@ class PricePredictor:
         final_price = base_price * location_factor * seasonal_factor * supplier_factor
         
         # Add some randomness for market variation (±5%)
-        variation = np.random.uniform(0.95, 1.05)
+        if variation is None:
+            variation = float(self.draw_variations(rng or np.random.default_rng(), 1)[0])
         final_price *= variation
         
         return {
@@ -253,56 +254,156 @@ class PricePredictor:
             'confidence': 0.85
         }
     
+    def price_matrix(self, item_codes: List[str], location: str, supplier_ids: List[str],
+                     variations: np.ndarray, as_of: Optional[datetime] = None,
+                     categories: Optional[List[str]] = None) -> np.ndarray:
+        """Vectorized ``predict_price`` (before rounding) for every item x supplier pair"""
+        factors = {category: self.seasonal_factor(category, as_of) for category in set(categories or [''])}
+        seasonal = (np.array([factors[category] for category in categories]) if categories
+                    else factors[''])
+        line_prices = (
+            self.catalog.base_prices(item_codes)
+            * self.catalog.location_factor(location)
+            * seasonal
+            * np.asarray(variations, dtype=np.float64)
+        )
+        return np.outer(line_prices, self.catalog.supplier_factors(supplier_ids))
+    
+    def historical_prices(self, item_codes: List[str], supplier_ids: List[Optional[str]], location: str,
+                          as_of: Any) -> Tuple[np.ndarray, np.ndarray]:
+        """Recorded unit price of each line as of a date, in one vectorized lookup
+        
+        Supplier prices are used as recorded; location-wide prices get the
+        supplier's factor and market-wide prices the location factor as well.
+        Returns ``(prices, levels)`` with NaN and -1 where nothing was recorded yet.
+        """
+        prices, levels = self.history.lookup(item_codes, as_of, supplier_ids, [location] * len(item_codes))
+        supplier_factors = self.catalog.supplier_factors([supplier_id or 'default' for supplier_id in supplier_ids])
+        without_supplier = levels >= LEVELS.index('location')
+        prices = np.where(without_supplier, prices * supplier_factors, prices)
+        market = levels == LEVELS.index('market')
+        prices = np.where(market, prices * self.catalog.location_factor(location), prices)
+        return prices, levels
+    
+    def draw_variations(self, rng: np.random.Generator, size: int) -> np.ndarray:
+        """Draw a block of market variation factors (±5%) in one vectorized call"""
+        return rng.uniform(0.95, 1.05, size=size)
+    
     def _get_supplier_factor(self, supplier_id: str) -> float:
         """Get supplier-specific pricing factor"""
-        supplier_factors = {
-            'SUP001': 0.98,  # Bulk supplier - lower prices
-            'SUP002': 1.02,  # Premium supplier - higher prices
-            'SUP003': 1.05,  # Specialty supplier
-            'default': 1.0
-        }
-        return supplier_factors.get(supplier_id, supplier_factors['default'])
+        return self.catalog.supplier_factor(supplier_id)
 
 class TransportOptimizer:
     """Optimizes material transport costs and logistics"""
     
-    def __init__(self):
-        self.fuel_cost_per_liter = 150.0  # KES
+    def __init__(self, road_network: Optional[RoadNetwork] = None,
+                 unknown_distance_km: float = 100.0, local_delivery_km: float = 25.0,
+                 transport_config: Optional[Dict] = None):
+        transport_config = transport_config or {}
+        self.fuel_cost_per_liter = float(transport_config.get('fuel_costs', 150.0))  # KES
         self.fuel_consumption = {  # km per liter
             'small_truck': 8,
             'medium_truck': 6,
             'large_truck': 4
         }
         
-        self.vehicle_capacity = {  # kg
+        self.vehicle_capacity = transport_config.get('vehicle_capacity') or {  # kg
             'small_truck': 5000,
             'medium_truck': 10000,
             'large_truck': 20000
         }
         
-        # Distance matrix between major cities (km)
-        self.distance_matrix = {
-            ('nairobi', 'mombasa'): 480,
-            ('nairobi', 'nakuru'): 160,
-            ('nairobi', 'kisumu'): 350,
-            ('nairobi', 'eldoret'): 320,
-            ('mombasa', 'nakuru'): 640,
-            ('mombasa', 'kisumu'): 830,
-            ('nakuru', 'kisumu'): 190,
-            ('nakuru', 'eldoret'): 160
+        # Driver and vehicle running cost per km of route, by vehicle
+        self.cost_per_km = transport_config.get('cost_per_km') or {  # KES
+            'small_truck': 80,
+            'medium_truck': 120,
+            'large_truck': 180
         }
+        self.loading_cost = 2000  # Fixed loading/unloading cost per trip
+        
+        # Shortest road distances between towns (km), precomputed and memory-mapped
+        self.road_network = road_network or RoadNetwork()
+        self.unknown_distance_km = unknown_distance_km
+        # Deliveries within a town still cover some distance
+        self.local_delivery_km = local_delivery_km
+        self._warned_unknown = set()
+        
+        # Longest multi-drop route a truck covers in a day (None: unlimited)
+        self.max_route_km = (transport_config.get('fleet_routing') or {}).get('max_route_km')
+    
+    @classmethod
+    def from_config(cls, transport_config: Optional[Dict], base_dir: Optional[Path] = None) -> 'TransportOptimizer':
+        """Create an optimizer from the ``transport_optimization`` config section"""
+        network_config = (transport_config or {}).get('road_network') or {}
+        return cls(
+            RoadNetwork.from_config(network_config, base_dir),
+            unknown_distance_km=network_config.get('unknown_distance_km', 100.0),
+            local_delivery_km=network_config.get('local_delivery_km', 25.0),
+            transport_config=transport_config
+        )
+    
+    def get_distances(self, origins: List[str], destinations: List[str]) -> np.ndarray:
+        """Road distance (km) for each origin/destination pair in one array gather"""
+        distances = self.road_network.distances(origins, destinations)
+        
+        unknown = np.isnan(distances)
+        if unknown.any():
+            for origin, destination in {
+                (origins[i], destinations[i]) for i in np.flatnonzero(unknown)
+            } - self._warned_unknown:
+                if len(self._warned_unknown) >= 256:
+                    break
+                logger.warning(
+                    f"No road distance from {origin!r} to {destination!r}, "
+                    f"assuming {self.unknown_distance_km} km"
+                )
+                self._warned_unknown.add((origin, destination))
+            distances[unknown] = self.unknown_distance_km
+        
+        return np.maximum(distances, self.local_delivery_km)
+    
+    def distance_matrix(self, locations: List[str]) -> np.ndarray:
+        """Road distances between every pair of ``locations``, each entry a separate place
+        
+        Places in the same town are ``local_delivery_km`` apart; the diagonal is 0.
+        """
+        network = self.road_network
+        rows = network.rows(locations)
+        known = rows >= 0
+        if len(network.towns):
+            safe = np.maximum(rows, 0)
+            distances = network.matrix[np.ix_(safe, safe)].astype(np.float64)
+        else:
+            distances = np.full((len(rows), len(rows)), np.nan)
+        distances[~known, :] = np.nan
+        distances[:, ~known] = np.nan
+        distances[np.isinf(distances)] = np.nan
+        
+        keys = np.array([town_key(location) for location in locations], dtype=object)
+        distances[keys[:, None] == keys[None, :]] = 0.0
+        
+        unknown = np.isnan(distances)
+        if unknown.any():
+            for location in {locations[i] for i in np.flatnonzero(~known)} - self._warned_unknown:
+                if len(self._warned_unknown) >= 256:
+                    break
+                logger.warning(f"No road distances for {location!r}, assuming {self.unknown_distance_km} km")
+                self._warned_unknown.add(location)
+            distances[unknown] = self.unknown_distance_km
+        
+        distances = np.maximum(distances, self.local_delivery_km)
+        np.fill_diagonal(distances, 0.0)
+        return distances
     
     def get_distance(self, origin: str, destination: str) -> float:
         """Get distance between two locations"""
-        key1 = (origin.lower(), destination.lower())
-        key2 = (destination.lower(), origin.lower())
-        
-        return self.distance_matrix.get(key1, self.distance_matrix.get(key2, 100))
+        return float(self.get_distances([origin], [destination])[0])
     
     def calculate_transport_cost(self, material_weight: float, origin: str, 
-                               destination: str) -> Dict[str, Any]:
-        """Calculate optimal transport cost for materials"""
-        distance = self.get_distance(origin, destination)
+                               destination: str, distance: Optional[float] = None) -> Dict[str, Any]:
+        """Calculate the cost of one trip carrying ``material_weight``"""
+        if distance is None:
+            distance = self.get_distance(origin, destination)
         
         # Determine optimal vehicle type
         vehicle_type = self._select_vehicle(material_weight)
@@ -312,9 +413,9 @@ class TransportOptimizer:
         fuel_needed = (distance * 2) / fuel_consumption  # Round trip
         fuel_cost = fuel_needed * self.fuel_cost_per_liter
         
-        # Add driver costs and other expenses
-        driver_cost = distance * 20  # KES per km
-        loading_cost = 2000  # Fixed loading/unloading cost
+        # Add driver and vehicle costs and other expenses
+        driver_cost = distance * self.cost_per_km[vehicle_type]
+        loading_cost = self.loading_cost
         
         total_cost = fuel_cost + driver_cost + loading_cost
         
@@ -337,32 +438,200 @@ class TransportOptimizer:
         else:
             return 'large_truck'
     
-    def optimize_multi_supplier_transport(self, suppliers_materials: List[Dict]) -> Dict:
-        """Optimize transport when materials come from multiple suppliers"""
-        total_cost = 0
-        transport_breakdown = []
-        
-        for supplier_data in suppliers_materials:
-            supplier_location = supplier_data['location']
-            project_location = supplier_data['project_location']
-            total_weight = supplier_data['total_weight']
-            
-            transport_info = self.calculate_transport_cost(
-                total_weight, supplier_location, project_location
+    def trip_costs(self, distances: np.ndarray) -> Dict[str, np.ndarray]:
+        """Cost of one trip by each vehicle type over each distance"""
+        distances = np.asarray(distances, dtype=np.float64)
+        return {
+            vehicle_type: (
+                (distances * 2) / self.fuel_consumption[vehicle_type] * self.fuel_cost_per_liter
+                + distances * self.cost_per_km[vehicle_type] + self.loading_cost
             )
-            
-            transport_info['supplier_id'] = supplier_data['supplier_id']
-            transport_info['materials'] = supplier_data['materials']
-            transport_breakdown.append(transport_info)
-            
-            total_cost += transport_info['total_transport_cost']
+            for vehicle_type in self.vehicle_capacity
+        }
+    
+    def delivery_costs(self, loads: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """Vectorized cost of moving each load: full large trucks plus the cheapest vehicle for the rest
+        
+        This is the cost ``pack_trips`` achieves when the load can be split freely,
+        used by the sourcing optimizer as the delivery cost of a supplier's load.
+        """
+        loads = np.asarray(loads, dtype=np.float64)
+        costs = self.trip_costs(distances)
+        full_trucks = np.floor(loads / self.vehicle_capacity['large_truck'])
+        remainder = loads - full_trucks * self.vehicle_capacity['large_truck']
+        remainder_cost = np.select(
+            [remainder <= 0, remainder <= self.vehicle_capacity['small_truck'],
+             remainder <= self.vehicle_capacity['medium_truck']],
+            [0.0, costs['small_truck'], costs['medium_truck']],
+            costs['large_truck']
+        )
+        return full_trucks * costs['large_truck'] + remainder_cost
+    
+    def basket_delivery_costs(self, weights: np.ndarray, baskets: np.ndarray, distances: np.ndarray) -> np.ndarray:
+        """Cost of delivering each supplier's basket in consolidated trips
+        
+        ``baskets`` is an items x suppliers mask of the lines each supplier
+        delivers. Suppliers delivering the same lines share one ``pack_trips``
+        packing, costed over all their distances at once.
+        """
+        weights = np.asarray(weights, dtype=np.float64)
+        costs = np.zeros(baskets.shape[1])
+        trip_costs = self.trip_costs(distances)
+        patterns, group = np.unique(np.packbits(baskets, axis=0).T, axis=0, return_inverse=True)
+        for pattern in range(len(patterns)):
+            columns = np.flatnonzero(group.ravel() == pattern)
+            lines = np.flatnonzero(baskets[:, columns[0]])
+            for vehicle_type, _, _ in self.pack_trips(weights[lines].tolist()):
+                costs[columns] += trip_costs[vehicle_type][columns]
+        return costs
+    
+    def pack_trips(self, weights: List[float]) -> List[Tuple[str, float, List[Tuple[int, float]]]]:
+        """Pack line weights into truck loads
+        
+        Lines heavier than a large truck fill whole trucks; the remainders are
+        packed first-fit decreasing into large-truck loads (one vectorized scan
+        of the open loads per line) and each load then goes by the smallest
+        vehicle that carries it. Returns ``(vehicle_type, load_kg, [(line, kg)])``
+        per trip, heaviest first.
+        """
+        capacity = float(self.vehicle_capacity['large_truck'])
+        trips = []
+        residual = np.empty(0)
+        loads: List[List[Tuple[int, float]]] = []
+        
+        for line in np.argsort(-np.asarray(weights, dtype=np.float64), kind='stable').tolist():
+            weight = float(weights[line])
+            full_trucks = int(weight // capacity)
+            trips.extend(('large_truck', capacity, [(line, capacity)]) for _ in range(full_trucks))
+            remainder = weight - full_trucks * capacity
+            if remainder <= 0:
+                continue
+            fits = np.flatnonzero(residual >= remainder - 1e-9)
+            if fits.size:
+                residual[fits[0]] -= remainder
+                loads[fits[0]].append((line, remainder))
+            else:
+                residual = np.append(residual, capacity - remainder)
+                loads.append([(line, remainder)])
+        
+        for contents in loads:
+            load = sum(kg for _, kg in contents)
+            trips.append((self._select_vehicle(load), load, contents))
+        trips.sort(key=lambda trip: -trip[1])
+        return trips
+    
+    def plan_deliveries(self, lines: List[Dict], project_location: str) -> List[Dict]:
+        """Consolidate lines into trips per supplier
+        
+        ``lines`` carry ``item_code``, ``weight``, ``supplier_id`` and
+        ``supplier_location``. Returns one breakdown entry per trip with the
+        ``load_kg`` carried and the ``item_codes`` on board.
+        """
+        by_supplier: Dict[str, List[int]] = {}
+        for i, line in enumerate(lines):
+            by_supplier.setdefault(line['supplier_id'], []).append(i)
+        
+        origins = [lines[members[0]]['supplier_location'] for members in by_supplier.values()]
+        distances = self.get_distances(origins, [project_location] * len(origins)).tolist()
+        
+        trips = []
+        for (supplier_id, members), origin, distance in zip(by_supplier.items(), origins, distances):
+            packed = self.pack_trips([lines[i]['weight'] for i in members])
+            for number, (vehicle_type, load, contents) in enumerate(packed, start=1):
+                trip = self.calculate_transport_cost(load, origin, project_location, distance=distance)
+                item_codes = []
+                for position, _ in contents:
+                    code = lines[members[position]]['item_code']
+                    if code not in item_codes:
+                        item_codes.append(code)
+                trip.update({
+                    'trip_id': f"{supplier_id}-{number}",
+                    'supplier_id': supplier_id,
+                    'supplier_location': origin,
+                    'load_kg': round(load, 2),
+                    'item_codes': item_codes,
+                })
+                trips.append(trip)
+        return trips
+    
+    def supplier_feasibility(self, items: List[Dict], suppliers: List[Dict]) -> np.ndarray:
+        """Items x suppliers mask of the pairs a supplier can fill from its categories and stock"""
+        item_categories = np.array([item['category'] for item in items], dtype=object)
+        quantities = np.array([item['quantity'] for item in items], dtype=np.float64)
+        feasible = np.ones((len(items), len(suppliers)), dtype=bool)
+        for s, supplier in enumerate(suppliers):
+            if supplier.get('categories') is not None:
+                feasible[:, s] &= np.isin(item_categories, list(supplier['categories']))
+            if supplier.get('stock') is not None:
+                on_hand = np.array([supplier['stock'].get(item['item_code'], 0) for item in items], dtype=np.float64)
+                feasible[:, s] &= on_hand >= quantities
+        return feasible
+    
+    def optimize_multi_supplier_transport(self, items: List[Dict], suppliers: List[Dict],
+                                          project_location: str, unit_prices: np.ndarray,
+                                          baseline: Optional[List[int]] = None,
+                                          max_passes: int = 10, time_budget: float = 0.5) -> Dict:
+        """Choose a supplier for every item, minimising goods plus delivery cost
+        
+        ``items`` carry ``item_code``, ``quantity``, ``weight`` and ``category``;
+        ``suppliers`` are supplier records, optionally with ``categories``,
+        ``stock`` (item code -> quantity on hand) and ``min_order`` (KES).
+        ``unit_prices`` is items x suppliers. Each supplier used delivers its
+        lines in consolidated truck trips, and savings are measured against the
+        cheapest single supplier (or ``baseline`` supplier indices when no
+        single supplier stocks everything).
+        """
+        quantities = np.array([item['quantity'] for item in items], dtype=np.float64)
+        feasible = self.supplier_feasibility(items, suppliers)
         
+        distances = self.get_distances(
+            [supplier['location'] for supplier in suppliers], [project_location] * len(suppliers)
+        )
+        optimizer = SourcingOptimizer(self.delivery_costs, max_passes=max_passes, time_budget=time_budget)
+        result = optimizer.optimize(
+            np.asarray(unit_prices, dtype=np.float64),
+            quantities,
+            np.array([item['weight'] for item in items], dtype=np.float64),
+            distances,
+            feasible=feasible,
+            min_order=np.array([float(supplier.get('min_order') or 0) for supplier in suppliers]),
+            baseline=np.asarray(baseline) if baseline is not None else None
+        )
+        
+        assignment = result['assignment'].tolist()
+        transport_breakdown = self.plan_deliveries([
+            {
+                'item_code': item['item_code'],
+                'weight': item['weight'],
+                'supplier_id': suppliers[s]['id'],
+                'supplier_location': suppliers[s]['location'],
+            }
+            for item, s in zip(items, assignment)
+        ], project_location)
+        
+        baseline_supplier = result['baseline_supplier']
         return {
-            'total_transport_cost': round(total_cost, 2),
+            'assignment': [suppliers[s]['id'] for s in assignment],
+            'goods_cost': round(result['goods_cost'], 2),
+            'total_transport_cost': round(sum(t['total_transport_cost'] for t in transport_breakdown), 2),
+            'total_cost': round(result['total_cost'], 2),
             'transport_breakdown': transport_breakdown,
-            'optimization_savings': 0  # Could implement route optimization here
+            'baseline_supplier': suppliers[baseline_supplier]['id'] if baseline_supplier is not None else None,
+            'baseline_cost': round(result['baseline_cost'], 2) if result['baseline_cost'] is not None else None,
+            'optimization_savings': round(result['savings'], 2),
+            'min_order_violations': [suppliers[s]['id'] for s in result['min_order_violations']]
         }
 
+    def plan_fleet_routes(self, drops: List[Dict], max_route_km: Optional[float] = None) -> Dict:
+        """Combine pending deliveries from many quotations into multi-drop truck routes
+        
+        ``drops`` carry ``drop_id``, ``origin`` (supplier town), ``destination``,
+        ``load_kg`` and optionally ``site`` (a project key). Returns the routes and
+        the distance, fuel and cost saved against one trip per drop.
+        """
+        router = FleetRouter(self, max_route_km=max_route_km if max_route_km is not None else self.max_route_km)
+        return router.plan(drops)
+
 class QuotationEngine:
     """Main quotation generation engine"""
     
@@ -371,102 +640,225 @@ class QuotationEngine:
             self.config = json.load(f)
         
         self.material_classifier = MaterialClassifier()
-        self.price_predictor = PricePredictor()
-        self.transport_optimizer = TransportOptimizer()
-        
-        # Load supplier database
-        self.suppliers = self._load_suppliers()
-    
-    def _load_suppliers(self) -> Dict:
-        """Load supplier database from CSV files"""
-        suppliers = {}
-        
-        # Mock supplier data - would be loaded from actual database
-        suppliers_data = [
-            {'id': 'SUP001', 'name': 'Nairobi Building Supplies', 'location': 'nairobi', 'rating': 4.5},
-            {'id': 'SUP002', 'name': 'Coast Cement Ltd', 'location': 'mombasa', 'rating': 4.2},
-            {'id': 'SUP003', 'name': 'Rift Valley Hardware', 'location': 'nakuru', 'rating': 4.0},
-            {'id': 'SUP004', 'name': 'Western Kenya Suppliers', 'location': 'kisumu', 'rating': 3.8}
-        ]
+        self.price_predictor = PricePredictor(PriceCatalog.from_config(
+            self.config.get('pricing_model', {}).get('catalog'), Path(config_path).parent
+        ))
+        history_config = self.config.get('pricing_model', {}).get('history') or {}
+        if history_config.get('path'):
+            self.load_price_history(read_price_history(Path(config_path).parent / history_config['path']))
+        self.transport_optimizer = TransportOptimizer.from_config(
+            self.config.get('transport_optimization'), Path(config_path).parent
+        )
+        
+        # Load supplier database and its spatial index
+        index_config = self.config.get('supplier_index', {})
+        towns_path = index_config.get('towns')
+        self.town_coordinates = read_town_coordinates(
+            Path(config_path).parent / towns_path if towns_path else None
+        )
+        self.supplier_candidates = index_config.get('candidates', 3)
+        self.load_suppliers(self._load_suppliers())
+        
+        # Optional per-stage latency hook (None keeps the pipeline untimed)
+        self.stage_observer: Optional[StageObserver] = None
+    
+    def _stage(self, stage: str):
+        return timed_stage(self.stage_observer, stage)
+    
+    @property
+    def version(self) -> str:
+        """Engine (model/config) version"""
+        return self.config.get('version', '0')
+    
+    @property
+    def data_version(self) -> str:
+        """Version of the reference data quotations are priced against"""
+        return '-'.join((
+            self.price_predictor.catalog.version,
+            self.price_predictor.history.version,
+            self.transport_optimizer.road_network.version,
+            self.supplier_index.version,
+        ))
+    
+    def _load_suppliers(self) -> List[Dict]:
+        """Built-in supplier records, used until real ones are loaded"""
+        # Mock supplier data - the backend replaces it from the Supplier table
+        return [dict(supplier) for supplier in DEFAULT_SUPPLIERS]
+    
+    def load_suppliers(self, suppliers: List[Dict]):
+        """Replace the supplier database and rebuild its spatial index
+        
+        Records carry ``id``, ``name``, ``location``, optional ``coordinates``
+        and ``categories`` (None for suppliers stocking every category).
+        Raises ``ValueError``, keeping the current suppliers, when none of the
+        records can be located.
+        """
+        index = SupplierIndex(suppliers, self.town_coordinates)
+        if not len(index):
+            reason = (f"None of the {len(suppliers)} suppliers has coordinates or a known town" if suppliers
+                      else "No suppliers given")
+            raise ValueError(f"{reason}; keeping the current suppliers")
+        # Single reference assignments: readers see either the old or the new index
+        self.suppliers = index.by_id
+        self.supplier_index = index
+        self.default_supplier = index.suppliers[0]
+    
+    def load_price_history(self, records: List[Dict]):
+        """Replace the price history (``item_code``, ``supplier_id``, ``location``,
+        ``date``, ``price`` and optional ``category`` records) and its seasonal factors"""
+        history_config = self.config.get('pricing_model', {}).get('history') or {}
+        self.price_predictor.load_history(
+            PriceHistory(records),
+            years=history_config.get('seasonal_years', 5),
+            min_observations=history_config.get('min_observations', 6)
+        )
+    
+    def reprice_lines(self, lines: List[Dict], location: str, as_of: Any) -> Dict[str, Any]:
+        """Price quotation lines as of a past (or future) date from the price history
         
-        for supplier in suppliers_data:
-            suppliers[supplier['id']] = supplier
+        ``lines`` carry ``item_code``, ``supplier_id``, ``quantity`` and the quoted
+        ``unit_rate``. Lines without recorded prices by then keep the quoted rate.
+        """
+        day = np.datetime64(int(to_days(as_of)[0]), 'D')
+        prices, levels = self.price_predictor.historical_prices(
+            [line['item_code'] for line in lines], [line.get('supplier_id') for line in lines],
+            location.lower(), day
+        )
+        quantities = np.array([float(line['quantity']) for line in lines], dtype=np.float64)
+        quoted = np.array([float(line['unit_rate']) for line in lines], dtype=np.float64)
+        found = levels >= 0
+        rates = np.round(np.where(found, prices, quoted), 2)
+        totals = np.round(rates * quantities, 2)
+        quoted_totals = np.round(quoted * quantities, 2)
         
-        return suppliers
+        repriced = [
+            {
+                **line,
+                'quoted_unit_rate': line['unit_rate'],
+                'unit_rate': rate,
+                'total': total,
+                'change': round(total - quoted_total, 2),
+                'price_source': LEVELS[level] if level >= 0 else 'quoted',
+            }
+            for line, rate, total, quoted_total, level in zip(
+                lines, rates.tolist(), totals.tolist(), quoted_totals.tolist(), levels.tolist()
+            )
+        ]
+        return {
+            'as_of': str(day),
+            'lines': repriced,
+            'quoted_subtotal': round(float(quoted_totals.sum()), 2),
+            'repriced_subtotal': round(float(totals.sum()), 2),
+            'change': round(float(totals.sum() - quoted_totals.sum()), 2),
+            'lines_with_history': int(found.sum()),
+        }
     
-    def generate_detailed_quotation(self, project_specs: Dict) -> Dict[str, Any]:
-        """Generate comprehensive quotation with material sourcing and transport"""
+    def generate_detailed_quotation(self, project_specs: Dict, seed: Optional[int] = None,
+                                    as_of: Optional[datetime] = None,
+                                    deadline: Optional[float] = None) -> Dict[str, Any]:
+        """Generate comprehensive quotation with material sourcing and transport
+        
+        All randomness comes from a per-request generator seeded with ``seed`` or,
+        by default, the canonical hash of ``project_specs``. Passing ``as_of`` as
+        well pins the seasonal factor and dates, making the output byte-identical.
+        With a ``deadline`` (``time.monotonic()`` value) generation stops with
+        ``TimeoutError`` between categories once it has passed.
+        """
+        specs_digest = canonical_digest(project_specs)
+        rng = np.random.default_rng(derive_seed(project_specs, seed))
+        as_of = as_of or datetime.now()
         
         # Step 1: Classify and quantify materials
-        materials_by_category = self.material_classifier.classify_project_materials(project_specs)
+        with self._stage('classify_project_materials'):
+            materials_by_category = self.material_classifier.classify_project_materials(project_specs)
         
         # Step 2: Generate quotation items with pricing
         quotation_items = []
-        transport_data = []
+        sourced_lines = []
         total_amount = 0
         
         project_location = project_specs.get('location', 'nairobi').lower()
         
-        for category, materials in materials_by_category.items():
-            for material in materials:
-                # Get best supplier for this material
-                best_supplier = self._find_best_supplier(category, project_location)
-                
-                # Predict price
-                price_info = self.price_predictor.predict_price(
-                    material['item_code'], 
-                    category, 
-                    project_location,
-                    best_supplier['id']
-                )
-                
-                unit_price = price_info['unit_price']
-                quantity = material['quantity']
-                total = unit_price * quantity
-                
-                quotation_item = {
+        with self._stage('pricing'):
+            # Draw the market variation for every line in one block
+            line_count = sum(len(materials) for materials in materials_by_category.values())
+            line_variations = self.price_predictor.draw_variations(rng, line_count)
+            variations = iter(line_variations.tolist())
+            
+            # Choose a supplier per line: cheapest delivered cost among nearby capable suppliers
+            line_suppliers, sourcing = self._source_lines(
+                materials_by_category, project_location, project_specs.get('coordinates'),
+                line_variations, as_of, deadline
+            )
+            line_suppliers = iter(line_suppliers)
+            
+            for category, materials in materials_by_category.items():
+                check_deadline(deadline)
+                for material in materials:
+                    best_supplier = next(line_suppliers)
+                    
+                    # Predict price
+                    price_info = self.price_predictor.predict_price(
+                        material['item_code'], 
+                        category, 
+                        project_location,
+                        best_supplier['id'],
+                        variation=next(variations),
+                        as_of=as_of
+                    )
+                    
+                    unit_price = price_info['unit_price']
+                    quantity = material['quantity']
+                    total = unit_price * quantity
+                    
+                    quotation_item = {
+                        'item_code': material['item_code'],
+                        'description': material['description'],
+                        'unit': material['unit'],
+                        'quantity': quantity,
+                        'unit_rate': unit_price,
+                        'total': round(total, 2),
+                        'category': category,
+                        'supplier_id': best_supplier['id'],
+                        'supplier_name': best_supplier['name'],
+                        'supplier_location': best_supplier['location'],
+                        'price_confidence': price_info['confidence']
+                    }
+                    
+                    quotation_items.append(quotation_item)
+                    sourced_lines.append((material, best_supplier))
+                    total_amount += total
+        
+        # Step 3: Consolidate each supplier's lines into truck trips
+        with self._stage('transport'):
+            check_deadline(deadline)
+            transport_data = self.transport_optimizer.plan_deliveries([
+                {
                     'item_code': material['item_code'],
-                    'description': material['description'],
-                    'unit': material['unit'],
-                    'quantity': quantity,
-                    'unit_rate': unit_price,
-                    'total': round(total, 2),
-                    'category': category,
-                    'supplier_id': best_supplier['id'],
-                    'supplier_name': best_supplier['name'],
-                    'supplier_location': best_supplier['location'],
-                    'price_confidence': price_info['confidence']
+                    'weight': self._estimate_material_weight(material, material['quantity']),
+                    'supplier_id': supplier['id'],
+                    'supplier_location': supplier['location'],
                 }
-                
-                quotation_items.append(quotation_item)
-                total_amount += total
-                
-                # Calculate transport for this material
-                material_weight = self._estimate_material_weight(material, quantity)
-                transport_info = self.transport_optimizer.calculate_transport_cost(
-                    material_weight, 
-                    best_supplier['location'], 
-                    project_location
-                )
-                transport_info['item_code'] = material['item_code']
-                transport_data.append(transport_info)
+                for material, supplier in sourced_lines
+            ], project_location)
         
-        # Step 3: Calculate totals and taxes
+        # Step 4: Calculate totals and taxes
         subtotal = total_amount
         transport_total = sum(t['total_transport_cost'] for t in transport_data)
         tax_rate = 0.16  # 16% VAT
         tax_amount = (subtotal + transport_total) * tax_rate
         grand_total = subtotal + transport_total + tax_amount
         
-        # Step 4: Generate payment schedule
-        payment_schedule = self._generate_payment_schedule(grand_total)
+        # Step 5: Generate payment schedule
+        with self._stage('payment_schedule'):
+            payment_schedule = self._generate_payment_schedule(grand_total, as_of)
         
-        # Step 5: Compile final quotation
+        # Step 6: Compile final quotation
         quotation = {
-            'quotation_id': f"QUO-{datetime.now().strftime('%Y%m%d')}-{hash(str(project_specs)) % 1000:03d}",
+            'quotation_id': f"QUO-{as_of.strftime('%Y%m%d')}-{specs_digest[:6].upper()}",
             'project_name': project_specs.get('name', 'Construction Project'),
             'project_location': project_location.title(),
-            'generated_at': datetime.now().isoformat(),
+            'generated_at': as_of.isoformat(),
             'items': quotation_items,
             'transport_breakdown': transport_data,
             'totals': {
@@ -479,6 +871,7 @@ class QuotationEngine:
             },
             'payment_schedule': payment_schedule,
             'supplier_summary': self._generate_supplier_summary(quotation_items),
+            'sourcing': sourcing,
             'validity_days': 30,
             'notes': [
                 'All prices are in Kenya Shillings (KES) and include VAT where applicable',
@@ -491,18 +884,238 @@ class QuotationEngine:
         
         return quotation
     
-    def _find_best_supplier(self, category: str, location: str) -> Dict:
+    def _find_best_supplier(self, category: str, location: str, coordinates: Any = None) -> Dict:
         """Find best supplier for a material category and location"""
-        # Simple logic - would be more sophisticated in real implementation
-        location_suppliers = {
-            'nairobi': 'SUP001',
-            'mombasa': 'SUP002', 
-            'nakuru': 'SUP003',
-            'kisumu': 'SUP004'
+        return self._find_best_suppliers([category], location, coordinates)[category]
+    
+    def _find_best_suppliers(self, categories: List[str], location: str,
+                             coordinates: Any = None) -> Dict[str, Dict]:
+        """Nearest supplier stocking each category, falling back to the default supplier"""
+        index = self.supplier_index
+        point = index.locate(location, coordinates)
+        if point is None or not len(index):
+            return {category: self.default_supplier for category in categories}
+        
+        rows, _ = index.nearest(categories, np.tile(point, (len(categories), 1)), k=1)
+        return {
+            category: index.suppliers[row] if row >= 0 else self.default_supplier
+            for category, row in zip(categories, rows[:, 0].tolist())
+        }
+    
+    def _source_lines(self, materials_by_category: Dict[str, List[Dict]], location: str,
+                      coordinates: Any, variations: np.ndarray, as_of: datetime,
+                      deadline: Optional[float] = None) -> Tuple[List[Dict], Dict]:
+        """Supplier for every line, in line order, and a summary of how they were chosen
+        
+        Candidates are the nearest suppliers stocking each category; the sourcing
+        optimizer then trades unit price against delivery cost across them.
+        Lines no candidate stocks keep the nearest-supplier fallback.
+        """
+        lines = [(category, material) for category, materials in materials_by_category.items()
+                 for material in materials]
+        nearest = self._find_best_suppliers(list(materials_by_category), location, coordinates)
+        line_suppliers = [nearest[category] for category, _ in lines]
+        
+        sourcing_config = self.config.get('sourcing', {})
+        index = self.supplier_index
+        point = index.locate(location, coordinates)
+        if not sourcing_config.get('enabled', True) or point is None or not len(index) or not lines:
+            return line_suppliers, {'strategy': 'nearest'}
+        
+        categories = list(materials_by_category)
+        rows, _ = index.nearest(categories, np.tile(point, (len(categories), 1)),
+                                k=sourcing_config.get('candidates', 5))
+        candidates = [index.suppliers[row] for row in sorted(set(rows[rows >= 0].tolist()))]
+        covered = {category for category, row in zip(categories, rows[:, 0].tolist()) if row >= 0}
+        sourceable = [i for i, (category, _) in enumerate(lines) if category in covered]
+        if not sourceable:
+            return line_suppliers, {'strategy': 'nearest'}
+        
+        items = [{
+            'item_code': lines[i][1]['item_code'],
+            'category': lines[i][0],
+            'quantity': lines[i][1]['quantity'],
+            'weight': self._estimate_material_weight(lines[i][1], lines[i][1]['quantity']),
+        } for i in sourceable]
+        unit_prices = self.price_predictor.price_matrix(
+            [item['item_code'] for item in items], location,
+            [supplier['id'] for supplier in candidates], variations[sourceable], as_of,
+            categories=[item['category'] for item in items]
+        )
+        candidate_position = {supplier['id']: s for s, supplier in enumerate(candidates)}
+        baseline = [candidate_position.get(line_suppliers[i]['id']) for i in sourceable]
+        
+        time_budget = sourcing_config.get('time_budget', 0.5)
+        if deadline is not None:
+            time_budget = max(min(time_budget, deadline - time.monotonic()), 0.0)
+        result = self.transport_optimizer.optimize_multi_supplier_transport(
+            items, candidates, location, unit_prices,
+            baseline=None if None in baseline else baseline,
+            max_passes=sourcing_config.get('max_passes', 10),
+            time_budget=time_budget
+        )
+        
+        for i, supplier_id in zip(sourceable, result['assignment']):
+            line_suppliers[i] = index.by_id[supplier_id]
+        
+        return line_suppliers, {
+            'strategy': 'optimized',
+            'candidate_suppliers': len(candidates),
+            'suppliers_used': len(set(result['assignment'])),
+            'delivered_cost': result['total_cost'],
+            'baseline_supplier': result['baseline_supplier'],
+            'baseline_cost': result['baseline_cost'],
+            'optimization_savings': result['optimization_savings'],
+            'min_order_violations': result['min_order_violations']
         }
+    
+    def nearest_suppliers(self, category: str, location: str, coordinates: Any = None,
+                          k: Optional[int] = None) -> List[Dict]:
+        """The k nearest suppliers stocking ``category`` with their straight-line ``distance_km``"""
+        point = self.supplier_index.locate(location, coordinates)
+        if point is None:
+            return []
+        return self.supplier_index.nearest_suppliers(category, point, k or self.supplier_candidates)
+    
+    def _comparison_suppliers(self, categories: List[str], location: str, coordinates: Any = None,
+                              supplier_ids: Optional[List[str]] = None) -> List[Dict]:
+        """Requested suppliers, else the nearest ones stocking each category (all when unlocated)"""
+        index = self.supplier_index
+        if supplier_ids is not None:
+            return [self.suppliers[supplier_id] for supplier_id in dict.fromkeys(supplier_ids)
+                    if supplier_id in self.suppliers]
+        point = index.locate(location, coordinates)
+        if point is None or not len(index):
+            return list(self.suppliers.values())
+        
+        categories = sorted(set(categories))
+        k = self.config.get('sourcing', {}).get('comparison_candidates', 10)
+        rows, _ = index.nearest(categories, np.tile(point, (len(categories), 1)), k=k)
+        return [index.suppliers[row] for row in sorted(set(rows[rows >= 0].tolist()))]
+    
+    def compare_suppliers(self, lines: List[Dict], location: str, coordinates: Any = None,
+                          supplier_ids: Optional[List[str]] = None,
+                          as_of: Optional[datetime] = None) -> Dict[str, Any]:
+        """Price every line against every eligible supplier, delivered to the project
         
-        supplier_id = location_suppliers.get(location, 'SUP001')
-        return self.suppliers[supplier_id]
+        ``lines`` carry ``item_code``, ``category``, ``quantity`` and optionally
+        ``weight`` (kg). Suppliers are ``supplier_ids`` or the nearest ones
+        stocking each category. Returns the items x suppliers unit price, goods
+        and delivered cost matrices (None where a supplier cannot fill a line),
+        every supplier's full basket with consolidated delivery, and the
+        cheapest mixed basket from the sourcing optimizer. Prices are catalog
+        prices without market variation, so repeated comparisons agree.
+        """
+        started = time.perf_counter()
+        location = location.lower()
+        as_of = as_of or datetime.now()
+        items = [
+            {
+                'item_code': line['item_code'],
+                'category': line['category'],
+                'quantity': float(line['quantity']),
+                'weight': float(line['weight']) if line.get('weight') is not None
+                else self._estimate_material_weight(line, float(line['quantity'])),
+            }
+            for line in lines
+        ]
+        suppliers = self._comparison_suppliers(
+            [item['category'] for item in items], location, coordinates, supplier_ids
+        )
+        if not items or not suppliers:
+            return {'items': items, 'suppliers': [], 'unit_prices': [], 'goods': [], 'delivered': [],
+                    'baskets': [], 'best_single_supplier': None, 'mixed_basket': None}
+        
+        # Step 1: Items x suppliers unit prices, masked to what each supplier can fill
+        transport = self.transport_optimizer
+        quantities = np.array([item['quantity'] for item in items])
+        weights = np.array([item['weight'] for item in items])
+        feasible = transport.supplier_feasibility(items, suppliers)
+        unit_prices = np.round(self.price_predictor.price_matrix(
+            [item['item_code'] for item in items], location, [supplier['id'] for supplier in suppliers],
+            np.ones(len(items)), as_of, categories=[item['category'] for item in items]
+        ), 2)
+        unit_prices[~feasible] = np.nan
+        goods = unit_prices * quantities[:, None]
+        
+        # Step 2: Delivered cost of each line shipped on its own, and of each supplier's whole basket
+        distances = transport.get_distances(
+            [supplier['location'] for supplier in suppliers], [location] * len(suppliers)
+        )
+        delivered = goods + transport.delivery_costs(weights[:, None], distances[None, :])
+        basket_goods = np.where(feasible, goods, 0.0).sum(axis=0)
+        basket_transport = transport.basket_delivery_costs(weights, feasible, distances)
+        complete = feasible.all(axis=0)
+        
+        baskets = [
+            {
+                'supplier_id': supplier['id'],
+                'complete': bool(is_complete),
+                'lines_covered': int(covered),
+                'missing_items': [items[i]['item_code'] for i in np.flatnonzero(~feasible[:, s]).tolist()],
+                'goods_cost': round(float(goods_cost), 2),
+                'transport_cost': round(float(transport_cost), 2),
+                'total_cost': round(float(goods_cost + transport_cost), 2),
+            }
+            for s, (supplier, is_complete, covered, goods_cost, transport_cost) in enumerate(zip(
+                suppliers, complete.tolist(), feasible.sum(axis=0).tolist(),
+                basket_goods.tolist(), basket_transport.tolist()
+            ))
+        ]
+        baskets.sort(key=lambda basket: (not basket['complete'], basket['total_cost']))
+        best_single = baskets[0] if baskets[0]['complete'] else None
+        
+        # Step 3: Cheapest mix of suppliers for the lines someone can fill
+        sourceable = np.flatnonzero(feasible.any(axis=1))
+        mixed = None
+        if len(sourceable):
+            sourcing_config = self.config.get('sourcing', {})
+            result = transport.optimize_multi_supplier_transport(
+                [items[i] for i in sourceable.tolist()], suppliers, location, unit_prices[sourceable],
+                max_passes=sourcing_config.get('max_passes', 10),
+                time_budget=sourcing_config.get('time_budget', 0.5)
+            )
+            mixed = {
+                'assignment': [
+                    {'item_code': items[i]['item_code'], 'supplier_id': supplier_id}
+                    for i, supplier_id in zip(sourceable.tolist(), result['assignment'])
+                ],
+                'suppliers_used': len(set(result['assignment'])),
+                'goods_cost': result['goods_cost'],
+                'transport_cost': result['total_transport_cost'],
+                'total_cost': round(result['goods_cost'] + result['total_transport_cost'], 2),
+                'transport_breakdown': result['transport_breakdown'],
+                'unsourced_items': [items[i]['item_code'] for i in np.flatnonzero(~feasible.any(axis=1)).tolist()],
+                'min_order_violations': result['min_order_violations'],
+            }
+            if best_single is not None:
+                mixed['savings_vs_best_single'] = round(best_single['total_cost'] - mixed['total_cost'], 2)
+        
+        def cells(matrix: np.ndarray) -> List[List[Optional[float]]]:
+            return [[value if math.isfinite(value) else None for value in row]
+                    for row in np.round(matrix, 2).tolist()]
+        
+        elapsed = time.perf_counter() - started
+        logger.debug(f"Compared {len(items)} lines across {len(suppliers)} suppliers in {elapsed:.3f}s")
+        return {
+            'items': items,
+            'suppliers': [
+                {'id': supplier['id'], 'name': supplier.get('name'), 'location': supplier['location'],
+                 'distance_km': round(distance, 1)}
+                for supplier, distance in zip(suppliers, distances.tolist())
+            ],
+            'unit_prices': cells(unit_prices),
+            'goods': cells(goods),
+            'delivered': cells(delivered),
+            'cheapest_delivered': [
+                suppliers[s]['id'] if feasible[i].any() else None
+                for i, s in enumerate(np.argmin(np.where(feasible, delivered, np.inf), axis=1).tolist())
+            ],
+            'baskets': baskets,
+            'best_single_supplier': best_single['supplier_id'] if best_single else None,
+            'mixed_basket': mixed,
+            'seconds': round(elapsed, 3),
+        }
     
     def _estimate_material_weight(self, material: Dict, quantity: float) -> float:
         """Estimate weight of materials for transport calculation"""
@@ -521,42 +1134,44 @@ class QuotationEngine:
         
         return quantity * factor
     
-    def _generate_payment_schedule(self, total_amount: float) -> List[Dict]:
+    def _generate_payment_schedule(self, total_amount: float,
+                                   as_of: Optional[datetime] = None) -> List[Dict]:
         """Generate payment schedule for the project"""
+        start = as_of or datetime.now()
         return [
             {
                 'phase': 'Mobilization',
                 'percentage': 10,
                 'amount': round(total_amount * 0.1, 2),
-                'due_date': (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d'),
+                'due_date': (start + timedelta(days=7)).strftime('%Y-%m-%d'),
                 'description': 'Initial mobilization payment'
             },
             {
                 'phase': 'Foundation',
                 'percentage': 25,
                 'amount': round(total_amount * 0.25, 2),
-                'due_date': (datetime.now() + timedelta(days=30)).strftime('%Y-%m-%d'),
+                'due_date': (start + timedelta(days=30)).strftime('%Y-%m-%d'),
                 'description': 'Foundation completion'
             },
             {
                 'phase': 'Structural Work',
                 'percentage': 35,
                 'amount': round(total_amount * 0.35, 2),
-                'due_date': (datetime.now() + timedelta(days=60)).strftime('%Y-%m-%d'),
+                'due_date': (start + timedelta(days=60)).strftime('%Y-%m-%d'),
                 'description': 'Structural work completion'
             },
             {
                 'phase': 'Finishing',
                 'percentage': 25,
                 'amount': round(total_amount * 0.25, 2),
-                'due_date': (datetime.now() + timedelta(days=90)).strftime('%Y-%m-%d'),
+                'due_date': (start + timedelta(days=90)).strftime('%Y-%m-%d'),
                 'description': 'Finishing work completion'
             },
             {
                 'phase': 'Final Payment',
                 'percentage': 5,
                 'amount': round(total_amount * 0.05, 2),
-                'due_date': (datetime.now() + timedelta(days=100)).strftime('%Y-%m-%d'),
+                'due_date': (start + timedelta(days=100)).strftime('%Y-%m-%d'),
                 'description': 'Final payment upon handover'
             }
         ]
@@ -0,0 +1,206 @@
+"""
+Road Network Distances for the Quotation Engine
+Builds all-pairs shortest road distances from an edge list of towns and
+junctions, caches the dense matrix as a memory-mapped .npy file and answers
+single or batched origin/destination queries with array gathers.
+"""
+
+import os
+import csv
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy as np
+from typing import Dict, List, Optional, Iterable, Tuple
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Built-in network used when no edge file is configured (km, undirected)
+DEFAULT_EDGES = [
+    ('nairobi', 'mombasa', 480),
+    ('nairobi', 'nakuru', 160),
+    ('nakuru', 'kisumu', 190),
+    ('nakuru', 'eldoret', 160),
+]
+
+# Accepted column names in edge files, first match wins
+FROM_COLUMNS = ('from', 'origin', 'source')
+TO_COLUMNS = ('to', 'destination', 'target')
+KM_COLUMNS = ('km', 'distance_km', 'distance')
+
+
+def town_key(name: str) -> str:
+    """Normalized town name: lower case, single spaces"""
+    return ' '.join(str(name).replace('_', ' ').replace('-', ' ').lower().split())
+
+
+def read_edges(path: Path) -> List[Tuple[str, str, float]]:
+    """Read ``from,to,km`` rows from a CSV edge list"""
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        columns = reader.fieldnames or []
+
+        def pick(candidates):
+            for name in candidates:
+                if name in columns:
+                    return name
+            raise ValueError(f"Road edge file is missing one of the columns {list(candidates)}")
+
+        from_col, to_col, km_col = pick(FROM_COLUMNS), pick(TO_COLUMNS), pick(KM_COLUMNS)
+        return [(row[from_col], row[to_col], float(row[km_col])) for row in reader]
+
+
+def shortest_distances(edges: Iterable[Tuple[str, str, float]]) -> Tuple[List[str], np.ndarray]:
+    """All-pairs shortest road distances; returns sorted town names and a float32 matrix (inf if unreachable)"""
+    from scipy.sparse import coo_matrix
+    from scipy.sparse.csgraph import shortest_path
+
+    edges = [(town_key(a), town_key(b), float(km)) for a, b, km in edges]
+    towns = sorted({a for a, _, _ in edges} | {b for _, b, _ in edges})
+    index = {town: row for row, town in enumerate(towns)}
+
+    # Keep the shortest of any parallel edges; coo_matrix would sum them
+    lengths = {}
+    for a, b, km in edges:
+        if a == b:
+            continue
+        pair = (index[a], index[b])
+        lengths[pair] = min(km, lengths.get(pair, km))
+    rows, cols = zip(*lengths) if lengths else ((), ())
+    graph = coo_matrix((list(lengths.values()), (rows, cols)), shape=(len(towns), len(towns))).tocsr()
+
+    matrix = shortest_path(graph, method='D', directed=False)
+    return towns, matrix.astype(np.float32)
+
+
+class RoadNetwork:
+    """Shortest road distances between towns, backed by a memory-mapped matrix"""
+
+    def __init__(self, edges_path: Optional[str] = None, cache_dir: Optional[str] = None):
+        self.edges_path = Path(edges_path) if edges_path else None
+        self.cache_dir = Path(cache_dir or os.path.join(tempfile.gettempdir(), 'jmss_road_network'))
+        self.towns: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+        self.version = 'builtin'
+        self.load()
+
+    @classmethod
+    def from_config(cls, network_config: Optional[Dict], base_dir: Optional[Path] = None) -> 'RoadNetwork':
+        """Create a network from the ``transport_optimization.road_network`` config section"""
+        network_config = network_config or {}
+
+        def resolve(key):
+            value = network_config.get(key)
+            if not value:
+                return None
+            path = Path(value)
+            return str(path if path.is_absolute() or base_dir is None else base_dir / path)
+
+        return cls(edges_path=resolve('edges'), cache_dir=resolve('cache_dir'))
+
+    @classmethod
+    def from_edges(cls, edges: Iterable[Tuple[str, str, float]]) -> 'RoadNetwork':
+        """Create an in-memory network from ``(from, to, km)`` edges"""
+        network = cls.__new__(cls)
+        network.edges_path = None
+        network.cache_dir = None
+        network._set(*shortest_distances(edges), 'memory')
+        return network
+
+    def _set(self, towns: List[str], matrix: np.ndarray, version: str):
+        self.towns = list(towns)
+        self.index = {town: row for row, town in enumerate(self.towns)}
+        self.matrix = matrix
+        self.version = version
+
+    def _signature(self) -> str:
+        stat = self.edges_path.stat()
+        parts = f'{self.edges_path.resolve()}:{stat.st_size}:{stat.st_mtime_ns}'
+        return hashlib.sha256(parts.encode('utf-8')).hexdigest()[:16]
+
+    def load(self):
+        """Load the cached matrix for the edge file, building it on first use"""
+        if self.edges_path is None:
+            self._set(*shortest_distances(DEFAULT_EDGES), 'builtin')
+            return
+
+        try:
+            signature = self._signature()
+        except OSError as exc:
+            logger.error(f"Road edge file unavailable, using the built-in network: {exc}")
+            self._set(*shortest_distances(DEFAULT_EDGES), 'builtin')
+            return
+
+        loaded = self._load_cached(signature) or self._build_cache(signature)
+        self._set(*loaded, signature)
+        logger.info(f"Loaded road network {signature} ({len(self.towns)} towns)")
+
+    def _load_cached(self, signature: str) -> Optional[Tuple[List[str], np.ndarray]]:
+        directory = self.cache_dir / signature
+        if not (directory / 'manifest.json').exists():
+            return None
+        try:
+            with open(directory / 'manifest.json', 'r') as f:
+                towns = json.load(f)['towns']
+            return towns, np.load(directory / 'distances.npy', mmap_mode='r')
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning(f"Discarding unreadable road network cache {directory}: {exc}")
+            return None
+
+    def _build_cache(self, signature: str) -> Tuple[List[str], np.ndarray]:
+        """Solve all pairs, publish the matrix atomically and memory-map it"""
+        towns, matrix = shortest_distances(read_edges(self.edges_path))
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        staging = Path(tempfile.mkdtemp(prefix=f'.{signature}-', dir=self.cache_dir))
+        try:
+            np.save(staging / 'distances.npy', matrix)
+            with open(staging / 'manifest.json', 'w') as f:
+                json.dump({'signature': signature, 'towns': towns}, f)
+            # Another worker may have published the same signature first; either copy is valid
+            os.replace(staging, self.cache_dir / signature)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        return self._load_cached(signature) or (towns, matrix)
+
+    def row(self, town: str) -> int:
+        """Matrix row for a town, -1 when unknown
+
+        Addresses such as ``"Westlands, Nairobi"`` resolve to their last known part.
+        """
+        row = self.index.get(town_key(town))
+        if row is not None:
+            return row
+        for part in reversed(str(town).split(',')):
+            row = self.index.get(town_key(part))
+            if row is not None:
+                return row
+        return -1
+
+    def rows(self, towns: Iterable[str]) -> np.ndarray:
+        """Matrix row for each town, -1 when unknown"""
+        return np.fromiter((self.row(town) for town in towns), dtype=np.int64)
+
+    def distances(self, origins: Iterable[str], destinations: Iterable[str]) -> np.ndarray:
+        """Road distance for each origin/destination pair; NaN when unknown or unreachable"""
+        origin_rows = self.rows(origins)
+        destination_rows = self.rows(destinations)
+        if len(origin_rows) != len(destination_rows):
+            raise ValueError("origins and destinations must have the same length")
+        if not len(self.towns):
+            return np.full(len(origin_rows), np.nan)
+
+        found = (origin_rows >= 0) & (destination_rows >= 0)
+        gathered = self.matrix[np.maximum(origin_rows, 0), np.maximum(destination_rows, 0)].astype(np.float64)
+        gathered[~found | np.isinf(gathered)] = np.nan
+        return gathered
+
+    def distance(self, origin: str, destination: str) -> Optional[float]:
+        """Road distance between two towns, None when unknown or unreachable"""
+        value = self.distances([origin], [destination])[0]
+        return None if np.isnan(value) else float(value)
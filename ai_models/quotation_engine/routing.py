@@ -0,0 +1,231 @@
+"""
+Fleet Routing for Pending Deliveries
+Plans multi-drop truck routes for deliveries from many quotations at once.
+Routes start and end at the supplier's town; Clarke-Wright savings merge drops
+into routes under the truck capacity (and an optional same-day route length),
+then 2-opt straightens each route over the precomputed road distances.
+"""
+
+import time
+import numpy as np
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+EPSILON = 1e-9
+
+
+class FleetRouter:
+    """Clarke-Wright savings plus 2-opt over a TransportOptimizer's fleet and road network"""
+
+    def __init__(self, transport, max_route_km: Optional[float] = None):
+        self.transport = transport
+        self.max_route_km = max_route_km
+        self.capacity = float(max(transport.vehicle_capacity.values()))
+
+    def _vehicle(self, load: float) -> str:
+        """Smallest vehicle carrying ``load`` (loads never exceed the largest truck)"""
+        return min((capacity, vehicle_type) for vehicle_type, capacity in self.transport.vehicle_capacity.items()
+                   if capacity >= load - EPSILON)[1]
+
+    def route_cost(self, vehicle_type: str, distance_km: float, stops: int) -> Dict[str, float]:
+        """Cost of driving a route; an out-and-back single drop costs exactly one trip"""
+        transport = self.transport
+        fuel_liters = distance_km / transport.fuel_consumption[vehicle_type]
+        fuel_cost = fuel_liters * transport.fuel_cost_per_liter
+        # Trips charge cost_per_km on the one-way distance, i.e. half the route length
+        driver_cost = distance_km / 2 * transport.cost_per_km[vehicle_type]
+        loading_cost = transport.loading_cost * stops
+        return {
+            'fuel_liters': fuel_liters,
+            'fuel_cost': fuel_cost,
+            'driver_cost': driver_cost,
+            'loading_cost': loading_cost,
+            'total_cost': fuel_cost + driver_cost + loading_cost,
+        }
+
+    def plan(self, drops: List[Dict]) -> Dict:
+        """Route ``drops`` (``drop_id``, ``origin``, ``destination``, ``load_kg``)
+
+        Drops sharing an ``origin`` leave from the same depot. An optional
+        ``site`` tells apart projects in the same town; drops to one site are
+        unloaded at a single stop. Returns the routes and a summary comparing
+        them with delivering every drop on its own trip, as each quotation is
+        costed in isolation.
+        """
+        started = time.perf_counter()
+        drops = self._split_oversized(drops)
+
+        # Step 1: One node per depot and per site, one distance matrix over all of them
+        nodes: Dict[tuple, int] = {}
+        towns: List[str] = []
+
+        def node(key: tuple, town: str) -> int:
+            if key not in nodes:
+                nodes[key] = len(towns)
+                towns.append(town)
+            return nodes[key]
+
+        depot_of = [node(('depot', drop['origin']), drop['origin']) for drop in drops]
+        stop_of = [node(('site', drop['destination'], drop.get('site')), drop['destination']) for drop in drops]
+        distances = self.transport.distance_matrix(towns)
+
+        by_depot: Dict[int, List[int]] = {}
+        for i, depot in enumerate(depot_of):
+            by_depot.setdefault(depot, []).append(i)
+
+        # Step 2: Per depot, baseline trips and routed deliveries
+        routes = []
+        baseline = {'distance_km': 0.0, 'fuel_liters': 0.0, 'total_cost': 0.0}
+        for depot, members in by_depot.items():
+            stop_index = np.array([stop_of[i] for i in members], dtype=np.int64)
+            loads = np.array([float(drops[i]['load_kg']) for i in members])
+
+            out_and_back = 2 * distances[depot, stop_index]
+            for length, load in zip(out_and_back.tolist(), loads.tolist()):
+                cost = self.route_cost(self._vehicle(load), length, 1)
+                baseline['distance_km'] += length
+                baseline['fuel_liters'] += cost['fuel_liters']
+                baseline['total_cost'] += cost['total_cost']
+
+            for sequence in self._savings(distances, depot, stop_index, loads):
+                sequence = self._two_opt(distances, depot, stop_index, sequence)
+                path = [depot] + stop_index[sequence].tolist() + [depot]
+                length = float(distances[path[:-1], path[1:]].sum())
+                load = float(loads[sequence].sum())
+                vehicle_type = self._vehicle(load)
+                # Consecutive drops at one site are a single stop
+                cost = self.route_cost(vehicle_type, length, len(set(stop_index[sequence].tolist())))
+                routes.append({
+                    'route_id': f"R{len(routes) + 1:04d}",
+                    'depot': towns[depot],
+                    'vehicle_type': vehicle_type,
+                    'load_kg': round(load, 2),
+                    'distance_km': round(length, 1),
+                    'fuel_liters': round(cost['fuel_liters'], 1),
+                    'fuel_cost': round(cost['fuel_cost'], 2),
+                    'driver_cost': round(cost['driver_cost'], 2),
+                    'loading_cost': round(cost['loading_cost'], 2),
+                    'total_cost': round(cost['total_cost'], 2),
+                    'stops': [
+                        {
+                            **{key: value for key, value in drops[members[k]].items() if key != 'origin'},
+                            'load_kg': round(float(loads[k]), 2),
+                        }
+                        for k in sequence
+                    ],
+                })
+
+        # Step 3: Compare with one trip per drop
+        routed = {
+            'distance_km': sum(route['distance_km'] for route in routes),
+            'fuel_liters': sum(route['fuel_liters'] for route in routes),
+            'total_cost': sum(route['total_cost'] for route in routes),
+        }
+        elapsed = time.perf_counter() - started
+        logger.debug(f"Routed {len(drops)} drops into {len(routes)} routes in {elapsed:.3f}s")
+        return {
+            'routes': routes,
+            'summary': {
+                'drops': len(drops),
+                'routes': len(routes),
+                'baseline_trips': len(drops),
+                'baseline_distance_km': round(baseline['distance_km'], 1),
+                'routed_distance_km': round(routed['distance_km'], 1),
+                'baseline_fuel_liters': round(baseline['fuel_liters'], 1),
+                'routed_fuel_liters': round(routed['fuel_liters'], 1),
+                'fuel_saved_liters': round(baseline['fuel_liters'] - routed['fuel_liters'], 1),
+                'baseline_cost': round(baseline['total_cost'], 2),
+                'routed_cost': round(routed['total_cost'], 2),
+                'cost_saved': round(baseline['total_cost'] - routed['total_cost'], 2),
+                'seconds': round(elapsed, 3),
+            },
+        }
+
+    def _split_oversized(self, drops: List[Dict]) -> List[Dict]:
+        """Drops heavier than the largest truck become several truck-sized drops"""
+        split = []
+        for drop in drops:
+            load = float(drop['load_kg'])
+            if load <= self.capacity + EPSILON:
+                split.append(drop)
+                continue
+            parts = int(np.ceil(load / self.capacity))
+            split.extend({**drop, 'drop_id': f"{drop['drop_id']}/{part}", 'load_kg': load / parts}
+                         for part in range(1, parts + 1))
+        return split
+
+    def _savings(self, distances: np.ndarray, depot: int, stops: np.ndarray, loads: np.ndarray) -> List[List[int]]:
+        """Parallel Clarke-Wright: merge route ends in order of distance saved
+
+        A merge must fit one truck, stay within ``max_route_km`` and cost less
+        than the two routes it replaces (a bigger truck runs dearer per km).
+        """
+        count = len(stops)
+        from_depot = distances[depot, stops]
+        routes = {k: [k] for k in range(count)}
+        route_of = list(range(count))
+        route_load = {k: loads[k] for k in range(count)}
+        route_length = {k: 2 * from_depot[k] for k in range(count)}
+        route_sites = {k: {stops[k]} for k in range(count)}
+        route_total = {k: self._total(loads[k], route_length[k], 1) for k in range(count)}
+        if count < 2:
+            return list(routes.values())
+
+        first, second = np.triu_indices(count, 1)
+        savings = from_depot[first] + from_depot[second] - distances[stops[first], stops[second]]
+        positive = savings > EPSILON
+        first, second, savings = first[positive], second[positive], savings[positive]
+        order = np.argsort(-savings, kind='stable')
+
+        for i, j, saving in zip(first[order].tolist(), second[order].tolist(), savings[order].tolist()):
+            a, b = route_of[i], route_of[j]
+            if a == b or route_load[a] + route_load[b] > self.capacity + EPSILON:
+                continue
+            length = route_length[a] + route_length[b] - saving
+            if self.max_route_km is not None and length > self.max_route_km + EPSILON:
+                continue
+            # i must end route a and j must start route b (either may be reversed)
+            left, right = routes[a], routes[b]
+            if left[0] != i and left[-1] != i or right[0] != j and right[-1] != j:
+                continue
+            sites = route_sites[a] | route_sites[b]
+            total = self._total(route_load[a] + route_load[b], length, len(sites))
+            if total >= route_total[a] + route_total[b] - EPSILON:
+                continue
+
+            if left[-1] != i:
+                left.reverse()
+            if right[0] != j:
+                right.reverse()
+            left.extend(right)
+            for k in right:
+                route_of[k] = a
+            route_load[a] += route_load.pop(b)
+            route_length[a] = length
+            route_sites[a] = sites
+            route_total[a] = total
+            del routes[b], route_length[b], route_sites[b], route_total[b]
+
+        return list(routes.values())
+
+    def _total(self, load: float, distance_km: float, stops: int) -> float:
+        return self.route_cost(self._vehicle(load), distance_km, stops)['total_cost']
+
+    def _two_opt(self, distances: np.ndarray, depot: int, stops: np.ndarray, sequence: List[int]) -> List[int]:
+        """Reverse route segments while that shortens the route (all moves scored at once)"""
+        if len(sequence) < 3:
+            return sequence
+        sequence = list(sequence)
+        while True:
+            path = np.array([depot] + stops[sequence].tolist() + [depot])
+            a, b = path[:-1], path[1:]
+            edges = distances[a, b]
+            # Replacing edges (a_i, b_i) and (a_j, b_j) by (a_i, a_j) and (b_i, b_j)
+            delta = distances[np.ix_(a, a)] + distances[np.ix_(b, b)] - edges[:, None] - edges[None, :]
+            delta[np.tril_indices(len(a), 1)] = np.inf
+            i, j = np.unravel_index(np.argmin(delta), delta.shape)
+            if delta[i, j] >= -EPSILON:
+                return sequence
+            sequence[i:j] = reversed(sequence[i:j])
@@ -0,0 +1,276 @@
+"""
+Multi-Supplier Sourcing Optimizer for the Quotation Engine
+Assigns every quotation line to one supplier so that goods plus delivery cost
+is minimal, subject to what each supplier stocks and its minimum order value.
+Two starting assignments (cheapest goods per line and greedy insertion) are
+repaired for minimum orders; local search then closes whole suppliers and
+relocates single lines while that lowers the total.
+"""
+
+import time
+import numpy as np
+from typing import Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# delivery_cost(loads_kg, distances_km) -> cost of one delivery per supplier, 0 for an empty load
+DeliveryCost = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+EPSILON = 1e-6
+
+
+class _Assignment:
+    """Mutable assignment with per-supplier load, goods value and delivery cost kept in step"""
+
+    def __init__(self, problem: 'SourcingOptimizer', columns: np.ndarray):
+        self.problem = problem
+        self.columns = columns.astype(np.int64)
+        size = len(problem.distances)
+        self.loads = np.bincount(self.columns, weights=problem.weights, minlength=size)
+        self.values = np.bincount(
+            self.columns, weights=problem.goods[np.arange(len(self.columns)), self.columns], minlength=size
+        )
+        self.delivery = problem.delivery_cost(self.loads, problem.distances)
+        self.closed = np.zeros(size, dtype=bool)
+
+    def copy(self) -> '_Assignment':
+        other = _Assignment.__new__(_Assignment)
+        other.problem = self.problem
+        other.columns = self.columns.copy()
+        other.loads = self.loads.copy()
+        other.values = self.values.copy()
+        other.delivery = self.delivery.copy()
+        other.closed = self.closed.copy()
+        return other
+
+    @property
+    def cost(self) -> float:
+        return float(self.values.sum() + self.delivery.sum())
+
+    def insertion_costs(self, i: int) -> np.ndarray:
+        """Goods plus extra delivery cost of adding line ``i`` to each supplier"""
+        problem = self.problem
+        added = problem.delivery_cost(self.loads + problem.weights[i], problem.distances) - self.delivery
+        costs = problem.goods[i] + added
+        costs[self.closed] = np.inf
+        return costs
+
+    def _update(self, s: int):
+        self.delivery[s] = self.problem.delivery_cost(self.loads[s:s + 1], self.problem.distances[s:s + 1])[0]
+
+    def move(self, i: int, target: Optional[int] = None):
+        """Move line ``i`` to ``target``, or to its cheapest open supplier"""
+        problem = self.problem
+        source = self.columns[i]
+        self.loads[source] -= problem.weights[i]
+        self.values[source] -= problem.goods[i, source]
+        self._update(source)
+        if target is None:
+            target = int(np.argmin(self.insertion_costs(i)))
+        self.columns[i] = target
+        self.loads[target] += problem.weights[i]
+        self.values[target] += problem.goods[i, target]
+        self._update(target)
+
+
+class SourcingOptimizer:
+    """Greedy plus local search over an items x suppliers cost matrix"""
+
+    def __init__(self, delivery_cost: DeliveryCost, max_passes: int = 10, time_budget: float = 0.5):
+        self.delivery_cost = delivery_cost
+        self.max_passes = max_passes
+        self.time_budget = time_budget
+
+    def optimize(self, unit_costs: np.ndarray, quantities: np.ndarray, weights: np.ndarray,
+                 distances: np.ndarray, feasible: Optional[np.ndarray] = None,
+                 min_order: Optional[np.ndarray] = None,
+                 baseline: Optional[np.ndarray] = None) -> Dict:
+        """Choose a supplier column for every item row
+
+        ``unit_costs`` is items x suppliers, ``feasible`` masks the pairs a
+        supplier can fill (stock, category) and ``min_order`` is each
+        supplier's minimum goods value. Savings are reported against the
+        cheapest single supplier covering every line, or ``baseline`` (a
+        column per row) when no such supplier exists.
+        """
+        self._started = time.perf_counter()
+        n_items, n_suppliers = unit_costs.shape
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.min_order = (np.zeros(n_suppliers) if min_order is None
+                          else np.asarray(min_order, dtype=np.float64))
+
+        goods = np.asarray(unit_costs, dtype=np.float64) * np.asarray(quantities, dtype=np.float64)[:, None]
+        allowed = np.isfinite(goods)
+        if feasible is not None:
+            allowed &= feasible
+        self.goods = np.where(allowed, goods, np.inf)
+
+        unplaceable = ~allowed.any(axis=1)
+        if unplaceable.any():
+            raise ValueError(f"{int(unplaceable.sum())} items have no feasible supplier")
+
+        # Step 1: Starting points, each repaired for minimum orders; keep the cheaper
+        starts = [self._repair(_Assignment(self, np.argmin(self.goods, axis=1))),
+                  self._repair(self._greedy(n_items, n_suppliers))]
+        state = min(starts, key=lambda start: (len(start.violations), start.cost))
+
+        # Step 2: Local search until no move helps or the time budget runs out
+        passes = 0
+        while passes < self.max_passes and not self._out_of_time():
+            passes += 1
+            improved = self._close_pass(state)
+            improved |= self._relocate_pass(state)
+            if not improved:
+                break
+
+        # Step 3: Compare with sourcing everything from one supplier
+        single = self._single_supplier(n_suppliers)
+        if single is not None:
+            baseline_cost = _Assignment(self, np.full(n_items, single)).cost
+        elif baseline is not None and np.isfinite(self.goods[np.arange(n_items), baseline]).all():
+            baseline_cost = _Assignment(self, np.asarray(baseline)).cost
+        else:
+            baseline_cost = None
+
+        cost = state.cost
+        elapsed = time.perf_counter() - self._started
+        logger.debug(f"Sourced {n_items} items from {n_suppliers} suppliers in {passes} passes, {elapsed:.3f}s")
+        return {
+            'assignment': state.columns,
+            'total_cost': cost,
+            'goods_cost': float(state.values.sum()),
+            'baseline_supplier': single,
+            'baseline_cost': baseline_cost,
+            'savings': max(baseline_cost - cost, 0.0) if baseline_cost is not None else 0.0,
+            'min_order_violations': state.violations,
+            'passes': passes,
+            'seconds': elapsed,
+        }
+
+    def _out_of_time(self) -> bool:
+        return time.perf_counter() - self._started >= self.time_budget
+
+    def _single_supplier(self, n_suppliers: int) -> Optional[int]:
+        """Cheapest supplier able to deliver every line on its own, None if there is none"""
+        loads = np.full(n_suppliers, self.weights.sum())
+        totals = self.goods.sum(axis=0) + self.delivery_cost(loads, self.distances)
+        totals[totals < self.min_order - EPSILON] = np.inf
+        if not np.isfinite(totals).any():
+            return None
+        return int(np.argmin(totals))
+
+    def _greedy(self, n_items: int, n_suppliers: int) -> _Assignment:
+        """Insert lines heaviest first (they drive delivery cost) where they add least"""
+        state = _Assignment(self, np.zeros(n_items, dtype=np.int64))
+        state.loads[:] = 0
+        state.values[:] = 0
+        state.delivery[:] = 0
+        for i in np.argsort(-self.weights, kind='stable'):
+            s = int(np.argmin(state.insertion_costs(i)))
+            state.columns[i] = s
+            state.loads[s] += self.weights[i]
+            state.values[s] += self.goods[i, s]
+            state._update(s)
+        return state
+
+    def _repair(self, state: _Assignment) -> _Assignment:
+        """Close suppliers below their minimum order, smallest first; unfixable ones are reported"""
+        state.violations = []
+        for s in np.argsort(state.values):
+            if not (0 < state.values[s] < self.min_order[s] - EPSILON):
+                continue
+            lines = np.flatnonzero(state.columns == s)
+            others = np.isfinite(self.goods[lines]) & ~state.closed
+            others[:, s] = False
+            if not others.any(axis=1).all():
+                state.violations.append(int(s))
+                continue
+            state.closed[s] = True
+            for i in lines:
+                state.move(i)
+        return state
+
+    def _close_pass(self, state: _Assignment) -> bool:
+        """Try emptying each open supplier into the others; keeps the change when it is cheaper"""
+        improved = False
+        open_suppliers = np.flatnonzero(state.loads > 0)
+        for s in open_suppliers[np.argsort(state.values[open_suppliers])]:
+            if self._out_of_time():
+                break
+            lines = np.flatnonzero(state.columns == s)
+            if not len(lines):
+                continue
+            others = ~state.closed & (state.loads > 0)
+            others[s] = False
+            # Lower bound on the change: cheapest goods elsewhere minus the saved delivery
+            cheapest = self.goods[lines][:, others].min(axis=1) if others.any() else np.full(len(lines), np.inf)
+            if not np.isfinite(cheapest).all() or cheapest.sum() - state.values[s] - state.delivery[s] >= 0:
+                continue
+
+            trial = state.copy()
+            trial.closed[s] = True
+            trial.closed |= trial.loads == 0  # only consolidate into suppliers already delivering
+            for i in lines:
+                trial.move(i)
+            trial.closed = state.closed.copy()
+            if trial.cost < state.cost - EPSILON:
+                state.columns, state.loads, state.values, state.delivery = (
+                    trial.columns, trial.loads, trial.values, trial.delivery
+                )
+                improved = True
+        return improved
+
+    def _relocate_pass(self, state: _Assignment) -> bool:
+        """Move single lines to the supplier where they cost least, in vectorized rounds
+
+        Each round prices every line against every supplier at once, then
+        applies the best improving moves that touch disjoint suppliers, so every
+        applied move saves exactly what was priced. Only the suppliers a round
+        touched are re-priced for the next one.
+        """
+        improved = False
+        rows = np.arange(len(state.columns))
+        costs = np.empty_like(self.goods)
+        repriced = np.arange(len(self.distances))
+        while not self._out_of_time():
+            # Goods plus extra delivery cost of adding each line to each supplier it may join
+            goods = self.goods[:, repriced]
+            added = self.delivery_cost(
+                state.loads[repriced] + self.weights[:, None], self.distances[repriced]
+            ) - state.delivery[repriced]
+            insertion = goods + added
+            insertion[:, state.closed[repriced]] = np.inf
+            insertion[state.values[repriced] + goods < self.min_order[repriced] - EPSILON] = np.inf
+            costs[:, repriced] = insertion
+
+            columns = state.columns
+            own = costs[rows, columns]
+            costs[rows, columns] = np.inf
+            targets = np.argmin(costs, axis=1)
+            gains = costs[rows, targets]
+            costs[rows, columns] = own
+
+            current = self.goods[rows, columns]
+            removal = self.delivery_cost(
+                state.loads[columns] - self.weights, self.distances[columns]
+            ) - state.delivery[columns]
+            gains += removal - current
+            remaining = state.values[columns] - current
+            # Moving these would break the source's minimum order
+            gains[(remaining > 0) & (remaining < self.min_order[columns] - EPSILON)] = np.inf
+
+            candidates = np.flatnonzero(gains < -EPSILON)
+            if not len(candidates):
+                break
+            busy = np.zeros(len(self.distances), dtype=bool)
+            for i in candidates[np.argsort(gains[candidates], kind='stable')]:
+                source, target = columns[i], targets[i]
+                if busy[source] or busy[target]:
+                    continue
+                busy[source] = busy[target] = True
+                state.move(i, int(target))
+            repriced = np.flatnonzero(busy)
+            improved = True
+        return improved
@@ -0,0 +1,172 @@
+"""
+Spatial Supplier Index for the Quotation Engine
+Keeps one KD-tree per material category over the coordinates of the suppliers
+that stock it, so the k nearest capable suppliers for a batch of project
+locations are found in O(log n) per query instead of a scan over all suppliers.
+"""
+
+import csv
+import json
+import math
+import hashlib
+import numpy as np
+from typing import Dict, List, Any, Optional, Iterable, Tuple
+from pathlib import Path
+import logging
+
+from .roads import town_key
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# Suppliers stocking every category carry ``categories: None``
+ANY_CATEGORY = '*'
+
+# Built-in suppliers used when no supplier records are loaded
+DEFAULT_SUPPLIERS = [
+    {'id': 'SUP001', 'name': 'Nairobi Building Supplies', 'location': 'nairobi', 'rating': 4.5},
+    {'id': 'SUP002', 'name': 'Coast Cement Ltd', 'location': 'mombasa', 'rating': 4.2},
+    {'id': 'SUP003', 'name': 'Rift Valley Hardware', 'location': 'nakuru', 'rating': 4.0},
+    {'id': 'SUP004', 'name': 'Western Kenya Suppliers', 'location': 'kisumu', 'rating': 3.8}
+]
+
+
+def parse_coordinates(value: Any) -> Optional[Tuple[float, float]]:
+    """``(latitude, longitude)`` from ``{"lat": .., "lng": ..}``, ``{"latitude": .., "longitude": ..}``
+    or ``[lat, lng]``; None when missing or invalid"""
+    if not value:
+        return None
+    try:
+        if isinstance(value, dict):
+            lat = value.get('lat', value.get('latitude'))
+            lng = value.get('lng', value.get('lon', value.get('longitude')))
+        else:
+            lat, lng = value
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or math.isnan(lat) or math.isnan(lng):
+        return None
+    return lat, lng
+
+
+def read_town_coordinates(path: Optional[Path]) -> Dict[str, Tuple[float, float]]:
+    """Read ``town,latitude,longitude`` rows; empty when no file is configured"""
+    if path is None:
+        return {}
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return {
+            town_key(row['town']): (float(row['latitude']), float(row['longitude']))
+            for row in csv.DictReader(f)
+        }
+
+
+def unit_vectors(points: np.ndarray) -> np.ndarray:
+    """Latitude/longitude degrees to points on the unit sphere (chord length orders like arc length)"""
+    radians = np.radians(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+    lat, lng = radians[:, 0], radians[:, 1]
+    return np.column_stack((np.cos(lat) * np.cos(lng), np.cos(lat) * np.sin(lng), np.sin(lat)))
+
+
+def chord_to_km(chord: np.ndarray) -> np.ndarray:
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(chord / 2, 0.0, 1.0))
+
+
+class SupplierIndex:
+    """Immutable per-category KD-trees over supplier locations"""
+
+    def __init__(self, suppliers: Iterable[Dict], town_coordinates: Optional[Dict[str, Tuple[float, float]]] = None):
+        from scipy.spatial import cKDTree
+
+        self.town_coordinates = town_coordinates or {}
+        self.suppliers: List[Dict] = []
+        self.by_id: Dict[str, Dict] = {}
+        points = []
+        members: Dict[str, List[int]] = {}
+        unplaced = 0
+
+        for supplier in suppliers:
+            point = self.locate(supplier.get('location', ''), supplier.get('coordinates'))
+            self.by_id[supplier['id']] = supplier
+            if point is None:
+                unplaced += 1
+                continue
+            row = len(self.suppliers)
+            self.suppliers.append(supplier)
+            points.append(point)
+            categories = supplier.get('categories')
+            for category in ([ANY_CATEGORY] if categories is None else set(categories)):
+                members.setdefault(category, []).append(row)
+
+        self.version = hashlib.sha256(json.dumps(
+            [(s['id'], point, s.get('categories')) for s, point in zip(self.suppliers, points)],
+            sort_keys=True, default=sorted
+        ).encode('utf-8')).hexdigest()[:16]
+
+        if unplaced:
+            logger.warning(f"{unplaced} suppliers have no coordinates or known town and are not indexed")
+
+        self.points = np.array(points, dtype=np.float64).reshape(-1, 2)
+        vectors = unit_vectors(self.points)
+        # Suppliers stocking everything belong to every category's tree
+        wildcard = members.get(ANY_CATEGORY, [])
+        self._trees: Dict[str, Tuple[Any, np.ndarray]] = {}
+        for category, rows in members.items():
+            rows = np.array(sorted(set(rows) | set(wildcard)), dtype=np.int64)
+            self._trees[category] = (cKDTree(vectors[rows]), rows)
+
+    def __len__(self) -> int:
+        return len(self.suppliers)
+
+    @property
+    def categories(self) -> List[str]:
+        return sorted(category for category in self._trees if category != ANY_CATEGORY)
+
+    def locate(self, location: str, coordinates: Any = None) -> Optional[Tuple[float, float]]:
+        """Explicit coordinates, else the centroid of the named town (or last known address part)"""
+        point = parse_coordinates(coordinates)
+        if point is not None:
+            return point
+        point = self.town_coordinates.get(town_key(location))
+        if point is not None:
+            return point
+        for part in reversed(str(location).split(',')):
+            point = self.town_coordinates.get(town_key(part))
+            if point is not None:
+                return point
+        return None
+
+    def nearest(self, categories: List[str], points: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """k nearest suppliers stocking ``categories[i]`` to ``points[i]``
+
+        Returns ``(rows, km)`` of shape ``(n, k)``: rows into ``self.suppliers``
+        (-1 where fewer than k suppliers qualify) and great-circle distances.
+        Queries are grouped so each category's tree is searched once per batch.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        rows = np.full((len(points), k), -1, dtype=np.int64)
+        distances = np.full((len(points), k), np.inf)
+        categories = np.asarray(categories, dtype=object)
+        vectors = unit_vectors(points)
+
+        for category in set(categories.tolist()):
+            tree, members = self._trees.get(category) or self._trees.get(ANY_CATEGORY, (None, None))
+            if tree is None:
+                continue
+            selected = np.flatnonzero(categories == category)
+            chord, found = tree.query(vectors[selected], k=k)
+            chord, found = chord.reshape(len(selected), k), found.reshape(len(selected), k)
+            valid = found < len(members)  # cKDTree pads missing neighbours with n
+            rows[selected] = np.where(valid, members[np.minimum(found, len(members) - 1)], -1)
+            distances[selected] = np.where(valid, chord_to_km(chord), np.inf)
+
+        return rows, distances
+
+    def nearest_suppliers(self, category: str, point: Tuple[float, float], k: int = 1) -> List[Dict]:
+        """The k nearest suppliers stocking ``category``, nearest first, with ``distance_km``"""
+        rows, distances = self.nearest([category], np.array([point]), k)
+        return [
+            {**self.suppliers[row], 'distance_km': round(float(km), 1)}
+            for row, km in zip(rows[0], distances[0]) if row >= 0
+        ]
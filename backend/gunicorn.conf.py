@@ -0,0 +1,26 @@
+"""
+Gunicorn configuration for jmss.
+
+Serves the ASGI application (``jmss.asgi:application``) with uvicorn workers,
+so the ``/api/async/`` views and the websockets run on an event loop. The
+application is loaded in the master so that engines listed in
+AI_PRELOAD_ENGINES are built once and shared copy-on-write by every worker.
+"""
+
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('GUNICORN_WORKERS', 3))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+worker_class = 'uvicorn.workers.UvicornWorker'
+preload_app = True
+
+
+def when_ready(server):
+    """Runs in the master after the app is loaded and before workers are forked"""
+    from django.conf import settings
+
+    if settings.AI_PRELOAD_ENGINES:
+        from jmss.apps.core.engines import preload_engines
+        preload_engines()
+        server.log.info(f"Preloaded AI engines: {', '.join(settings.AI_PRELOAD_ENGINES)}")
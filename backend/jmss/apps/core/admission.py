@@ -0,0 +1,201 @@
+"""
+Admission control for AI engine calls.
+
+Each engine gets a bounded semaphore sized from ``deployment.max_concurrent_requests``
+in its config file and a short wait queue in front of it. A saturated engine rejects
+quickly (429 when the queue is full, 503 when a queued request could not get a
+slot in time), always with Retry-After, instead of piling up calls. Admitted work gets a
+cooperative deadline from ``deployment.inference_timeout`` that the engines check
+between units of work.
+"""
+
+import math
+import time
+import asyncio
+import logging
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .engines import QUOTATION_CONFIG_PATH, deployment_config, design_config_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'QUEUE_SIZE': 8,  # requests allowed to wait for a slot, per engine and process
+    'QUEUE_TIMEOUT': 2.0,  # longest a queued request waits for a slot, seconds
+    'RETRY_AFTER': 5,  # seconds advertised when rejecting
+    'POLL_INTERVAL': 0.05,  # async waiters re-check for a free slot at this rate
+}
+
+
+class EngineSaturated(APIException):
+    """The engine is at capacity and its wait queue is full"""
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'The AI engine is busy, please retry shortly.'
+    default_code = 'engine_saturated'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class EngineUnavailable(EngineSaturated):
+    """No engine slot became free within the queue timeout"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The AI engine is temporarily unavailable, please retry shortly.'
+    default_code = 'engine_unavailable'
+
+
+class EngineTimeout(EngineSaturated):
+    """Admitted work ran past the engine's inference timeout"""
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The AI engine did not finish in time, please retry shortly.'
+    default_code = 'engine_timeout'
+
+
+def admission_settings():
+    return {**DEFAULTS, **getattr(settings, 'AI_ADMISSION', {})}
+
+
+class AdmissionController:
+    """Bounded concurrency, a short wait queue and a deadline for one engine"""
+
+    def __init__(self, name, max_concurrent, timeout, queue_size, queue_timeout, retry_after):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._lock = threading.Lock()
+        self._waiting = 0
+
+    def _enqueue(self):
+        with self._lock:
+            if self._waiting >= self.queue_size:
+                logger.warning(f"{self.name} engine saturated, rejecting request")
+                raise EngineSaturated(self.retry_after)
+            self._waiting += 1
+
+    def _dequeue(self):
+        with self._lock:
+            self._waiting -= 1
+
+    def _rejected(self):
+        logger.warning(f"{self.name} engine queue wait exceeded {self.queue_timeout}s")
+        return EngineUnavailable(self.retry_after)
+
+    def deadline(self):
+        return time.monotonic() + self.timeout
+
+    def acquire(self):
+        """Take a slot, waiting in the queue for at most ``queue_timeout``"""
+        if self._slots.acquire(blocking=False):
+            return
+        self._enqueue()
+        try:
+            acquired = self._slots.acquire(timeout=self.queue_timeout)
+        finally:
+            self._dequeue()
+        if not acquired:
+            raise self._rejected()
+
+    async def aacquire(self):
+        """Async ``acquire`` that waits without blocking the event loop"""
+        if self._slots.acquire(blocking=False):
+            return
+        self._enqueue()
+        try:
+            give_up = time.monotonic() + self.queue_timeout
+            interval = admission_settings()['POLL_INTERVAL']
+            while not self._slots.acquire(blocking=False):
+                if time.monotonic() >= give_up:
+                    raise self._rejected()
+                await asyncio.sleep(interval)
+        finally:
+            self._dequeue()
+
+    def release(self):
+        self._slots.release()
+
+    def timed_out(self, exc):
+        logger.warning(f"{self.name} engine call exceeded {self.timeout}s: {exc}")
+        return EngineTimeout(self.retry_after)
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the block and yield its ``time.monotonic()`` deadline"""
+        self.acquire()
+        try:
+            yield self.deadline()
+        except TimeoutError as e:
+            raise self.timed_out(e)
+        finally:
+            self.release()
+
+    async def run(self, executor, func, *args):
+        """Admit, then run ``func(*args, deadline=...)`` on ``executor``
+
+        The slot is held until the worker thread finishes, so a call abandoned at
+        the deadline still counts against the limit until it stops cooperatively.
+        """
+        await self.aacquire()
+        deadline = self.deadline()
+
+        def call():
+            try:
+                return func(*args, deadline=deadline)
+            finally:
+                self.release()
+
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, call)
+        except BaseException:
+            self.release()
+            raise
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+        except (asyncio.TimeoutError, TimeoutError) as e:
+            raise self.timed_out(e)
+
+
+_controllers = {}
+_controllers_lock = threading.Lock()
+
+
+def _build_controller(name, config_path):
+    conf = admission_settings()
+    deployment = deployment_config(config_path)
+    return AdmissionController(
+        name,
+        max_concurrent=int(deployment.get('max_concurrent_requests', 10)),
+        timeout=float(deployment.get('inference_timeout', 30)),
+        queue_size=conf['QUEUE_SIZE'],
+        queue_timeout=conf['QUEUE_TIMEOUT'],
+        retry_after=math.ceil(conf['RETRY_AFTER'])
+    )
+
+
+def _controller(name, config_path):
+    controller = _controllers.get(name)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(name)
+            if controller is None:
+                controller = _controllers[name] = _build_controller(name, config_path())
+    return controller
+
+
+def quotation_admission():
+    """Per-process admission controller for the quotation engine"""
+    return _controller('quotation', lambda: QUOTATION_CONFIG_PATH)
+
+
+def design_admission():
+    """Per-process admission controller for the design inference engine"""
+    return _controller('design', design_config_path)
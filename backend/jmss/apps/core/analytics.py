@@ -0,0 +1,244 @@
+"""
+Variance analysis of quoted against revised unit rates.
+
+Lines are grouped by period of the quotation's creation and by category,
+project location or supplier entirely in the database: ``Sum``/``Avg``/
+``StdDev`` aggregates per group, plus a window function ranking the groups of
+each period by the size of their variance. Only the aggregated rows reach
+Python.
+
+Results are cached one period at a time, so a request only queries the
+periods missing from the cache. The period still taking quotations expires
+quickly; writes to quotation lines, quotation updates and deletes, project
+updates and deletes and reconcile fixes bump the owner's generation counter
+(bulk repricing bumps a global one), retiring their cached periods at once.
+"""
+
+import logging
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Avg, Count, DateField, DecimalField, F, FloatField, Q, StdDev, Sum, Window
+from django.db.models.functions import Abs, Cast, Coalesce, Rank, Round, Trunc
+from django.utils import timezone
+
+from .models import QuotationItem
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 24 * 60 * 60,  # closed periods
+    'OPEN_PERIOD_TIMEOUT': 5 * 60,
+}
+
+DIMENSIONS = {
+    'category': 'category',
+    'location': 'quotation__project__location',
+    'supplier': 'supplier__supplier_id',
+}
+
+PERIODS = ('week', 'month', 'quarter', 'year')
+
+_GENERATION_KEY = 'variance:generation'
+
+
+def variance_settings():
+    return {**DEFAULTS, **getattr(settings, 'VARIANCE_ANALYSIS', {})}
+
+
+def _cache():
+    return caches[variance_settings()['ALIAS']]
+
+
+def _generation(user_id):
+    """Global and per-user generation counters, together part of every cache key"""
+    cache = _cache()
+    keys = [_GENERATION_KEY, f'{_GENERATION_KEY}:{user_id}']
+    found = cache.get_many(keys)
+    return '.'.join(str(found.get(key, 0)) for key in keys)
+
+
+def invalidate_variance_cache(user_id=None):
+    """Retire the cached periods of one user, or of everyone; called after quotation lines are written"""
+    cache = _cache()
+    key = _GENERATION_KEY if user_id is None else f'{_GENERATION_KEY}:{user_id}'
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+
+def period_start(day, period):
+    """First day of the period containing ``day``"""
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    if period == 'month':
+        return day.replace(day=1)
+    if period == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def _next_period(start, period):
+    if period == 'week':
+        return start + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[period]
+    month = start.month - 1 + months
+    return start.replace(year=start.year + month // 12, month=month % 12 + 1)
+
+
+def _period_starts(start, end, period):
+    starts = []
+    current = period_start(start, period)
+    while current <= end:
+        starts.append(current)
+        current = _next_period(current, period)
+    return starts
+
+
+def _aware(day):
+    moment = datetime.combine(day, time.min)
+    return timezone.make_aware(moment) if settings.USE_TZ else moment
+
+
+def _query_periods(user, by, period, first, last, statuses):
+    """Aggregated rows for every group in the periods ``first`` up to (excluding) ``last``"""
+    quoted_total = Round(F('quoted_unit_rate') * F('quantity'), 2)
+    revised = Q(quoted_unit_rate__isnull=False) & ~Q(unit_rate=F('quoted_unit_rate'))
+    rate_change = Cast('unit_rate', FloatField()) / Cast('quoted_unit_rate', FloatField()) - 1
+    # Ranked as floats: SQLite cannot order a window by a decimal expression
+    variance = Cast(Sum('total'), FloatField()) - Coalesce(
+        Cast(Sum(F('quoted_unit_rate') * F('quantity')), FloatField()), 0.0
+    )
+    bucket = Trunc('quotation__created_at', period, output_field=DateField())
+
+    items = QuotationItem.objects.filter(
+        quotation__project__user=user,
+        quotation__created_at__gte=_aware(first),
+        quotation__created_at__lt=_aware(last),
+    )
+    if statuses:
+        items = items.filter(quotation__status__in=statuses)
+
+    return (
+        items.annotate(period=bucket, key=F(DIMENSIONS[by]))
+        .values('period', 'key')
+        .annotate(
+            lines=Count('pk'),
+            revised_lines=Count('pk', filter=revised),
+            added_lines=Count('pk', filter=Q(quoted_unit_rate__isnull=True)),
+            quoted_total=Sum(quoted_total, output_field=DecimalField(max_digits=15, decimal_places=2)),
+            revised_total=Sum('total'),
+            avg_quoted_rate=Avg('quoted_unit_rate'),
+            avg_revised_rate=Avg('unit_rate'),
+            rate_change_mean=Avg(rate_change, filter=Q(quoted_unit_rate__gt=0)),
+            rate_change_stddev=StdDev(rate_change, filter=Q(quoted_unit_rate__gt=0)),
+        )
+        # A separate annotate() so the window lands after the GROUP BY, not in it
+        .annotate(variance_rank=Window(Rank(), partition_by=[bucket], order_by=Abs(variance).desc()))
+        .order_by('period', 'key')
+    )
+
+
+def _group(row, period_total):
+    quoted = row['quoted_total'] or Decimal('0')
+    revised = row['revised_total'] or Decimal('0')
+    variance = revised - quoted
+    return {
+        'key': row['key'],
+        'lines': row['lines'],
+        'revised_lines': row['revised_lines'],
+        'added_lines': row['added_lines'],
+        'quoted_total': float(quoted),
+        'revised_total': float(revised),
+        'variance': float(variance),
+        'variance_pct': round(float(variance / quoted * 100), 2) if quoted else None,
+        'avg_quoted_rate': round(float(row['avg_quoted_rate']), 2) if row['avg_quoted_rate'] is not None else None,
+        'avg_revised_rate': round(float(row['avg_revised_rate']), 2) if row['avg_revised_rate'] is not None else None,
+        'rate_change_mean': round(row['rate_change_mean'], 6) if row['rate_change_mean'] is not None else None,
+        'rate_change_stddev': round(row['rate_change_stddev'], 6) if row['rate_change_stddev'] is not None else None,
+        'share_of_period': round(float(revised / period_total), 6) if period_total else None,
+        'variance_rank': row['variance_rank'],
+    }
+
+
+def variance_analysis(user, by='category', period='month', start=None, end=None, statuses=None):
+    """Quoted against revised rates and totals per ``by`` group and ``period``
+
+    Quoted totals are the quoted rates at the lines' current quantities, so the
+    variance is the effect of rate revisions plus lines added after quoting.
+    ``start``/``end`` are dates (default: the last twelve months).
+    """
+    if by not in DIMENSIONS:
+        raise ValueError(f"by must be one of: {', '.join(DIMENSIONS)}")
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+    today = timezone.localdate()
+    end = end or today
+    start = start or end - timedelta(days=365)
+    if start > end:
+        raise ValueError('start must not be after end')
+    statuses = sorted(set(statuses or ()))
+
+    # Step 1: Cached periods; the rest are queried together in one range
+    conf = variance_settings()
+    cache = _cache()
+    starts = _period_starts(start, end, period)
+    prefix = f"variance:{_generation(user.pk)}:{user.pk}:{by}:{period}:{','.join(statuses)}"
+    keys = {first: f"{prefix}:{first.isoformat()}" for first in starts}
+    cached = cache.get_many(list(keys.values()))
+    periods = {first: cached[key] for first, key in keys.items() if key in cached}
+    missing = [first for first in starts if first not in periods]
+
+    if missing:
+        rows = {first: [] for first in missing}
+        for row in _query_periods(user, by, period, missing[0], _next_period(missing[-1], period), statuses):
+            if row['period'] in rows:
+                rows[row['period']].append(row)
+        fetched = {}
+        for first, period_rows in rows.items():
+            period_total = sum((row['revised_total'] or Decimal('0') for row in period_rows), Decimal('0'))
+            fetched[first] = [_group(row, period_total) for row in period_rows]
+        current = period_start(today, period)
+        for first, groups in fetched.items():
+            timeout = conf['OPEN_PERIOD_TIMEOUT'] if first >= current else conf['TIMEOUT']
+            cache.set(keys[first], groups, timeout=timeout)
+        periods.update(fetched)
+        logger.debug(f"Variance analysis queried {len(missing)} of {len(starts)} periods")
+
+    # Step 2: Period-over-period change per group, over the small aggregated rows
+    previous = {}
+    result = []
+    for first in starts:
+        groups = []
+        for group in periods[first]:
+            before = previous.get(group['key'])
+            groups.append({
+                **group,
+                'previous_revised_total': before,
+                'period_change_pct': (
+                    round((group['revised_total'] - before) / before * 100, 2) if before else None
+                ),
+            })
+            previous[group['key']] = group['revised_total']
+        quoted = sum(group['quoted_total'] for group in groups)
+        revised = sum(group['revised_total'] for group in groups)
+        result.append({
+            'period': first.isoformat(),
+            'quoted_total': round(quoted, 2),
+            'revised_total': round(revised, 2),
+            'variance': round(revised - quoted, 2),
+            'groups': groups,
+        })
+
+    return {
+        'by': by,
+        'period': period,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'statuses': statuses,
+        'periods': result,
+    }
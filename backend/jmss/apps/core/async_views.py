@@ -0,0 +1,208 @@
+"""
+Native async endpoints for the heavy actions on the ASGI stack.
+
+Engine work (quotation pricing, design inference) runs on the bounded engine
+thread pool and database I/O uses the async ORM, so a single ASGI worker can hold
+many in-flight requests without blocking its event loop. Per worker, at most
+``AI_ENGINE_WORKERS`` engine calls execute concurrently; further requests wait
+for a pool thread without occupying the event loop.
+"""
+
+import json
+import asyncio
+import logging
+import uuid
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import JsonResponse
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+
+from .admission import design_admission, quotation_admission
+from .cache import IdempotencyKeyReused, coalesce_generation
+from .engines import engine_executor, get_design_engine
+from .metrics import stage
+from .profiling import attached
+from .models import BimModel, DesignDraft, Project, Quotation
+from .serializers import BimModelSerializer, QuotationSerializer
+from .services import build_project_specs, create_quotation
+
+logger = logging.getLogger(__name__)
+
+
+def _with_db_connections(func):
+    """Wrap ``func`` so pool threads drop stale DB connections before and after it"""
+    @wraps(func)
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return call
+
+
+async def run_in_engine_pool(func, *args):
+    """Run blocking engine work on the bounded pool"""
+    return await asyncio.get_running_loop().run_in_executor(engine_executor(), _with_db_connections(func), *args)
+
+
+async def run_admitted(admission, func, *args):
+    """Run ``func(*args, deadline=...)`` on the pool under the engine's admission control"""
+    return await admission.run(engine_executor(), _with_db_connections(func), *args)
+
+
+def _error_response(exc):
+    response = JsonResponse({'error': str(exc.detail)}, status=exc.status_code)
+    if getattr(exc, 'wait', None):
+        response['Retry-After'] = f'{exc.wait:d}'
+    return response
+
+
+def _authenticate(request):
+    """Authenticate with the same schemes as the DRF API (token, then session with CSRF)"""
+    drf_request = Request(request, authenticators=[TokenAuthentication(), SessionAuthentication()])
+    return drf_request.user
+
+
+def async_api_view(methods):
+    """Method check, DRF authentication, JSON body parsing and error mapping for async views"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse({'error': f'Method {request.method} not allowed'}, status=405)
+            try:
+                user = await sync_to_async(_authenticate)(request)
+            except APIException as exc:
+                return _error_response(exc)
+            if not user or not user.is_authenticated:
+                return JsonResponse({'error': 'Authentication credentials were not provided.'}, status=401)
+            try:
+                data = json.loads(request.body or b'{}')
+            except ValueError:
+                return JsonResponse({'error': 'Request body must be JSON'}, status=400)
+            if not isinstance(data, dict):
+                return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+            try:
+                return await view(request, user, data, *args, **kwargs)
+            except APIException as exc:
+                return _error_response(exc)
+
+        # Authentication enforces CSRF for session users, like DRF views
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def serialize_quotation(quotation):
+    with stage('quotation', 'serialization'):
+        return QuotationSerializer(quotation).data
+
+
+@async_api_view(['POST'])
+async def generate_quotation(request, user, data, pk):
+    """Async counterpart of ProjectViewSet.generate_quotation"""
+    try:
+        project = await Project.objects.aget(pk=pk, user=user)
+    except Project.DoesNotExist:
+        return JsonResponse({'error': 'Project not found'}, status=404)
+
+    project_specs = build_project_specs(project, data)
+    def generate(deadline):
+        return coalesce_generation(
+            user.pk, project.pk, project_specs,
+            lambda: create_quotation(project, project_specs, deadline).pk,
+            request.headers.get('Idempotency-Key')
+        )
+
+    try:
+        # Engine and bulk persistence run together on one pool thread
+        quotation_pk = await run_admitted(quotation_admission(), attached(request, generate))
+    except IdempotencyKeyReused:
+        return JsonResponse({'error': 'Idempotency-Key was already used for a different request'}, status=422)
+    except APIException:
+        raise
+    except Exception as e:
+        logger.error(f"Error generating quotation: {str(e)}")
+        return JsonResponse({'error': f'Failed to generate quotation: {str(e)}'}, status=500)
+
+    quotation = await Quotation.objects.with_details().aget(pk=quotation_pk)
+    payload = await sync_to_async(serialize_quotation)(quotation)
+    return JsonResponse(payload, status=201)
+
+
+@async_api_view(['POST'])
+async def generate_designs(request, user, data):
+    """Generate design options; with a project_id the options are saved as design drafts"""
+    requirements = data.get('requirements', {})
+    if not isinstance(requirements, dict):
+        return JsonResponse({'error': 'requirements must be an object'}, status=400)
+    try:
+        variations = int(data.get('variations', 3))
+    except (TypeError, ValueError):
+        variations = 0
+    if not 1 <= variations <= settings.DESIGN_MAX_VARIATIONS:
+        return JsonResponse({'error': f'variations must be 1-{settings.DESIGN_MAX_VARIATIONS}'}, status=400)
+    seed = data.get('seed')
+    if seed is not None:
+        try:
+            seed = int(seed)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'seed must be an integer'}, status=400)
+
+    project = None
+    if data.get('project_id'):
+        try:
+            project = await Project.objects.aget(project_id=data['project_id'], user=user)
+        except Project.DoesNotExist:
+            return JsonResponse({'error': 'Project not found'}, status=404)
+
+    engine = await run_in_engine_pool(get_design_engine)
+    designs = await run_admitted(
+        design_admission(), attached(request, engine.generate_design), requirements, seed, variations
+    )
+
+    if project is not None:
+        drafts = await DesignDraft.objects.abulk_create([
+            DesignDraft(
+                design_id=f"DES-{uuid.uuid4().hex[:12].upper()}",
+                project=project,
+                bedrooms=requirements.get('bedrooms', 3),
+                bathrooms=requirements.get('bathrooms', 2),
+                floors=design['floors'],
+                area=round(design['building_area'], 2),
+                design_data=design
+            )
+            for design in designs
+        ])
+        for design, draft in zip(designs, drafts):
+            design['design_id'] = draft.design_id
+
+    return JsonResponse({'designs': designs}, status=201)
+
+
+@async_api_view(['POST'])
+async def export_ifc(request, user, data):
+    """Async counterpart of BimModelViewSet.export_ifc"""
+    try:
+        design = await DesignDraft.objects.select_related('project').aget(
+            design_id=data.get('design_id'), project__user=user
+        )
+    except DesignDraft.DoesNotExist:
+        return JsonResponse({'error': 'Design not found'}, status=404)
+
+    bim_model = await BimModel.objects.acreate(
+        model_id=f"BIM-{design.design_id}",
+        project=design.project,
+        file_path=f"/exports/{design.design_id}.ifc",
+        model_type="IFC",
+        components=design.design_data
+    )
+    bim_model = await BimModel.objects.select_related('project__user').aget(pk=bim_model.pk)
+    payload = await sync_to_async(lambda: BimModelSerializer(bim_model).data)()
+    return JsonResponse(payload, status=201)
@@ -0,0 +1,158 @@
+"""
+Quotation result cache with single-flight coalescing.
+
+Identical work is computed once: concurrent callers in the same process wait on
+the leader's result, and callers in other processes wait on a short-lived lock
+in the shared cache backend until the leader publishes the result.
+"""
+
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from datetime import date
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60,  # engine results, seconds
+    'DEDUP_WINDOW': 30,  # identical generate requests without an Idempotency-Key
+    'IDEMPOTENCY_TTL': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 120,  # longest a leader may hold a key
+    'POLL_INTERVAL': 0.1,
+}
+
+_MISSING = object()
+
+
+class IdempotencyKeyReused(Exception):
+    """An Idempotency-Key was replayed with a different request payload"""
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def cache_settings():
+    return {**DEFAULTS, **getattr(settings, 'QUOTATION_CACHE', {})}
+
+
+def quotation_cache():
+    return caches[cache_settings()['ALIAS']]
+
+
+def specs_digest(project_specs):
+    """Canonical digest of quotation inputs (key order independent)"""
+    canonical = json.dumps(project_specs, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _compute_shared(key, compute, ttl):
+    """Compute under a cache-backend lock so only one process runs ``compute`` per key"""
+    conf = cache_settings()
+    cache = quotation_cache()
+    lock_key = f'{key}:lock'
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + conf['LOCK_TIMEOUT']
+
+    while True:
+        if cache.add(lock_key, token, conf['LOCK_TIMEOUT']):
+            try:
+                result = compute()
+                cache.set(key, result, ttl)
+                return result
+            finally:
+                if cache.get(lock_key) == token:
+                    cache.delete(lock_key)
+
+        # Another process is computing: wait for its result or for the lock to go away
+        while time.monotonic() < deadline:
+            time.sleep(conf['POLL_INTERVAL'])
+            result = cache.get(key, _MISSING)
+            if result is not _MISSING:
+                return result
+            if cache.get(lock_key) is None:
+                break
+        else:
+            logger.warning(f"Timed out waiting for {key}, computing locally")
+            return compute()
+
+
+def single_flight(key, compute, ttl):
+    """Return the cached value for ``key``, computing it at most once across concurrent callers"""
+    result = quotation_cache().get(key, _MISSING)
+    if result is not _MISSING:
+        return result
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        if flight.done.wait(cache_settings()['LOCK_TIMEOUT']):
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        return _compute_shared(key, compute, ttl)
+
+    try:
+        flight.result = _compute_shared(key, compute, ttl)
+        return flight.result
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        flight.done.set()
+        with _flights_lock:
+            _flights.pop(key, None)
+
+
+def cached_quotation(engine, project_specs, deadline=None):
+    """Engine quotation for ``project_specs``, cached per engine version, catalog version and day"""
+    key = ':'.join([
+        'quotation', 'result', engine.version, engine.data_version,
+        date.today().isoformat(), specs_digest(project_specs),
+    ])
+    return single_flight(
+        key, lambda: engine.generate_detailed_quotation(project_specs, deadline=deadline), cache_settings()['TIMEOUT']
+    )
+
+
+def coalesce_generation(user_id, project_id, project_specs, compute, idempotency_key=None):
+    """Coalesce identical generate requests onto one computation
+
+    With an ``Idempotency-Key`` the key is scoped to the user and replayed for
+    ``IDEMPOTENCY_TTL``; without one, identical specs for the same project are
+    coalesced for ``DEDUP_WINDOW`` seconds (double-clicks and client retries).
+    ``compute`` returns a JSON-serialisable value, e.g. the persisted quotation pk.
+    """
+    conf = cache_settings()
+    digest = specs_digest(project_specs)
+
+    if idempotency_key:
+        key_digest = hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest()
+        key = f'quotation:idempotency:{user_id}:{key_digest}'
+        ttl = conf['IDEMPOTENCY_TTL']
+    else:
+        key = f'quotation:request:{project_id}:{digest}'
+        ttl = conf['DEDUP_WINDOW']
+
+    outcome = single_flight(key, lambda: {'specs': digest, 'result': compute()}, ttl)
+    if outcome['specs'] != digest:
+        raise IdempotencyKeyReused(idempotency_key)
+    return outcome['result']
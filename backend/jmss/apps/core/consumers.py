@@ -0,0 +1,134 @@
+"""
+Websocket consumers for job progress and streamed design generation.
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+from django.conf import settings
+
+from .admission import EngineSaturated, design_admission
+from .engines import engine_executor, get_design_engine
+from .models import QuotationJob
+from .profiling import sampled, store
+
+logger = logging.getLogger(__name__)
+
+
+def quotation_job_group(job_id):
+    return f'quotation_job_{job_id}'
+
+
+class QuotationJobConsumer(AsyncJsonWebsocketConsumer):
+    """Streams status updates for one quotation job (ws/quotation-jobs/<job_id>/)"""
+
+    async def connect(self):
+        self.job_id = self.scope['url_route']['kwargs']['job_id']
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated or not await self._owns_job(user):
+            await self.close(code=4403)
+            return
+
+        self.group_name = quotation_job_group(self.job_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def job_update(self, event):
+        await self.send_json(event['job'])
+
+    @database_sync_to_async
+    def _owns_job(self, user):
+        return QuotationJob.objects.filter(job_id=self.job_id, project__user=user).exists()
+
+
+class DesignGenerationConsumer(AsyncJsonWebsocketConsumer):
+    """Generates design options and streams each one as soon as it is validated (ws/designs/generate/)
+
+    Client sends ``{"requirements": {...}, "variations": 3, "seed": null}``; the server
+    replies with ``started``, one ``design`` message per option and ``completed``.
+    Model work runs on the engine thread pool so the event loop stays free.
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.generation = None
+        await self.accept()
+
+    async def disconnect(self, code):
+        if getattr(self, 'generation', None) is not None:
+            self.generation.cancel()
+
+    async def receive_json(self, content, **kwargs):
+        if self.generation is not None and not self.generation.done():
+            await self.send_json({'type': 'error', 'error': 'A generation is already running'})
+            return
+
+        requirements = content.get('requirements')
+        try:
+            variations = int(content.get('variations', 3))
+        except (TypeError, ValueError):
+            variations = 0
+        if not isinstance(requirements, dict) or not 1 <= variations <= settings.DESIGN_MAX_VARIATIONS:
+            await self.send_json({
+                'type': 'error',
+                'error': f'Send requirements and 1-{settings.DESIGN_MAX_VARIATIONS} variations'
+            })
+            return
+        seed = content.get('seed')
+        if seed is not None:
+            try:
+                seed = int(seed)
+            except (TypeError, ValueError):
+                await self.send_json({'type': 'error', 'error': 'seed must be an integer'})
+                return
+
+        self.generation = asyncio.ensure_future(self._stream_designs(requirements, variations, seed))
+
+    async def _stream_designs(self, requirements, variations, seed):
+        loop = asyncio.get_running_loop()
+        executor = engine_executor()
+        admission = design_admission()
+
+        try:
+            await admission.aacquire()
+        except EngineSaturated as e:
+            await self.send_json({'type': 'error', 'error': str(e.detail), 'retry_after': e.wait})
+            return
+
+        profile = sampled('design_stream', {'variations': variations, 'user_id': self.scope['user'].pk})
+        step = next if profile is None else profile.wrap(next)
+        try:
+            await self.send_json({'type': 'started', 'variations': variations})
+            engine = await loop.run_in_executor(executor, get_design_engine)
+            designs = engine.iter_designs(requirements, variations, seed, admission.deadline())
+            for index in range(variations):
+                # Each step (forward pass, decode, validation) runs off the event loop
+                design = await loop.run_in_executor(executor, step, designs, None)
+                if design is None:
+                    break
+                await self.send_json({'type': 'design', 'index': index, 'design': design})
+        except asyncio.CancelledError:
+            raise
+        except TimeoutError as e:
+            error = admission.timed_out(e)
+            await self.send_json({'type': 'error', 'error': str(error.detail), 'retry_after': error.wait})
+            return
+        except Exception as e:
+            logger.error(f"Design generation failed: {str(e)}")
+            await self.send_json({'type': 'error', 'error': 'Design generation failed'})
+            return
+        finally:
+            admission.release()
+            if profile is not None:
+                await loop.run_in_executor(None, store, profile)
+
+        await self.send_json({'type': 'completed', 'count': variations})
@@ -0,0 +1,252 @@
+"""
+Registry for the AI engines used by the API.
+
+Engines are built once per worker process and reused across requests instead of
+being re-created (and re-reading their catalogs) on every call. The engine
+packages (numpy, torch) are only imported when an engine is first requested, so
+processes that never run one (migrate, admin-only workers) do not pay for them.
+With ``AI_PRELOAD_ENGINES`` a gunicorn or Celery master builds them before forking
+so workers share the loaded models copy-on-write.
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Avg, Count, F, Max
+
+from .metrics import instrument_engine
+from .models import Material, MaterialItem, PriceHistory, Supplier
+
+logger = logging.getLogger(__name__)
+
+ai_models_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '..', '..', 'ai_models')
+
+QUOTATION_CONFIG_PATH = os.path.join(ai_models_path, 'quotation_engine', 'config.json')
+DESIGN_CONFIG_PATH = os.path.join(ai_models_path, 'generative_design', 'config.json')
+
+_lock = threading.Lock()
+_quotation_engine = None
+_design_engine = None
+_executor = None
+_catalog_state = {'checked_at': 0.0, 'signature': None}
+
+
+def _ensure_ai_models_path():
+    """Put the AI models on the Python path (first engine use only)"""
+    if ai_models_path not in sys.path:
+        sys.path.append(ai_models_path)
+
+
+def _engine_settings():
+    return getattr(settings, 'QUOTATION_ENGINE', {})
+
+
+def load_catalog_records():
+    """Read item prices and supplier factors from the Material/MaterialItem tables"""
+    items = [
+        {'item_code': material_id, 'category': category, 'base_price': base_price}
+        for material_id, category, base_price in Material.objects.values_list(
+            'material_id', 'category', 'base_price'
+        ).iterator(chunk_size=5000)
+    ]
+
+    # A supplier's factor is its average markup over the catalog base price
+    supplier_factors = {'default': 1.0}
+    markups = (
+        MaterialItem.objects
+        .filter(material__base_price__gt=0)
+        .values('supplier__supplier_id')
+        .annotate(factor=Avg(F('unit_price') / F('material__base_price')))
+    )
+    for row in markups:
+        supplier_factors[row['supplier__supplier_id']] = float(row['factor'])
+
+    return items, supplier_factors
+
+
+def load_supplier_records():
+    """Suppliers with their coordinates and the categories they stock (from MaterialItem)"""
+    categories = {}
+    stocked = MaterialItem.objects.values_list('supplier_id', 'category', 'material__category').distinct()
+    for supplier_pk, category, material_category in stocked.iterator(chunk_size=5000):
+        categories.setdefault(supplier_pk, set()).add(category or material_category)
+
+    return [
+        {
+            'id': supplier_id,
+            'name': name,
+            'location': location,
+            'coordinates': coordinates,
+            'categories': sorted(categories.get(pk, ())),
+        }
+        for pk, supplier_id, name, location, coordinates in Supplier.objects.order_by('pk').values_list(
+            'pk', 'supplier_id', 'name', 'location', 'coordinates'
+        ).iterator(chunk_size=5000)
+    ]
+
+
+def load_price_history_records():
+    """Dated prices from the PriceHistory table, as price history records for the engine"""
+    return [
+        {
+            'item_code': material_id,
+            'supplier_id': supplier_id,
+            'location': location,
+            'date': effective_date,
+            'price': unit_price,
+            'category': category,
+        }
+        for material_id, supplier_id, location, effective_date, unit_price, category in (
+            PriceHistory.objects.order_by('pk').values_list(
+                'material__material_id', 'supplier__supplier_id', 'location', 'effective_date',
+                'unit_price', 'material__category'
+            ).iterator(chunk_size=5000)
+        )
+    ]
+
+
+def _database_signature():
+    material_stats = Material.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    item_stats = MaterialItem.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    supplier_stats = Supplier.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    history_stats = PriceHistory.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+    return (
+        material_stats['count'], material_stats['updated'], item_stats['count'], item_stats['updated'],
+        supplier_stats['count'], supplier_stats['updated'], history_stats['count'], history_stats['updated'],
+    )
+
+
+def sync_database_catalog(engine, force=False):
+    """Hot-swap the engine's catalog, price history and supplier index from the database when the tables have changed"""
+    interval = _engine_settings().get('CATALOG_RELOAD_INTERVAL', 30)
+    now = time.monotonic()
+    if not force and now - _catalog_state['checked_at'] < interval:
+        return
+    _catalog_state['checked_at'] = now
+
+    signature = _database_signature()
+    if not force and signature == _catalog_state['signature']:
+        return
+
+    items, supplier_factors = load_catalog_records()
+    if not items:
+        logger.warning("Material table is empty, keeping the file-based price catalog")
+    else:
+        engine.price_predictor.catalog.swap(items, supplier_factors=supplier_factors)
+        logger.info(f"Reloaded price catalog from database ({len(items)} materials)")
+
+    suppliers = load_supplier_records()
+    if not any(supplier['categories'] for supplier in suppliers):
+        logger.warning("No supplier stocks any material, keeping the built-in supplier list")
+    else:
+        try:
+            engine.load_suppliers(suppliers)
+            logger.info(f"Rebuilt supplier index from database ({len(suppliers)} suppliers)")
+        except ValueError as e:
+            logger.warning(str(e))
+
+    history = load_price_history_records()
+    if history:
+        engine.load_price_history(history)
+        logger.info(f"Reloaded price history from database ({len(history)} prices)")
+    _catalog_state['signature'] = signature
+
+
+def get_quotation_engine():
+    """Return the per-process quotation engine, building it on first use"""
+    global _quotation_engine
+
+    if _quotation_engine is None:
+        with _lock:
+            if _quotation_engine is None:
+                _ensure_ai_models_path()
+                from quotation_engine.quotation_ai import create_quotation_engine
+
+                engine = create_quotation_engine(QUOTATION_CONFIG_PATH)
+                if _engine_settings().get('CATALOG_SOURCE') == 'database':
+                    sync_database_catalog(engine, force=True)
+                _quotation_engine = instrument_engine('quotation', engine)
+
+    if _engine_settings().get('CATALOG_SOURCE') == 'database':
+        sync_database_catalog(_quotation_engine)
+    return _quotation_engine
+
+
+def design_config_path():
+    """Configured design model config, falling back to the bundled one"""
+    config_path = str(settings.AI_MODELS.get('DESIGN_GENERATION', {}).get('CONFIG_PATH', ''))
+    return config_path if os.path.exists(config_path) else DESIGN_CONFIG_PATH
+
+
+def deployment_config(config_path):
+    """The ``deployment`` section of an engine config file"""
+    with open(config_path, 'r') as f:
+        return json.load(f).get('deployment', {})
+
+
+def get_design_engine():
+    """Return the per-process design inference engine, loading the model on first use"""
+    global _design_engine
+
+    if _design_engine is None:
+        with _lock:
+            if _design_engine is None:
+                _ensure_ai_models_path()
+                from generative_design.inference import load_inference_engine
+
+                design_settings = settings.AI_MODELS.get('DESIGN_GENERATION', {})
+                _design_engine = instrument_engine('design', load_inference_engine(
+                    str(design_settings.get('MODEL_PATH', '')),
+                    design_config_path(),
+                    design_settings.get('DEVICE', 'cpu')
+                ))
+    return _design_engine
+
+
+def engine_executor():
+    """Bounded thread pool for CPU-bound engine work called from async code"""
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'AI_ENGINE_WORKERS', 2),
+                    thread_name_prefix='ai-engine'
+                )
+    return _executor
+
+
+def preload_engines(names=None):
+    """Build engines in a master process before it forks its workers
+
+    Call after Django is set up and before forking. Model weights are frozen and
+    the surviving objects are moved out of the garbage collector's reach
+    (``gc.freeze``) so that collections in the workers do not write to, and
+    thereby un-share, the pages holding them. No inference is run here: starting
+    torch's thread pools before fork is not fork-safe.
+    """
+    names = names if names is not None else getattr(settings, 'AI_PRELOAD_ENGINES', [])
+    started = time.perf_counter()
+
+    for name in names:
+        if name == 'quotation':
+            get_quotation_engine()
+        elif name == 'design':
+            get_design_engine().freeze()
+        else:
+            raise ValueError(f"Unknown engine {name!r} in AI_PRELOAD_ENGINES")
+
+    # Database connections opened while building catalogs must not be inherited
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+    logger.info(f"Preloaded AI engines {list(names)} in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,296 @@
+"""
+Streaming exports of quotations (BOQ lines, transport costs, payment schedules).
+
+Rows are read with ``values_list(...).iterator(chunk_size=...)`` (server-side
+cursors on PostgreSQL) and encoded incrementally, so memory stays constant
+however many quotations are exported, under WSGI and ASGI alike. CSV and
+JSON-lines are plain text; XLSX is a minimal SpreadsheetML package written
+through ``zipfile`` onto an unseekable stream, one worksheet per section.
+"""
+
+import re
+import csv
+import json
+import zipfile
+from datetime import date, datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+from .models import PaymentSchedule, Quotation, QuotationItem, TransportCost
+
+CHUNK_SIZE = 2000  # rows fetched per cursor round trip
+FLUSH_BYTES = 64 * 1024  # encoded bytes buffered before a chunk is sent
+
+FORMATS = {
+    'csv': 'text/csv',
+    'jsonl': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+# (section, model, columns as (header, lookup)) in export order
+SECTIONS = [
+    ('quotations', Quotation, [
+        ('quotation_id', 'quotation_id'),
+        ('project', 'project__name'),
+        ('status', 'status'),
+        ('currency', 'currency'),
+        ('subtotal', 'subtotal'),
+        ('transport_total', 'transport_total'),
+        ('tax_amount', 'tax_amount'),
+        ('total_amount', 'total_amount'),
+        ('created_at', 'created_at'),
+    ]),
+    ('items', QuotationItem, [
+        ('quotation_id', 'quotation__quotation_id'),
+        ('item_code', 'item_code'),
+        ('description', 'description'),
+        ('category', 'category'),
+        ('unit', 'unit'),
+        ('quantity', 'quantity'),
+        ('unit_rate', 'unit_rate'),
+        ('total', 'total'),
+        ('supplier', 'supplier__name'),
+    ]),
+    ('transport', TransportCost, [
+        ('quotation_id', 'quotation__quotation_id'),
+        ('item_codes', 'item_codes'),
+        ('load_kg', 'load_kg'),
+        ('origin_location', 'origin_location'),
+        ('destination_location', 'destination_location'),
+        ('distance_km', 'distance_km'),
+        ('vehicle_type', 'vehicle_type'),
+        ('fuel_cost', 'fuel_cost'),
+        ('driver_cost', 'driver_cost'),
+        ('loading_cost', 'loading_cost'),
+        ('total_transport_cost', 'total_transport_cost'),
+    ]),
+    ('payments', PaymentSchedule, [
+        ('quotation_id', 'quotation__quotation_id'),
+        ('schedule_id', 'schedule_id'),
+        ('phase', 'phase'),
+        ('due_date', 'due_date'),
+        ('amount', 'amount'),
+    ]),
+]
+
+SECTION_HEADERS = [(section, [header for header, _ in columns]) for section, _, columns in SECTIONS]
+
+
+def export_sections(quotations):
+    """Yield ``(section, headers, rows)`` for the quotations queryset; rows are lazy cursors"""
+    quotation_ids = quotations.order_by().values('pk')
+    for section, model, columns in SECTIONS:
+        if model is Quotation:
+            queryset = Quotation.objects.filter(pk__in=quotation_ids).order_by('pk')
+        else:
+            queryset = model.objects.filter(quotation__in=quotation_ids).order_by('quotation_id', 'pk')
+        rows = queryset.values_list(*[lookup for _, lookup in columns]).iterator(chunk_size=CHUNK_SIZE)
+        yield section, [header for header, _ in columns], rows
+
+
+def _buffered(pieces):
+    """Coalesce many small encoded pieces into chunks of about ``FLUSH_BYTES``"""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= FLUSH_BYTES:
+            yield b''.join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+class _Echo:
+    """File-like object whose write() returns the data, for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def _flat(value):
+    """Lists (e.g. a trip's item codes) as one space-separated cell"""
+    return ' '.join(map(str, value)) if isinstance(value, list) else value
+
+
+def _csv_pieces(sections):
+    # One rectangular table: a section column followed by the union of all headers
+    headers = []
+    for _, section_headers in SECTION_HEADERS:
+        headers += [header for header in section_headers if header not in headers]
+    writer = csv.writer(_Echo())
+    yield writer.writerow(['section', *headers]).encode('utf-8')
+
+    for section, section_headers, rows in sections:
+        positions = [headers.index(header) for header in section_headers]
+        for row in rows:
+            line = [''] * len(headers)
+            for position, value in zip(positions, row):
+                line[position] = '' if value is None else _flat(value)
+            yield writer.writerow([section, *line]).encode('utf-8')
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)  # Decimal keeps its exact digits
+
+
+def _jsonl_pieces(sections):
+    for section, headers, rows in sections:
+        for row in rows:
+            record = {'section': section, **dict(zip(headers, row))}
+            yield (json.dumps(record, default=_json_default) + '\n').encode('utf-8')
+
+
+# Characters XML 1.0 does not allow, even escaped
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _column_letter(index):
+    letters = ''
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def _xlsx_cell(reference, value):
+    if value is None or value == '':
+        return ''
+    if isinstance(value, bool):
+        return f'<c r="{reference}" t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float, Decimal)):
+        return f'<c r="{reference}"><v>{value}</v></c>'
+    if isinstance(value, (date, datetime)):
+        value = value.isoformat()
+    text = escape(_INVALID_XML.sub('', str(_flat(value))))
+    return f'<c r="{reference}" t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(number, values, letters):
+    cells = ''.join(_xlsx_cell(f'{letter}{number}', value) for letter, value in zip(letters, values))
+    return f'<row r="{number}">{cells}</row>'
+
+
+_XLSX_PACKAGE_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/></Relationships>'
+)
+
+
+class _ZipSink:
+    """Unseekable write target that hands written bytes back to the generator"""
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def _xlsx_pieces(sections):
+    sink = _ZipSink()
+    names = [section for section, _ in SECTION_HEADERS]
+
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            + ''.join(
+                f'<Override PartName="/xl/worksheets/sheet{index}.xml" '
+                'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+                for index in range(1, len(names) + 1)
+            )
+            + '</Types>'
+        ))
+        package.writestr('_rels/.rels', _XLSX_PACKAGE_RELS)
+        package.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships"><sheets>'
+            + ''.join(
+                f'<sheet name="{name.title()}" sheetId="{index}" r:id="rId{index}"/>'
+                for index, name in enumerate(names, start=1)
+            )
+            + '</sheets></workbook>'
+        ))
+        package.writestr('xl/_rels/workbook.xml.rels', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            + ''.join(
+                f'<Relationship Id="rId{index}" '
+                'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+                f'Target="worksheets/sheet{index}.xml"/>'
+                for index in range(1, len(names) + 1)
+            )
+            + '</Relationships>'
+        ))
+        yield sink.drain()
+
+        for index, (section, headers, rows) in enumerate(sections, start=1):
+            letters = [_column_letter(position) for position in range(len(headers))]
+            with package.open(f'xl/worksheets/sheet{index}.xml', 'w', force_zip64=True) as sheet:
+                sheet.write((
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                    + _xlsx_row(1, headers, letters)
+                ).encode('utf-8'))
+                for number, row in enumerate(rows, start=2):
+                    sheet.write(_xlsx_row(number, row, letters).encode('utf-8'))
+                    if number % 500 == 0:
+                        yield sink.drain()
+                sheet.write(b'</sheetData></worksheet>')
+            yield sink.drain()
+    yield sink.drain()
+
+
+_ENCODERS = {'csv': _csv_pieces, 'jsonl': _jsonl_pieces, 'xlsx': _xlsx_pieces}
+
+
+async def _pulled(chunks):
+    """Async iterator over a sync chunk generator, advanced on the request's sync thread
+
+    Under ASGI, Django buffers a sync iterator whole (``sync_to_async(list)``);
+    this keeps the export streaming. Every step runs on the same thread as the
+    view, which owns the database connection and its cursors.
+    """
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+def export_response(quotations, fmt, filename, request=None):
+    """StreamingHttpResponse exporting every section of ``quotations`` in ``fmt``
+
+    Pass the ``request`` so an ASGI request is served an async iterator.
+    """
+    chunks = _buffered(_ENCODERS[fmt](export_sections(quotations)))
+    if isinstance(getattr(request, '_request', request), ASGIRequest):  # DRF wraps the HttpRequest
+        chunks = _pulled(chunks)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
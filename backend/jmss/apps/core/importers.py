@@ -0,0 +1,340 @@
+"""
+Streaming bulk import of material catalogs, suppliers, supplier prices and price history.
+
+Rows are read lazily from CSV or JSON-lines (optionally gzipped), validated
+batch by batch with the model fields' own ``clean()`` and upserted with
+``bulk_create(update_conflicts=True)`` on the natural key, one transaction
+per batch. Memory use is bounded by the batch size, not the file size.
+Price history rows are keyed on material, supplier, location and date; their
+key has a nullable column, which ``ON CONFLICT`` cannot target, so they are
+upserted by looking up each batch's existing rows. Catalog and supplier prices
+that change are also recorded in the history, dated today.
+"""
+
+import csv
+import gzip
+import json
+import time
+import logging
+from decimal import Decimal
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import JSONField
+
+from .models import Material, MaterialItem, PriceHistory, Supplier
+
+logger = logging.getLogger(__name__)
+
+
+class ImportSpec:
+    """How one kind of catalog row maps onto a model; ``key`` is a column or a tuple of columns"""
+
+    def __init__(self, model, key, required, optional=(), defaults=None):
+        self.model = model
+        self.key = key
+        self.required = tuple(required)
+        self.optional = tuple(optional)
+        self.defaults = defaults or {}
+
+
+SPECS = {
+    'materials': ImportSpec(
+        Material, 'material_id',
+        required=('material_id', 'name', 'category', 'unit_of_measure', 'base_price'),
+        optional=('description', 'currency'),
+    ),
+    'suppliers': ImportSpec(
+        Supplier, 'supplier_id',
+        required=('supplier_id', 'name', 'contact_email', 'phone', 'location', 'county'),
+        optional=('country', 'coordinates'),
+    ),
+    'items': ImportSpec(
+        MaterialItem, 'item_id',
+        required=('item_id', 'material_id', 'supplier_id', 'unit_price'),
+        optional=('category', 'estimate_id', 'total_cost'),
+        defaults={'estimate_id': 'CATALOG'},
+    ),
+    'prices': ImportSpec(
+        PriceHistory, ('material_id', 'supplier_id', 'location', 'effective_date'),
+        required=('material_id', 'effective_date', 'unit_price'),
+        optional=('supplier_id', 'location', 'source'),
+        defaults={'source': 'import'},
+    ),
+}
+
+
+def open_rows(path, fmt=None):
+    """Iterate row dicts from a CSV or JSON-lines file, gzipped or not"""
+    fmt = fmt or ('jsonl' if path.removesuffix('.gz').endswith(('.jsonl', '.ndjson')) else 'csv')
+    opener = gzip.open if path.endswith('.gz') else open
+
+    with opener(path, 'rt', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _history_key(entry):
+    return entry.material_id, entry.supplier_id, entry.location, entry.effective_date
+
+
+def upsert_price_history(entries, batch_size=5000):
+    """Insert price history entries, overwriting the price of those already stored for their key
+
+    The last entry for a key wins. Existing rows are found with one query per call.
+    """
+    entries = list({_history_key(entry): entry for entry in entries}.values())
+    existing = {
+        _history_key(row): row
+        for row in PriceHistory.objects.filter(
+            material_id__in={entry.material_id for entry in entries},
+            effective_date__in={entry.effective_date for entry in entries},
+        ).only('material_id', 'supplier_id', 'location', 'effective_date')
+    }
+
+    updated, created = [], []
+    for entry in entries:
+        row = existing.get(_history_key(entry))
+        if row is None:
+            created.append(entry)
+        else:
+            row.unit_price, row.source, row.updated_at = entry.unit_price, entry.source, timezone.now()
+            updated.append(row)
+    PriceHistory.objects.bulk_update(updated, ['unit_price', 'source', 'updated_at'], batch_size=batch_size)
+    PriceHistory.objects.bulk_create(created, batch_size=batch_size)
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.upserted = 0
+        self.rejected = 0
+        self.errors = []
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+class CatalogImporter:
+    """Validate and upsert catalog rows in fixed-size batches"""
+
+    def __init__(self, kind, batch_size=5000, dry_run=False, max_errors=1000, progress=None):
+        self.spec = SPECS[kind]
+        self.kind = kind
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.max_errors = max_errors
+        self.progress = progress
+        self.stats = ImportStats()
+        self._fields = {field.name: field for field in self.spec.model._meta.concrete_fields}
+
+    def run(self, rows):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            self._import_batch(batch)
+            if self.progress:
+                self.progress(self.stats)
+        logger.info(
+            f"Imported {self.kind}: {self.stats.upserted} upserted, {self.stats.rejected} rejected "
+            f"in {self.stats.elapsed:.1f}s"
+        )
+        return self.stats
+
+    def _reject(self, row_number, message):
+        self.stats.rejected += 1
+        if len(self.stats.errors) < self.max_errors:
+            self.stats.errors.append((row_number, message))
+
+    def _clean(self, row):
+        """Clean one row with the model fields; raises ValidationError"""
+        missing = [name for name in self.spec.required if row.get(name) in (None, '')]
+        if missing:
+            raise ValidationError(f"missing {', '.join(missing)}")
+
+        values = {}
+        for name in self.spec.required + self.spec.optional:
+            raw = row.get(name)
+            if raw in (None, ''):
+                if name in self.spec.defaults:
+                    values[name] = self.spec.defaults[name]
+                continue
+            field = self._fields.get(name)
+            if field is None:  # foreign key codes, resolved per batch
+                values[name] = str(raw).strip()
+                continue
+            try:
+                if isinstance(field, JSONField) and isinstance(raw, str):
+                    raw = json.loads(raw)  # JSON columns arrive as text in CSV files
+                values[name] = field.clean(raw.strip() if isinstance(raw, str) else raw, None)
+            except ValueError as e:
+                raise ValidationError(f"{name}: {str(e)}")
+            except ValidationError as e:
+                raise ValidationError(f"{name}: {'; '.join(e.messages)}")
+        return values
+
+    def _update_fields(self, row):
+        """Fields to overwrite on conflict: those the row provides, so absent or blank columns keep their values"""
+        provided = [name for name in self.spec.required + self.spec.optional if row.get(name) not in (None, '')]
+        if self.spec.model is MaterialItem:
+            provided = [{'material_id': 'material', 'supplier_id': 'supplier'}.get(name, name) for name in provided]
+        keys = self.spec.key if isinstance(self.spec.key, tuple) else (self.spec.key,)
+        return tuple(name for name in provided if name not in keys) + ('updated_at',)
+
+    def _row_key(self, values):
+        if isinstance(self.spec.key, tuple):
+            return tuple(values.get(name, '') for name in self.spec.key)
+        return values[self.spec.key]
+
+    def _import_batch(self, batch):
+        cleaned = {}
+        columns = {}
+        for row in batch:
+            self.stats.read += 1
+            row_number = self.stats.read  # 1-based data row, excluding any header
+            try:
+                values = self._clean(row)
+            except ValidationError as e:
+                self._reject(row_number, '; '.join(e.messages))
+                continue
+            # The last occurrence of a key within a batch wins (one upsert per row)
+            cleaned[self._row_key(values)] = (row_number, values)
+            columns[self._row_key(values)] = self._update_fields(row)
+
+        if self.spec.model is MaterialItem:
+            objects = self._build_items(cleaned)
+        elif self.spec.model is PriceHistory:
+            objects = self._build_prices(cleaned)
+        else:
+            objects = [self.spec.model(**values) for _, values in cleaned.values()]
+
+        if objects and not self.dry_run:
+            with transaction.atomic():
+                if self.spec.model is PriceHistory:
+                    upsert_price_history(objects, self.batch_size)
+                else:
+                    changed = self._changed_prices(objects)
+                    # Rows may provide different columns (JSON-lines); upsert each set with its own update fields
+                    groups = {}
+                    for obj in objects:
+                        groups.setdefault(columns[getattr(obj, self.spec.key)], []).append(obj)
+                    for update_fields, group in groups.items():
+                        self.spec.model.objects.bulk_create(
+                            group,
+                            batch_size=self.batch_size,
+                            update_conflicts=True,
+                            unique_fields=[self.spec.key],
+                            update_fields=list(update_fields),
+                        )
+                    self._record_prices(changed)
+        self.stats.upserted += len(objects)
+
+    def _changed_prices(self, objects):
+        """Materials or supplier prices in the batch that are new or differ from the stored price"""
+        if self.spec.model is Material:
+            current = dict(Material.objects.filter(
+                material_id__in=[obj.material_id for obj in objects]
+            ).values_list('material_id', 'base_price'))
+            return [obj for obj in objects if current.get(obj.material_id) != obj.base_price]
+        if self.spec.model is MaterialItem:
+            current = dict(MaterialItem.objects.filter(
+                item_id__in=[obj.item_id for obj in objects]
+            ).values_list('item_id', 'unit_price'))
+            return [obj for obj in objects if current.get(obj.item_id) != obj.unit_price]
+        return []
+
+    def _record_prices(self, changed):
+        """Record today's price of changed materials (market-wide) and supplier items in the history"""
+        if not changed:
+            return
+        today = timezone.localdate()
+        if self.spec.model is Material:
+            pks = dict(Material.objects.filter(
+                material_id__in=[obj.material_id for obj in changed]
+            ).values_list('material_id', 'pk'))
+            history = [
+                PriceHistory(material_id=pks[obj.material_id], effective_date=today,
+                             unit_price=obj.base_price, source='catalog')
+                for obj in changed
+            ]
+        else:
+            history = [
+                PriceHistory(material_id=obj.material_id, supplier_id=obj.supplier_id, effective_date=today,
+                             unit_price=obj.unit_price, source='catalog')
+                for obj in changed
+            ]
+        upsert_price_history(history, self.batch_size)
+
+    def _build_items(self, cleaned):
+        """Resolve material and supplier codes for a batch with two queries"""
+        material_codes = {values['material_id'] for _, values in cleaned.values()}
+        supplier_codes = {values['supplier_id'] for _, values in cleaned.values()}
+        materials = {
+            code: (pk, category)
+            for code, pk, category in Material.objects.filter(material_id__in=material_codes)
+            .values_list('material_id', 'pk', 'category')
+        }
+        suppliers = dict(
+            Supplier.objects.filter(supplier_id__in=supplier_codes).values_list('supplier_id', 'pk')
+        )
+
+        objects = []
+        for row_number, values in cleaned.values():
+            material = materials.get(values['material_id'])
+            supplier_pk = suppliers.get(values['supplier_id'])
+            if material is None or supplier_pk is None:
+                unknown = 'material_id' if material is None else 'supplier_id'
+                self._reject(row_number, f"unknown {unknown} {values[unknown]}")
+                continue
+            objects.append(MaterialItem(
+                item_id=values['item_id'],
+                material_id=material[0],
+                supplier_id=supplier_pk,
+                category=values.get('category', material[1]),
+                estimate_id=values['estimate_id'],
+                unit_price=values['unit_price'],
+                total_cost=values.get('total_cost', Decimal(values['unit_price'])),
+            ))
+        return objects
+
+    def _build_prices(self, cleaned):
+        """Resolve material and (optional) supplier codes for a batch with two queries"""
+        material_codes = {values['material_id'] for _, values in cleaned.values()}
+        supplier_codes = {values['supplier_id'] for _, values in cleaned.values() if values.get('supplier_id')}
+        materials = dict(Material.objects.filter(material_id__in=material_codes).values_list('material_id', 'pk'))
+        suppliers = dict(
+            Supplier.objects.filter(supplier_id__in=supplier_codes).values_list('supplier_id', 'pk')
+        )
+
+        objects = []
+        for row_number, values in cleaned.values():
+            supplier_code = values.get('supplier_id')
+            if values['material_id'] not in materials:
+                self._reject(row_number, f"unknown material_id {values['material_id']}")
+                continue
+            if supplier_code and supplier_code not in suppliers:
+                self._reject(row_number, f"unknown supplier_id {supplier_code}")
+                continue
+            objects.append(PriceHistory(
+                material_id=materials[values['material_id']],
+                supplier_id=suppliers.get(supplier_code),
+                location=values.get('location', ''),
+                effective_date=values['effective_date'],
+                unit_price=values['unit_price'],
+                source=values['source'],
+            ))
+        return objects
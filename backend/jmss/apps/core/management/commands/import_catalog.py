@@ -0,0 +1,48 @@
+import resource
+
+from django.core.management.base import BaseCommand, CommandError
+from jmss.apps.core.importers import SPECS, CatalogImporter, open_rows
+
+class Command(BaseCommand):
+    help = 'Stream a CSV or JSON-lines catalog (materials, suppliers, supplier prices or price history) into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS), help='What the file contains')
+        parser.add_argument('path', help='CSV or JSON-lines file, optionally gzipped')
+        parser.add_argument('--format', dest='fmt', choices=['csv', 'jsonl'], help='Override detection from the file extension')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows validated and upserted per transaction')
+        parser.add_argument('--max-errors', type=int, default=1000, help='Abort once this many rows are rejected')
+        parser.add_argument('--dry-run', action='store_true', help='Validate only, do not write')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stdout.write(f'{stats.read} rows, {stats.rate:,.0f} rows/s, {stats.rejected} rejected')
+            if stats.rejected >= options['max_errors']:
+                raise CommandError(f'Aborting after {stats.rejected} rejected rows (first: {stats.errors[:5]})')
+
+        importer = CatalogImporter(
+            options['kind'],
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            max_errors=options['max_errors'],
+            progress=progress
+        )
+        try:
+            stats = importer.run(open_rows(options['path'], options['fmt']))
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not read {options["path"]}: {e}')
+
+        for row_number, message in stats.errors[:20]:
+            self.stdout.write(self.style.WARNING(f'Row {row_number}: {message}'))
+
+        action = 'Validated' if options['dry_run'] else 'Upserted'
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {stats.upserted} {options["kind"]} from {stats.read} rows '
+            f'({stats.rejected} rejected) in {stats.elapsed:.1f}s, '
+            f'{stats.rate:,.0f} rows/s, peak RSS {peak_mb:.0f} MB'
+        ))
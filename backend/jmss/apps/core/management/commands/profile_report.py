@@ -0,0 +1,75 @@
+import json
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from jmss.apps.core.profiling import profile_directory
+
+class Command(BaseCommand):
+    help = 'Aggregate stored sampling profiles into a top-N hot function report'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=20, help='Number of functions to list')
+        parser.add_argument('--path', help='Only include request profiles whose path contains this')
+        parser.add_argument('--kind', help='Only include profiles of this kind (request, design_stream)')
+        parser.add_argument('--hours', type=float, help='Only include profiles from the last N hours')
+        parser.add_argument('--directory', help='Profile directory (defaults to PROFILING["DIRECTORY"])')
+        parser.add_argument('--collapsed', help='Also write the merged collapsed stacks to this file')
+
+    def handle(self, *args, **options):
+        directory = Path(options['directory']) if options['directory'] else profile_directory()
+        if not directory.is_dir():
+            raise CommandError(f'No profile directory at {directory}')
+
+        since = None
+        if options['hours']:
+            since = datetime.now(timezone.utc) - timedelta(hours=options['hours'])
+
+        stacks = Counter()
+        profiles = 0
+        for metadata_path in sorted(directory.glob('*.json')):
+            with open(metadata_path, 'r') as f:
+                metadata = json.load(f)
+            if options['kind'] and metadata.get('kind') != options['kind']:
+                continue
+            if options['path'] and options['path'] not in metadata.get('path', ''):
+                continue
+            if since and datetime.fromisoformat(metadata['started_at']) < since:
+                continue
+
+            collapsed_path = directory / metadata['collapsed']
+            if not collapsed_path.exists():
+                continue
+            with open(collapsed_path, 'r') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    stacks[stack] += int(count)
+            profiles += 1
+
+        total = sum(stacks.values())
+        if not total:
+            self.stdout.write(self.style.WARNING('No matching samples'))
+            return
+
+        # Self time is the innermost frame; total time counts each function once per stack
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in stacks.items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+
+        self.stdout.write(f'{profiles} profiles, {total} samples\n')
+        self.stdout.write(f"{'self %':>8} {'total %':>8}  function")
+        for frame, count in self_samples.most_common(options['top']):
+            self.stdout.write(
+                f'{100 * count / total:>7.1f}% {100 * total_samples[frame] / total:>7.1f}%  {frame}'
+            )
+
+        if options['collapsed']:
+            with open(options['collapsed'], 'w') as f:
+                for stack, count in sorted(stacks.items()):
+                    f.write(f'{stack} {count}\n')
+            self.stdout.write(self.style.SUCCESS(f"Merged stacks written to {options['collapsed']}"))
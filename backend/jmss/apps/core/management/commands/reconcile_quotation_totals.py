@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from jmss.apps.core.models import Quotation
+from jmss.apps.core.services import reconcile_quotation_totals
+
+class Command(BaseCommand):
+    help = 'Verify incrementally maintained quotation totals against a database Sum of their lines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='append', help='Only check quotations with this status (repeatable)')
+        parser.add_argument('--dry-run', action='store_true', help='Report drifted quotations without fixing them')
+
+    def handle(self, *args, **options):
+        queryset = Quotation.objects.all()
+        if options['status']:
+            queryset = queryset.filter(status__in=options['status'])
+
+        drifted = reconcile_quotation_totals(queryset, fix=not options['dry_run'])
+
+        if drifted:
+            action = 'Found' if options['dry_run'] else 'Corrected'
+            self.stdout.write(self.style.WARNING(f'{action} totals on {len(drifted)} quotations: {drifted[:20]}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('All quotation totals match their lines'))
@@ -0,0 +1,48 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from jmss.apps.core.importers import open_rows
+from jmss.apps.core.services import OPEN_QUOTATION_STATUSES, reprice_open_quotations
+
+class Command(BaseCommand):
+    help = 'Apply a price-change set (item_code/supplier_id with ratio or unit_rate) to the lines of open quotations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or JSON-lines price changes, optionally gzipped')
+        parser.add_argument('--format', dest='fmt', choices=['csv', 'jsonl'], help='Override detection from the file extension')
+        parser.add_argument('--status', action='append', help=f'Quotation status to reprice (repeatable, default {", ".join(OPEN_QUOTATION_STATUSES)})')
+        parser.add_argument('--batch-size', type=int, default=500, help='Price changes applied per UPDATE')
+        parser.add_argument('--report', help='Write the per-quotation change report to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Report the changes without writing them')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+
+        try:
+            changes = list(open_rows(options['path'], options['fmt']))
+            report = reprice_open_quotations(
+                changes,
+                statuses=options['status'] or OPEN_QUOTATION_STATUSES,
+                batch_size=options['batch_size'],
+                dry_run=options['dry_run']
+            )
+        except (OSError, ValueError) as e:
+            raise CommandError(f'Could not apply {options["path"]}: {e}')
+
+        if report['unknown_suppliers']:
+            self.stdout.write(self.style.WARNING(
+                f'Skipped changes for unknown suppliers: {report["unknown_suppliers"][:20]}'
+            ))
+        if options['report']:
+            with open(options['report'], 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(['quotation_id', 'line_updates', 'subtotal_change'])
+                for row in report['quotations']:
+                    writer.writerow([row['quotation_id'], row['line_updates'], row['subtotal_change']])
+
+        action = 'Would reprice' if options['dry_run'] else 'Repriced'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {report["line_updates"]} lines on {report["quotations_updated"]} quotations '
+            f'from {report["changes"]} price changes; subtotals moved by {report["subtotal_change"]}'
+        ))
@@ -0,0 +1,104 @@
+"""
+Prometheus metrics for the AI pipelines.
+
+Engines report per-stage latency through their ``stage_observer`` hook and the
+backend adds its own stages (persistence, serialization). Everything is keyed
+by engine and engine version. With ``METRICS['ENABLED']`` off, or without
+``prometheus_client``, no observer is installed and ``stage()`` is a shared
+no-op context manager.
+"""
+
+import os
+import logging
+from contextlib import nullcontext
+from functools import lru_cache
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Histogram, multiprocess
+except ImportError:  # pragma: no cover - optional dependency
+    prometheus_client = None
+
+logger = logging.getLogger(__name__)
+
+# Engine stages range from sub-millisecond lookups to multi-second inference
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_UNTIMED = nullcontext()
+_engine_versions = {}
+_backend_observers = {}
+
+if prometheus_client is not None:
+    STAGE_SECONDS = Histogram(
+        'jmss_ai_stage_seconds', 'Latency of AI pipeline stages',
+        ['engine', 'engine_version', 'stage'], buckets=STAGE_BUCKETS
+    )
+    STAGE_FAILURES = Counter(
+        'jmss_ai_stage_failures_total', 'AI pipeline stages that raised',
+        ['engine', 'engine_version', 'stage']
+    )
+
+
+def metrics_enabled():
+    return prometheus_client is not None and getattr(settings, 'METRICS', {}).get('ENABLED', False)
+
+
+def _observer(engine_name, version):
+    """Bind label values once so each observation is a dictionary lookup and an add"""
+    histograms = {}
+    failures = {}
+
+    def observe(stage, seconds, ok):
+        histogram = histograms.get(stage)
+        if histogram is None:
+            histogram = histograms[stage] = STAGE_SECONDS.labels(engine_name, version, stage)
+            failures[stage] = STAGE_FAILURES.labels(engine_name, version, stage)
+        histogram.observe(seconds)
+        if not ok:
+            failures[stage].inc()
+
+    return observe
+
+
+def instrument_engine(engine_name, engine):
+    """Install the stage observer on an engine when metrics are enabled"""
+    _engine_versions[engine_name] = engine.version
+    if metrics_enabled():
+        engine.stage_observer = _observer(engine_name, engine.version)
+    return engine
+
+
+@lru_cache(maxsize=None)
+def _stage_timer():
+    """The engines' ``timed_stage``, so backend stages are timed the same way"""
+    from .engines import _ensure_ai_models_path  # engines imports this module
+    _ensure_ai_models_path()
+    from engine_common import timed_stage
+    return timed_stage
+
+
+def stage(engine_name, stage_name):
+    """Time a backend stage of an engine pipeline (no-op when metrics are disabled)"""
+    if not metrics_enabled():
+        return _UNTIMED
+    version = _engine_versions.get(engine_name, 'unknown')
+    observer = _backend_observers.get((engine_name, version))
+    if observer is None:
+        observer = _backend_observers[(engine_name, version)] = _observer(engine_name, version)
+    return _stage_timer()(observer, stage_name)
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; aggregates all worker processes in multiprocess mode"""
+    if not metrics_enabled():
+        raise Http404('Metrics are disabled')
+
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return HttpResponse(prometheus_client.generate_latest(registry), content_type=prometheus_client.CONTENT_TYPE_LATEST)
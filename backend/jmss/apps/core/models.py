@@ -65,6 +65,7 @@ class Supplier(TimeStampedModel):
     location = models.CharField(max_length=100)
     county = models.CharField(max_length=50)
     country = models.CharField(max_length=50, default='Kenya')
+    coordinates = models.JSONField(null=True, blank=True)
     
     def __str__(self):
         return self.name
@@ -82,6 +83,32 @@ class MaterialItem(TimeStampedModel):
     def __str__(self):
         return f"{self.item_id} - {self.material.name}"
 
+class PriceHistory(TimeStampedModel):
+    """Dated unit prices of a material; blank supplier and location mean market-wide"""
+    material = models.ForeignKey(Material, on_delete=models.CASCADE, related_name='price_history')
+    supplier = models.ForeignKey(
+        Supplier, on_delete=models.CASCADE, null=True, blank=True, related_name='price_history'
+    )
+    location = models.CharField(max_length=100, blank=True)
+    effective_date = models.DateField()
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+    source = models.CharField(max_length=50, blank=True)  # e.g. 'import', 'catalog'
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['material', 'supplier', 'location', 'effective_date'], name='unique_price_history_entry'
+            ),
+            # NULLs never conflict, so market-wide prices need their own constraint
+            models.UniqueConstraint(
+                fields=['material', 'location', 'effective_date'], condition=models.Q(supplier__isnull=True),
+                name='unique_market_price_history_entry'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.material_id} @ {self.effective_date}: {self.unit_price}"
+
 class Project(TimeStampedModel):
     """Main project model"""
     PROJECT_TYPES = [
@@ -185,6 +212,20 @@ class AiModel(TimeStampedModel):
     def __str__(self):
         return f"{self.model_id} - {self.name}"
 
+class QuotationQuerySet(models.QuerySet):
+    """Query helpers for the quotation read paths"""
+    
+    def with_details(self):
+        """Prefetch everything the nested QuotationSerializer touches"""
+        return self.select_related('project__user').prefetch_related(
+            models.Prefetch('items', queryset=QuotationItem.objects.select_related('supplier')),
+            models.Prefetch('transport_costs', queryset=TransportCost.objects.select_related('item__supplier')),
+        )
+    
+    def with_summary(self):
+        """Columns needed by the list serializer, plus the line count"""
+        return self.select_related('project').annotate(item_count=models.Count('items'))
+
 class Quotation(TimeStampedModel):
     """Enhanced project quotations with detailed breakdown"""
     quotation_id = models.CharField(max_length=50, unique=True)
@@ -212,6 +253,14 @@ class Quotation(TimeStampedModel):
     ai_confidence_score = models.FloatField(default=0.85)
     generated_at = models.DateTimeField(auto_now_add=True)
     
+    objects = QuotationQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Period scans of a user's quotations (see apps/core/analytics.py)
+            models.Index(fields=['project', 'created_at']),
+        ]
+    
     def __str__(self):
         return f"{self.quotation_id} - {self.project.name}"
 
@@ -225,18 +274,33 @@ class QuotationItem(TimeStampedModel):
     quantity = models.DecimalField(max_digits=10, decimal_places=2)
     unit_rate = models.DecimalField(max_digits=10, decimal_places=2)
     total = models.DecimalField(max_digits=12, decimal_places=2)
+    # Rate as generated; null for lines added after quoting
+    quoted_unit_rate = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     
     # Supplier information
     supplier = models.ForeignKey(Supplier, on_delete=models.SET_NULL, null=True, blank=True)
     supplier_confidence = models.FloatField(default=0.85)
     
+    class Meta:
+        indexes = [
+            # Finds the lines a catalog price change affects (see reprice_open_quotations)
+            models.Index(fields=['item_code', 'supplier']),
+            # Per-quotation category rollups (see apps/core/analytics.py)
+            models.Index(fields=['quotation', 'category']),
+        ]
+    
     def __str__(self):
         return f"{self.item_code} - {self.description}"
 
 class TransportCost(TimeStampedModel):
-    """Transport costs for materials"""
+    """Transport costs for materials, one row per truck trip"""
     quotation = models.ForeignKey(Quotation, on_delete=models.CASCADE, related_name='transport_costs')
-    item = models.ForeignKey(QuotationItem, on_delete=models.CASCADE, related_name='transport')
+    # First line on the trip; item_codes lists every line carried
+    item = models.ForeignKey(
+        QuotationItem, on_delete=models.SET_NULL, null=True, blank=True, related_name='transport'
+    )
+    item_codes = models.JSONField(default=list, blank=True)
+    load_kg = models.FloatField(default=0)
     
     origin_location = models.CharField(max_length=100)
     destination_location = models.CharField(max_length=100)
@@ -256,6 +320,28 @@ class TransportCost(TimeStampedModel):
     def __str__(self):
         return f"Transport: {self.origin_location} → {self.destination_location}"
 
+class QuotationRevision(TimeStampedModel):
+    """A negotiated version of a quotation, stored as the changes since the previous revision"""
+    quotation = models.ForeignKey(Quotation, on_delete=models.CASCADE, related_name='revisions')
+    number = models.PositiveIntegerField()  # 1 is the base revision
+    delta = models.JSONField(default=dict)  # changed totals and lines (see apps/core/revisions.py)
+    # Checkpoints also hold the full state, so materializing replays a bounded number of deltas
+    snapshot = models.JSONField(null=True, blank=True)
+    note = models.CharField(max_length=200, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['quotation', 'number'], name='unique_quotation_revision'),
+        ]
+    
+    @property
+    def is_checkpoint(self):
+        return self.snapshot is not None
+    
+    def __str__(self):
+        return f"{self.quotation.quotation_id} r{self.number}"
+
 class PaymentSchedule(TimeStampedModel):
     """Payment schedules for projects"""
     schedule_id = models.CharField(max_length=50, unique=True)
@@ -266,3 +352,24 @@ class PaymentSchedule(TimeStampedModel):
     
     def __str__(self):
         return f"{self.schedule_id} - {self.phase}"
+
+class QuotationJob(TimeStampedModel):
+    """Asynchronous quotation generation job"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    job_id = models.CharField(max_length=50, unique=True)  # also the Celery task id
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='quotation_jobs')
+    project_specs = models.JSONField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    quotation = models.ForeignKey(Quotation, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    error = models.TextField(blank=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.job_id} - {self.status}"
@@ -0,0 +1,297 @@
+"""
+On-demand sampling profiles for the AI endpoints.
+
+A single background thread samples the stacks of the threads attached to active
+profiles every ``PROFILING['INTERVAL']`` seconds via ``sys._current_frames()``,
+so unprofiled requests pay nothing and profiled ones only pay for the sampling.
+Profiles are stored as collapsed stacks (``frame;frame;frame count``, loadable
+by speedscope and flamegraph.pl) next to a JSON file with the request metadata.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from functools import wraps
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'SAMPLE_RATE': 0.0,  # fraction of matching requests to profile
+    'PATHS': [r'/generate_quotation/$', r'/designs/generate/$'],
+    'HEADER': 'X-Profile-Request',  # profiles any request from a staff user carrying it
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'DIRECTORY': None,  # defaults to BASE_DIR / 'profiles'
+    'MAX_PROFILES': 500,  # oldest profiles are pruned beyond this
+}
+
+
+def profiling_settings():
+    return {**DEFAULTS, **getattr(settings, 'PROFILING', {})}
+
+
+def profile_directory():
+    directory = profiling_settings()['DIRECTORY'] or Path(settings.BASE_DIR) / 'profiles'
+    return Path(directory)
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def collapse_stack(frame):
+    """Collapsed representation of a stack, outermost frame first"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class _Sampler(threading.Thread):
+    """Samples every attached thread into its profile; idles while nothing is attached"""
+
+    def __init__(self, interval):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.interval = interval
+        self.targets = {}  # thread id -> Profile
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+
+    def attach(self, thread_id, profile):
+        """Start sampling a thread; False if it is already sampled into ``profile``"""
+        with self.lock:
+            if self.targets.get(thread_id) is profile:
+                return False
+            self.targets[thread_id] = profile
+        self.wakeup.set()
+        return True
+
+    def detach(self, thread_id):
+        with self.lock:
+            self.targets.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            with self.lock:
+                targets = dict(self.targets)
+            if not targets:
+                self.wakeup.wait()
+                self.wakeup.clear()
+                continue
+            frames = sys._current_frames()
+            for thread_id, profile in targets.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    profile.add(collapse_stack(frame))
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler():
+    global _sampler
+
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = _Sampler(profiling_settings()['INTERVAL'])
+                _sampler.start()
+    return _sampler
+
+
+class Profile:
+    """Stack samples and metadata for one profiled request or engine call"""
+
+    def __init__(self, kind, metadata=None, forced=False):
+        self.profile_id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.metadata = dict(metadata or {})
+        self.forced = forced
+        self.samples = Counter()
+        self.started_at = datetime.now(timezone.utc)
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, stack):
+        with self._lock:
+            self.samples[stack] += 1
+
+    @contextmanager
+    def attach(self):
+        """Sample the current thread into this profile for the duration of the block"""
+        sampler = _get_sampler()
+        thread_id = threading.get_ident()
+        if not sampler.attach(thread_id, self):
+            # Nested attach on the same thread (e.g. the engine hook inside a WSGI request)
+            yield self
+            return
+        try:
+            yield self
+        finally:
+            sampler.detach(thread_id)
+
+    def wrap(self, func):
+        """``func`` sampled into this profile in whichever thread it runs"""
+        @wraps(func)
+        def call(*args, **kwargs):
+            with self.attach():
+                return func(*args, **kwargs)
+        return call
+
+    def save(self, **metadata):
+        """Write ``<id>.collapsed`` and ``<id>.json``; returns the collapsed-stack path"""
+        conf = profiling_settings()
+        directory = profile_directory()
+        directory.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+            samples = dict(self.samples)
+        name = f"{self.started_at:%Y%m%dT%H%M%S}-{self.kind}-{self.profile_id}"
+        collapsed_path = directory / f'{name}.collapsed'
+        with open(collapsed_path, 'w') as f:
+            for stack, count in sorted(samples.items()):
+                f.write(f'{stack} {count}\n')
+
+        with open(directory / f'{name}.json', 'w') as f:
+            json.dump({
+                **self.metadata,
+                **metadata,
+                'profile_id': self.profile_id,
+                'kind': self.kind,
+                'started_at': self.started_at.isoformat(),
+                'duration_ms': round((time.perf_counter() - self._started) * 1000, 2),
+                'interval_ms': conf['INTERVAL'] * 1000,
+                'samples': sum(samples.values()),
+                'forced': self.forced,
+                'collapsed': collapsed_path.name,
+            }, f, indent=2)
+
+        _prune(directory, conf['MAX_PROFILES'])
+        return collapsed_path
+
+
+def _prune(directory, keep):
+    profiles = sorted(directory.glob('*.json'))
+    for metadata_path in profiles[:max(len(profiles) - keep, 0)]:
+        metadata_path.with_suffix('.collapsed').unlink(missing_ok=True)
+        metadata_path.unlink(missing_ok=True)
+
+
+def store(profile, **metadata):
+    """Save a profile, logging instead of raising on storage errors; returns the path or None"""
+    try:
+        path = profile.save(**metadata)
+    except OSError as e:
+        logger.warning(f"Could not store {profile.kind} profile: {str(e)}")
+        return None
+    logger.info(f"Stored {profile.kind} profile {path.name}")
+    return path
+
+
+def sampled(kind, metadata=None):
+    """A new profile for a fraction ``SAMPLE_RATE`` of calls, otherwise None"""
+    rate = profiling_settings()['SAMPLE_RATE']
+    if rate <= 0 or random.random() >= rate:
+        return None
+    return Profile(kind, metadata)
+
+
+def _is_staff(request):
+    """Staff check ahead of the view: the session user, else the DRF token the view would authenticate"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except APIException:
+            return False
+        user = authenticated[0] if authenticated else None
+    return bool(user and user.is_staff)
+
+
+def _wants_profile(request):
+    return profiling_settings()['HEADER'] in request.headers
+
+
+def request_profile(request):
+    """Profile for this request if it is sampled or a staff user asks for one, otherwise None
+
+    Non-staff requests carrying the header are only sampled like any other.
+    """
+    conf = profiling_settings()
+    forced = _wants_profile(request) and _is_staff(request)
+    if not forced and (conf['SAMPLE_RATE'] <= 0 or not any(re.search(p, request.path) for p in conf['PATHS'])):
+        return None
+    if not forced and random.random() >= conf['SAMPLE_RATE']:
+        return None
+    return Profile(
+        'request',
+        {'method': request.method, 'path': request.path, 'pid': os.getpid()},
+        forced=forced
+    )
+
+
+def attached(request, func):
+    """Wrap ``func`` so it is sampled into the request's profile, if it has one"""
+    profile = getattr(request, 'profile', None)
+    return func if profile is None else profile.wrap(func)
+
+
+def _finish(profile, request, response):
+    # DRF authenticates inside the view and mirrors the user onto the request
+    user = getattr(request, 'user', None)
+    if store(profile, status=response.status_code, user_id=getattr(user, 'pk', None)):
+        response['X-Profile-Id'] = profile.profile_id
+    return response
+
+
+@sync_and_async_middleware
+def ProfilingMiddleware(get_response):
+    """Samples selected requests; staff users can force a profile with the header
+
+    Under WSGI the whole request thread is sampled. Under ASGI only the engine
+    calls wrapped with ``attached()`` are, since the event loop thread is shared.
+    """
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            # The staff check may query the database
+            if _wants_profile(request):
+                profile = await sync_to_async(request_profile)(request)
+            else:
+                profile = request_profile(request)
+            if profile is None:
+                return await get_response(request)
+            request.profile = profile
+            response = await get_response(request)
+            return await sync_to_async(_finish)(profile, request, response)
+    else:
+        def middleware(request):
+            profile = request_profile(request)
+            if profile is None:
+                return get_response(request)
+            request.profile = profile
+            with profile.attach():
+                response = get_response(request)
+            return _finish(profile, request, response)
+
+    return middleware
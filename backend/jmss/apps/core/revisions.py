@@ -0,0 +1,263 @@
+"""
+Delta-encoded quotation revisions.
+
+A revision stores only what changed since the previous one: the quotation
+totals that differ and, per section (BOQ lines, transport trips, payment
+phases), the rows set or deleted, keyed by primary key. Every
+``CHECKPOINT_INTERVAL``-th revision also stores the full state, so any revision
+is materialized from the nearest checkpoint at or below it plus at most
+``CHECKPOINT_INTERVAL - 1`` deltas. A diff between two revisions replays the
+deltas in between and compares only the rows they touched.
+
+State is plain JSON: ``{'totals': {field: value}, section: {pk: [values]}}``
+with row values in ``SECTIONS`` column order and decimals as strings.
+"""
+
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import PaymentSchedule, Quotation, QuotationItem, QuotationRevision, TransportCost
+
+DEFAULTS = {
+    'CHECKPOINT_INTERVAL': 10,
+}
+
+TOTAL_FIELDS = (
+    'status', 'currency', 'subtotal', 'transport_total', 'tax_rate', 'tax_amount', 'total_amount',
+    'validity_days',
+)
+
+# (section, model, columns as (name, lookup)); changing a section's columns invalidates stored revisions
+SECTIONS = [
+    ('items', QuotationItem, [
+        ('item_code', 'item_code'),
+        ('description', 'description'),
+        ('category', 'category'),
+        ('unit', 'unit'),
+        ('quantity', 'quantity'),
+        ('unit_rate', 'unit_rate'),
+        ('total', 'total'),
+        ('supplier', 'supplier__supplier_id'),
+    ]),
+    ('transport', TransportCost, [
+        ('item_codes', 'item_codes'),
+        ('load_kg', 'load_kg'),
+        ('origin_location', 'origin_location'),
+        ('destination_location', 'destination_location'),
+        ('distance_km', 'distance_km'),
+        ('vehicle_type', 'vehicle_type'),
+        ('fuel_cost', 'fuel_cost'),
+        ('driver_cost', 'driver_cost'),
+        ('loading_cost', 'loading_cost'),
+        ('total_transport_cost', 'total_transport_cost'),
+    ]),
+    ('payments', PaymentSchedule, [
+        ('schedule_id', 'schedule_id'),
+        ('phase', 'phase'),
+        ('due_date', 'due_date'),
+        ('amount', 'amount'),
+    ]),
+]
+
+SECTION_COLUMNS = {section: [name for name, _ in columns] for section, _, columns in SECTIONS}
+
+
+def revision_settings():
+    return {**DEFAULTS, **getattr(settings, 'QUOTATION_REVISIONS', {})}
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def capture_state(quotation):
+    """Current totals and rows of a quotation, one query per section"""
+    totals = Quotation.objects.filter(pk=quotation.pk).values(*TOTAL_FIELDS).get()
+    state = {'totals': {field: _encode(value) for field, value in totals.items()}}
+    for section, model, columns in SECTIONS:
+        rows = model.objects.filter(quotation=quotation).values_list('pk', *[lookup for _, lookup in columns])
+        state[section] = {str(row[0]): [_encode(value) for value in row[1:]] for row in rows}
+    return state
+
+
+def compute_delta(old, new):
+    """Changes turning state ``old`` into ``new``; empty when they are equal"""
+    delta = {}
+    totals = {field: value for field, value in new['totals'].items() if old['totals'].get(field) != value}
+    if totals:
+        delta['totals'] = totals
+    for section in SECTION_COLUMNS:
+        before, after = old[section], new[section]
+        changes = {}
+        updated = {key: row for key, row in after.items() if before.get(key) != row}
+        if updated:
+            changes['set'] = updated
+        deleted = [key for key in before if key not in after]
+        if deleted:
+            changes['del'] = deleted
+        if changes:
+            delta[section] = changes
+    return delta
+
+
+def apply_delta(state, delta):
+    """New state with ``delta`` applied; ``state`` is not modified"""
+    state = dict(state)
+    if 'totals' in delta:
+        state['totals'] = {**state['totals'], **delta['totals']}
+    for section in SECTION_COLUMNS:
+        changes = delta.get(section)
+        if not changes:
+            continue
+        rows = {**state[section], **changes.get('set', {})}
+        for key in changes.get('del', ()):
+            rows.pop(key, None)
+        state[section] = rows
+    return state
+
+
+def _replay(quotation, number, start=None):
+    """State at revision ``number``, from ``(start_number, start_state)`` or the nearest checkpoint
+
+    Also returns the keys each replayed delta touched, for diffs.
+    """
+    revisions = QuotationRevision.objects.filter(quotation=quotation)
+    if start is None:
+        checkpoint = (
+            revisions.filter(number__lte=number, snapshot__isnull=False)
+            .order_by('-number').values_list('number', 'snapshot').first()
+        )
+        if checkpoint is None:
+            raise QuotationRevision.DoesNotExist(f"Revision {number} does not exist")
+        start = checkpoint
+    start_number, state = start
+
+    touched = {'totals': set(), **{section: set() for section in SECTION_COLUMNS}}
+    deltas = list(
+        revisions.filter(number__gt=start_number, number__lte=number)
+        .order_by('number').values_list('number', 'delta')
+    )
+    if start_number != number and (not deltas or deltas[-1][0] != number):
+        raise QuotationRevision.DoesNotExist(f"Revision {number} does not exist")
+    for _, delta in deltas:
+        state = apply_delta(state, delta)
+        touched['totals'].update(delta.get('totals', ()))
+        for section in SECTION_COLUMNS:
+            changes = delta.get(section, {})
+            touched[section].update(changes.get('set', ()))
+            touched[section].update(changes.get('del', ()))
+    return state, touched
+
+
+def materialize_revision(quotation, number):
+    """Full state of revision ``number`` (raises QuotationRevision.DoesNotExist)"""
+    state, _ = _replay(quotation, number)
+    return state
+
+
+def record_revision(quotation, note='', user=None):
+    """Store the quotation's current state as its next revision
+
+    Returns ``(revision, created)``; when nothing changed since the latest
+    revision that revision is returned with ``created`` False.
+    """
+    interval = max(int(revision_settings()['CHECKPOINT_INTERVAL']), 1)
+    with transaction.atomic():
+        # Serialize revisions of one quotation so numbers and deltas stay consistent
+        Quotation.objects.select_for_update().only('pk').get(pk=quotation.pk)
+        state = capture_state(quotation)
+
+        latest = QuotationRevision.objects.filter(quotation=quotation).order_by('-number').first()
+        if latest is None:
+            number, delta = 1, {}
+        else:
+            delta = compute_delta(materialize_revision(quotation, latest.number), state)
+            if not delta:
+                return latest, False
+            number = latest.number + 1
+
+        revision = QuotationRevision.objects.create(
+            quotation=quotation,
+            number=number,
+            delta=delta,
+            snapshot=state if (number - 1) % interval == 0 else None,
+            note=note[:200],
+            created_by=user,
+        )
+    return revision, True
+
+
+def _rows(section, rows):
+    columns = SECTION_COLUMNS[section]
+    return [{'id': key, **dict(zip(columns, row))} for key, row in rows]
+
+
+def diff_revisions(quotation, first, second):
+    """Totals and lines that differ between revisions ``first`` and ``second``
+
+    Going forward only the rows touched by the deltas in between are compared;
+    going back both revisions are materialized and compared in full.
+    """
+    if first <= second:
+        before = materialize_revision(quotation, first)
+        after, touched = _replay(quotation, second, start=(first, before))
+    else:
+        before, after = materialize_revision(quotation, first), materialize_revision(quotation, second)
+        touched = {
+            'totals': set(before['totals']) | set(after['totals']),
+            **{section: set(before[section]) | set(after[section]) for section in SECTION_COLUMNS},
+        }
+
+    diff = {
+        'from': first,
+        'to': second,
+        'totals': {
+            field: {'from': before['totals'].get(field), 'to': after['totals'].get(field)}
+            for field in TOTAL_FIELDS
+            if field in touched['totals'] and before['totals'].get(field) != after['totals'].get(field)
+        },
+    }
+    for section, columns in SECTION_COLUMNS.items():
+        old, new = before[section], after[section]
+        keys = sorted(touched[section], key=int)
+        changed = []
+        for key in keys:
+            if key in old and key in new and old[key] != new[key]:
+                changed.append({
+                    'id': key,
+                    **({'item_code': new[key][0]} if section == 'items' else {}),
+                    'changes': {
+                        column: {'from': a, 'to': b}
+                        for column, a, b in zip(columns, old[key], new[key]) if a != b
+                    },
+                })
+        diff[section] = {
+            'added': _rows(section, [(key, new[key]) for key in keys if key in new and key not in old]),
+            'removed': _rows(section, [(key, old[key]) for key in keys if key in old and key not in new]),
+            'changed': changed,
+        }
+    return diff
+
+
+def revision_summary(revision):
+    """Listing entry for a revision: what its delta changed, without the data"""
+    delta = revision.delta
+    return {
+        'number': revision.number,
+        'is_checkpoint': revision.is_checkpoint,
+        'note': revision.note,
+        'created_by': revision.created_by.username if revision.created_by else None,
+        'created_at': revision.created_at,
+        'totals_changed': sorted(delta.get('totals', {})),
+        'lines_changed': {
+            section: len(delta[section].get('set', {})) + len(delta[section].get('del', []))
+            for section in SECTION_COLUMNS if section in delta
+        },
+    }
@@ -0,0 +1,7 @@
+from django.urls import path
+from . import consumers
+
+websocket_urlpatterns = [
+    path('ws/quotation-jobs/<str:job_id>/', consumers.QuotationJobConsumer.as_asgi()),
+    path('ws/designs/generate/', consumers.DesignGenerationConsumer.as_asgi()),
+]
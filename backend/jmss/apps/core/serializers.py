@@ -101,9 +101,32 @@ class QuotationSerializer(serializers.ModelSerializer):
         model = Quotation
         fields = '__all__'
 
+class QuotationListSerializer(serializers.ModelSerializer):
+    """Totals-only representation for quotation lists; nested detail is served by retrieve"""
+    project_name = serializers.CharField(source='project.name', read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    
+    class Meta:
+        model = Quotation
+        fields = [
+            'id', 'quotation_id', 'project', 'project_name', 'status',
+            'subtotal', 'transport_total', 'tax_rate', 'tax_amount', 'total_amount', 'currency',
+            'validity_days', 'ai_confidence_score', 'item_count', 'generated_at', 'created_at', 'updated_at'
+        ]
+
 class PaymentScheduleSerializer(serializers.ModelSerializer):
     quotation = QuotationSerializer(read_only=True)
     
     class Meta:
         model = PaymentSchedule
         fields = '__all__'
+
+class QuotationJobSerializer(serializers.ModelSerializer):
+    quotation_id = serializers.CharField(source='quotation.quotation_id', read_only=True, default=None)
+    
+    class Meta:
+        model = QuotationJob
+        fields = [
+            'job_id', 'project', 'status', 'quotation', 'quotation_id', 'error',
+            'created_at', 'started_at', 'finished_at'
+        ]
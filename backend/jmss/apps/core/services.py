@@ -0,0 +1,544 @@
+"""
+Persistence and totals services for quotations.
+"""
+
+import uuid
+from contextlib import nullcontext
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Round
+from django.utils import timezone
+
+from .analytics import invalidate_variance_cache
+from .cache import cached_quotation
+from .engines import get_quotation_engine
+from .metrics import stage
+from .models import Project, Quotation, QuotationItem, Supplier, TransportCost, PaymentSchedule
+
+EDITABLE_ITEM_FIELDS = ('quantity', 'unit_rate', 'description')
+CENTS = Decimal('0.01')
+
+# Quotations still open to price changes
+OPEN_QUOTATION_STATUSES = ('draft', 'sent')
+
+
+def build_project_specs(project, data):
+    """Quotation engine inputs for a project, with request overrides for the building"""
+    specs = {
+        'name': project.name,
+        'location': project.location,
+        'project_type': project.project_type,
+        'building_area': data.get('building_area', 120),
+        'floors': data.get('floors', 1),
+        'bedrooms': data.get('bedrooms', 3),
+        'bathrooms': data.get('bathrooms', 2),
+        'budget': float(project.budget_amount or 2500000)
+    }
+    if project.coordinates:
+        # Site coordinates pick the nearest suppliers more precisely than the town name
+        specs['coordinates'] = project.coordinates
+    return specs
+
+
+def create_quotation(project, project_specs, deadline=None):
+    """Run the AI quotation engine (through the result cache) and store its output"""
+    ai_quotation = cached_quotation(get_quotation_engine(), project_specs, deadline)
+    return persist_quotation(project, ai_quotation)
+
+
+def _create_quotation_row(quotation_id, **fields):
+    """Insert a quotation under the engine's id, suffixed when that id is taken
+
+    Cached results share the same id. A random suffix cannot collide with
+    deleted copies or with a concurrent request, unlike a count of the repeats.
+    """
+    candidates = [quotation_id] + [f"{quotation_id}-{uuid.uuid4().hex[:8].upper()}" for _ in range(3)]
+    for candidate in candidates[:-1]:
+        try:
+            with transaction.atomic():
+                return Quotation.objects.create(quotation_id=candidate, **fields)
+        except IntegrityError:
+            continue
+    return Quotation.objects.create(quotation_id=candidates[-1], **fields)
+
+
+def _resolve_suppliers(items):
+    """Fetch or create every supplier referenced by the items with a constant number of queries"""
+    supplier_rows = {}
+    for item_data in items:
+        if item_data.get('supplier_id'):
+            supplier_rows.setdefault(item_data['supplier_id'], item_data)
+
+    if not supplier_rows:
+        return {}
+
+    suppliers = Supplier.objects.in_bulk(list(supplier_rows), field_name='supplier_id')
+    missing = [
+        Supplier(
+            supplier_id=supplier_id,
+            name=item_data['supplier_name'],
+            location=item_data['supplier_location'],
+            contact_email='info@supplier.com',
+            phone='0700000000',
+            county=item_data['supplier_location'].title()
+        )
+        for supplier_id, item_data in supplier_rows.items()
+        if supplier_id not in suppliers
+    ]
+    if missing:
+        # A concurrent request may create the same supplier, so re-read after inserting
+        Supplier.objects.bulk_create(missing, ignore_conflicts=True)
+        suppliers = Supplier.objects.in_bulk(list(supplier_rows), field_name='supplier_id')
+    return suppliers
+
+
+def persist_quotation(project, ai_quotation):
+    """Store an engine quotation with its items, transport costs and payment schedule
+
+    Runs in a single transaction with a constant number of queries regardless of
+    the number of lines.
+    """
+    with stage('quotation', 'persistence'), transaction.atomic():
+        quotation = _create_quotation_row(
+            ai_quotation['quotation_id'],
+            project=project,
+            subtotal=ai_quotation['totals']['subtotal'],
+            transport_total=ai_quotation['totals']['transport_total'],
+            tax_amount=ai_quotation['totals']['tax_amount'],
+            total_amount=ai_quotation['totals']['grand_total'],
+            ai_confidence_score=0.85
+        )
+
+        suppliers = _resolve_suppliers(ai_quotation['items'])
+
+        # Create quotation items (primary keys are returned by the bulk insert)
+        items = QuotationItem.objects.bulk_create([
+            QuotationItem(
+                quotation=quotation,
+                item_code=item_data['item_code'],
+                description=item_data['description'],
+                category=item_data['category'],
+                unit=item_data['unit'],
+                quantity=item_data['quantity'],
+                unit_rate=item_data['unit_rate'],
+                quoted_unit_rate=item_data['unit_rate'],
+                total=item_data['total'],
+                supplier=suppliers.get(item_data.get('supplier_id')),
+                supplier_confidence=item_data.get('price_confidence', 0.85)
+            )
+            for item_data in ai_quotation['items']
+        ])
+        items_by_code = {}
+        for item in items:
+            items_by_code.setdefault(item.item_code, item)
+
+        # Create one transport cost per trip, linked in memory to the first line it carries
+        TransportCost.objects.bulk_create([
+            TransportCost(
+                quotation=quotation,
+                item=items_by_code.get(transport_data['item_codes'][0]),
+                item_codes=transport_data['item_codes'],
+                load_kg=transport_data['load_kg'],
+                origin_location=transport_data.get('supplier_location', 'Unknown'),
+                destination_location=project.location,
+                distance_km=transport_data['distance_km'],
+                vehicle_type=transport_data['vehicle_type'],
+                fuel_cost=transport_data['fuel_cost'],
+                driver_cost=transport_data['driver_cost'],
+                loading_cost=transport_data['loading_cost'],
+                total_transport_cost=transport_data['total_transport_cost']
+            )
+            for transport_data in ai_quotation['transport_breakdown']
+            if transport_data.get('item_codes')
+        ])
+
+        # Create payment schedule ('Finishing' and 'Final Payment' share a prefix, so number the phases)
+        PaymentSchedule.objects.bulk_create([
+            PaymentSchedule(
+                schedule_id=f"PAY-{quotation.quotation_id}-{index}{schedule_data['phase'][:3].upper()}",
+                quotation=quotation,
+                phase=schedule_data['phase'],
+                due_date=schedule_data['due_date'],
+                amount=schedule_data['amount']
+            )
+            for index, schedule_data in enumerate(ai_quotation['payment_schedule'], start=1)
+        ])
+
+        # Update project status
+        Project.objects.filter(pk=project.pk).update(status='quotation')
+        project.status = 'quotation'
+        transaction.on_commit(lambda: invalidate_variance_cache(project.user_id))
+
+    return quotation
+
+
+def _to_decimal(value, field=None):
+    """Decimal from a number or numeric string; ValueError for anything else (including NaN/Infinity)
+
+    With a model ``DecimalField`` the number is rounded to its decimal places and
+    must fit its ``max_digits``, so it can be saved without a database error.
+    """
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        raise ValueError(f"Not a number: {value!r}")
+    if not number.is_finite():
+        raise ValueError(f"Not a finite number: {value!r}")
+    if field is None:
+        return number
+    limit = Decimal(10) ** (field.max_digits - field.decimal_places)
+    try:
+        number = number.quantize(Decimal(1).scaleb(-field.decimal_places), ROUND_HALF_UP)
+    except InvalidOperation:  # more digits than the decimal context holds
+        number = limit
+    if abs(number) >= limit:
+        raise ValueError(f"{field.name} must be less than {limit}: {value!r}")
+    return number
+
+
+def shifted_totals(delta):
+    """UPDATE values moving a quotation's subtotal by the ``delta`` expression
+
+    Tax is recomputed from the new subtotal and rounded to cents, as
+    ``reconcile_quotation_totals`` expects, rather than shifted by an unrounded amount.
+    """
+    subtotal = F('subtotal') + delta
+    tax_amount = Round((subtotal + F('transport_total')) * F('tax_rate'), 2)
+    return {
+        'subtotal': subtotal,
+        'tax_amount': tax_amount,
+        'total_amount': subtotal + F('transport_total') + tax_amount,
+        'updated_at': timezone.now(),
+    }
+
+
+def apply_subtotal_delta(quotation_id, delta):
+    """Shift a quotation's subtotal by ``delta`` and carry it through tax and grand total in SQL"""
+    if not delta:
+        return
+    delta = Value(delta, output_field=DecimalField(max_digits=15, decimal_places=2))
+    Quotation.objects.filter(pk=quotation_id).update(**shifted_totals(delta))
+
+
+def apply_subtotal_deltas(deltas, batch_size=1000):
+    """``apply_subtotal_delta`` for many quotations (pk -> delta), one UPDATE per batch"""
+    money = DecimalField(max_digits=15, decimal_places=2)
+    pending = [(pk, delta) for pk, delta in deltas.items() if delta]
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start:start + batch_size]
+        delta = Case(
+            *[When(pk=pk, then=Value(value, output_field=money)) for pk, value in batch],
+            default=Value(Decimal('0'), output_field=money), output_field=money
+        )
+        Quotation.objects.filter(pk__in=[pk for pk, _ in batch]).update(**shifted_totals(delta))
+
+
+def _item_field(name):
+    return QuotationItem._meta.get_field(name)
+
+
+def apply_item_changes(quotation, updates=(), additions=()):
+    """Apply many line edits and additions, maintaining totals from the old→new line deltas
+
+    ``updates`` are dicts with ``item_id`` and any of ``EDITABLE_ITEM_FIELDS``;
+    ``additions`` are dicts describing new lines. Raises ``QuotationItem.DoesNotExist``
+    if an update refers to a line outside the quotation and ``ValueError`` for a
+    quantity, unit rate or line total that is not a number or does not fit its
+    column. Returns the subtotal delta.
+    """
+    with transaction.atomic():
+        item_ids = [int(change['item_id']) for change in updates]
+        items = QuotationItem.objects.select_for_update().filter(quotation=quotation).in_bulk(item_ids)
+        if len(items) != len(set(item_ids)):
+            raise QuotationItem.DoesNotExist('Item not found')
+
+        delta = Decimal('0')
+        changed_fields = {'total', 'updated_at'}
+        for change in updates:
+            item = items[int(change['item_id'])]
+            old_total = item.total
+            for field in EDITABLE_ITEM_FIELDS:
+                if field in change:
+                    value = change[field]
+                    setattr(item, field, value if field == 'description' else _to_decimal(value, _item_field(field)))
+                    changed_fields.add(field)
+            item.total = _to_decimal(item.quantity * item.unit_rate, _item_field('total'))
+            item.updated_at = timezone.now()
+            delta += item.total - old_total
+        if items:
+            QuotationItem.objects.bulk_update(items.values(), sorted(changed_fields))
+
+        if additions:
+            next_number = QuotationItem.objects.filter(quotation=quotation).count() + 1
+            new_items = []
+            for offset, data in enumerate(additions):
+                quantity = _to_decimal(data.get('quantity', 1), _item_field('quantity'))
+                unit_rate = _to_decimal(data.get('unit_rate', 0), _item_field('unit_rate'))
+                new_items.append(QuotationItem(
+                    quotation=quotation,
+                    item_code=data.get('item_code', f'CUSTOM{next_number + offset}'),
+                    description=data.get('description', ''),
+                    category=data.get('category', 'custom'),
+                    unit=data.get('unit', 'pcs'),
+                    quantity=quantity,
+                    unit_rate=unit_rate,
+                    total=_to_decimal(quantity * unit_rate, _item_field('total'))
+                ))
+                delta += new_items[-1].total
+            QuotationItem.objects.bulk_create(new_items)
+
+        apply_subtotal_delta(quotation.pk, delta)
+        transaction.on_commit(lambda: invalidate_variance_cache(quotation.project.user_id))
+
+    return delta
+
+
+def _price_change_passes(changes):
+    """Split a price-change set into passes whose keys do not overlap
+
+    Item-wide and supplier-wide ratios (base price and supplier factor changes)
+    compose multiplicatively; (item, supplier) changes run last so an explicit
+    ``unit_rate`` wins. Within a pass the last change for a key wins.
+    """
+    supplier_codes = {str(change['supplier_id']) for change in changes if change.get('supplier_id')}
+    suppliers = dict(Supplier.objects.filter(supplier_id__in=supplier_codes).values_list('supplier_id', 'pk'))
+
+    passes = {'item': {}, 'supplier': {}, 'line': {}}
+    unknown = set()
+    for change in changes:
+        item_code = str(change['item_code']) if change.get('item_code') else None
+        supplier_code = str(change['supplier_id']) if change.get('supplier_id') else None
+        if item_code is None and supplier_code is None:
+            raise ValueError("A price change needs an item_code, a supplier_id or both")
+        if supplier_code is not None and supplier_code not in suppliers:
+            unknown.add(supplier_code)
+            continue
+        if change.get('unit_rate') not in (None, ''):
+            if item_code is None or supplier_code is None:
+                raise ValueError("A new unit_rate needs both item_code and supplier_id; use a ratio otherwise")
+            rule = ('rate', _to_decimal(change['unit_rate'], _item_field('unit_rate')))
+        elif change.get('ratio') not in (None, ''):
+            rule = ('ratio', _to_decimal(change['ratio']))
+        else:
+            raise ValueError(f"Price change for {item_code or supplier_code} has neither unit_rate nor ratio")
+
+        supplier_pk = suppliers.get(supplier_code)
+        if supplier_pk is None:
+            passes['item'][(item_code, None)] = rule
+        elif item_code is None:
+            passes['supplier'][(None, supplier_pk)] = rule
+        else:
+            passes['line'][(item_code, supplier_pk)] = rule
+    return [rules for rules in passes.values() if rules], sorted(unknown)
+
+
+def _reprice_pass(rules, statuses, batch_size, per_quotation):
+    """Apply one pass of non-overlapping price rules in batches; returns the lines updated"""
+    money = DecimalField(max_digits=12, decimal_places=2)
+    line_updates = 0
+    keys = list(rules)
+    for start in range(0, len(keys), batch_size):
+        match = Q()
+        whens = []
+        for item_code, supplier_pk in keys[start:start + batch_size]:
+            condition = Q()
+            if item_code is not None:
+                condition &= Q(item_code=item_code)
+            if supplier_pk is not None:
+                condition &= Q(supplier_id=supplier_pk)
+            match |= condition
+            kind, value = rules[(item_code, supplier_pk)]
+            rate = Value(value, output_field=money) if kind == 'rate' else F('unit_rate') * Value(value)
+            whens.append(When(condition, then=rate))
+        new_rate = Round(Case(*whens, default=F('unit_rate'), output_field=money), 2, output_field=money)
+        new_total = Round(F('quantity') * new_rate, 2, output_field=money)
+
+        with stage('quotation', 'repricing'), transaction.atomic():
+            # Lock the matched lines first so an edit committed between the aggregate
+            # and the UPDATE cannot move a total the deltas were not measured on
+            locked = list(
+                QuotationItem.objects.filter(match, quotation__status__in=statuses)
+                .select_for_update(of=('self',)).values_list('pk', flat=True)
+            )
+            lines = QuotationItem.objects.filter(pk__in=locked)
+            # Old and new line totals per quotation in one aggregate, before the lines change
+            sums = lines.order_by().values('quotation_id').annotate(
+                lines=Count('id'), old=Sum('total'), new=Sum(new_total)
+            )
+            deltas = {}
+            for row in sums:
+                delta = (_to_decimal(row['new']) - _to_decimal(row['old'])).quantize(CENTS)
+                deltas[row['quotation_id']] = delta
+                entry = per_quotation.setdefault(row['quotation_id'], [0, Decimal('0')])
+                entry[0] += row['lines']
+                entry[1] += delta
+                line_updates += row['lines']
+            if deltas:
+                lines.update(unit_rate=new_rate, total=new_total, updated_at=timezone.now())
+                apply_subtotal_deltas(deltas)
+    return line_updates
+
+
+def reprice_open_quotations(changes, statuses=OPEN_QUOTATION_STATUSES, batch_size=500, dry_run=False):
+    """Apply a price-change set to the lines of open quotations, and only those
+
+    ``changes`` carry an ``item_code`` and/or a ``supplier_id`` and either a
+    ``ratio`` scaling the current unit rate or (for an item and supplier) a new
+    ``unit_rate``. Each batch of changes finds its lines through the
+    (item_code, supplier) index, sums their old and new totals per quotation in
+    one aggregate, rewrites the lines in one UPDATE and moves the quotation
+    totals by the difference in another. Returns a change report; with
+    ``dry_run`` every change is rolled back once it has been measured.
+    """
+    passes, unknown = _price_change_passes(changes)
+    per_quotation = {}
+    line_updates = 0
+
+    # A dry run applies everything inside one transaction and rolls it back, so
+    # composed passes report exactly what a real run would do
+    with transaction.atomic() if dry_run else nullcontext():
+        for rules in passes:
+            line_updates += _reprice_pass(rules, statuses, batch_size, per_quotation)
+        if dry_run:
+            transaction.set_rollback(True)
+    if line_updates and not dry_run:
+        invalidate_variance_cache()
+
+    quotation_ids = {}
+    pks = list(per_quotation)
+    for start in range(0, len(pks), 5000):
+        quotation_ids.update(
+            Quotation.objects.filter(pk__in=pks[start:start + 5000]).values_list('pk', 'quotation_id')
+        )
+    return {
+        'dry_run': dry_run,
+        'changes': sum(len(rules) for rules in passes),
+        'unknown_suppliers': unknown,
+        'line_updates': line_updates,
+        'quotations_updated': sum(1 for _, delta in per_quotation.values() if delta),
+        'subtotal_change': sum((delta for _, delta in per_quotation.values()), Decimal('0')),
+        'quotations': [
+            {'quotation_id': quotation_ids.get(pk), 'line_updates': count, 'subtotal_change': delta}
+            for pk, (count, delta) in sorted(per_quotation.items())
+        ],
+    }
+
+
+def reconcile_quotation_totals(queryset=None, fix=True):
+    """Verify stored totals against a DB-side ``Sum`` of lines and transport costs
+
+    Returns the ids of quotations whose totals drifted; with ``fix`` they are
+    rewritten and their owners' cached variance analysis retired.
+    """
+    queryset = queryset if queryset is not None else Quotation.objects.all()
+    money = DecimalField(max_digits=15, decimal_places=2)
+    zero = Value(Decimal('0'), output_field=money)
+
+    def line_sum(model, column):
+        return Coalesce(Subquery(
+            model.objects.filter(quotation=OuterRef('pk'))
+            .order_by().values('quotation').annotate(total=Sum(column)).values('total'),
+            output_field=money
+        ), zero)
+
+    rows = queryset.annotate(
+        line_total=line_sum(QuotationItem, 'total'),
+        transport_line_total=line_sum(TransportCost, 'total_transport_cost'),
+    ).values_list('pk', 'subtotal', 'transport_total', 'tax_amount', 'tax_rate', 'line_total', 'transport_line_total')
+
+    drifted = []
+    for pk, subtotal, transport_total, tax_amount, tax_rate, line_total, transport_line_total in rows.iterator(chunk_size=2000):
+        expected_subtotal = _to_decimal(line_total).quantize(CENTS)
+        expected_transport = _to_decimal(transport_line_total).quantize(CENTS)
+        # Half-up, like SQL ROUND in shifted_totals
+        expected_tax = ((expected_subtotal + expected_transport) * _to_decimal(tax_rate)).quantize(CENTS, ROUND_HALF_UP)
+        if (_to_decimal(subtotal), _to_decimal(transport_total), _to_decimal(tax_amount)) == (
+                expected_subtotal, expected_transport, expected_tax):
+            continue
+        drifted.append(pk)
+        if fix:
+            Quotation.objects.filter(pk=pk).update(
+                subtotal=expected_subtotal,
+                transport_total=expected_transport,
+                tax_amount=expected_tax,
+                total_amount=expected_subtotal + expected_transport + expected_tax,
+                updated_at=timezone.now()
+            )
+    if fix and drifted:
+        owners = Quotation.objects.filter(pk__in=drifted).values_list('project__user_id', flat=True).distinct()
+        for user_id in owners:
+            invalidate_variance_cache(user_id)
+    return drifted
+
+
+def plan_delivery_routes(quotations, max_route_km=None):
+    """Route the stored truck trips of ``quotations`` as shared multi-drop deliveries
+
+    Each trip becomes one drop from its supplier's town to its project site. The
+    summary also carries the transport cost the quotations were priced with.
+    """
+    trips = TransportCost.objects.filter(quotation__in=quotations.order_by().values('pk')).order_by('pk').values_list(
+        'pk', 'quotation__quotation_id', 'quotation__project__project_id',
+        'origin_location', 'destination_location', 'load_kg', 'total_transport_cost'
+    )
+    drops = []
+    quoted = Decimal('0')
+    for pk, quotation_id, project_id, origin, destination, load_kg, cost in trips.iterator(chunk_size=2000):
+        drops.append({
+            'drop_id': pk,
+            'quotation_id': quotation_id,
+            'site': project_id,
+            'origin': origin,
+            'destination': destination,
+            'load_kg': load_kg,
+        })
+        quoted += cost
+
+    engine = get_quotation_engine()
+    with stage('quotation', 'routing'):
+        plan = engine.transport_optimizer.plan_fleet_routes(drops, max_route_km=max_route_km)
+    plan['summary']['quoted_transport_cost'] = float(quoted)
+    return plan
+
+
+def reprice_quotation(quotation, as_of):
+    """Price a stored quotation's lines as of ``as_of`` from the price history"""
+    lines = [
+        {'item_code': item_code, 'supplier_id': supplier_id, 'quantity': quantity, 'unit_rate': unit_rate}
+        for item_code, supplier_id, quantity, unit_rate in QuotationItem.objects.filter(
+            quotation=quotation
+        ).order_by('pk').values_list('item_code', 'supplier__supplier_id', 'quantity', 'unit_rate')
+    ]
+    engine = get_quotation_engine()
+    with stage('quotation', 'repricing'):
+        repriced = engine.reprice_lines(lines, quotation.project.location, as_of)
+    repriced['quotation_id'] = quotation.quotation_id
+    return repriced
+
+
+def compare_quotation_suppliers(quotation, supplier_ids=None):
+    """Price a stored quotation's lines against every eligible supplier, delivered to its site"""
+    lines = []
+    quoted = {}
+    for item_code, category, quantity, supplier_id, total in QuotationItem.objects.filter(
+        quotation=quotation
+    ).order_by('pk').values_list('item_code', 'category', 'quantity', 'supplier__supplier_id', 'total'):
+        lines.append({'item_code': item_code, 'category': category, 'quantity': quantity})
+        quoted[supplier_id] = quoted.get(supplier_id, Decimal('0')) + total
+
+    project = quotation.project
+    engine = get_quotation_engine()
+    with stage('quotation', 'supplier_comparison'):
+        comparison = engine.compare_suppliers(
+            lines, project.location, coordinates=project.coordinates, supplier_ids=supplier_ids
+        )
+    comparison['quotation_id'] = quotation.quotation_id
+    comparison['quoted'] = {
+        'goods_cost': float(quotation.subtotal),
+        'transport_cost': float(quotation.transport_total),
+        'total_cost': float(quotation.subtotal + quotation.transport_total),
+        'suppliers': {supplier_id: float(total) for supplier_id, total in quoted.items()},
+    }
+    return comparison
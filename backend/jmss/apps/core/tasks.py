@@ -0,0 +1,85 @@
+"""
+Celery tasks for long-running quotation work.
+"""
+
+import logging
+
+from asgiref.sync import async_to_sync
+from celery import shared_task
+from channels.layers import get_channel_layer
+from django.db import transaction
+from django.utils import timezone
+
+from .admission import quotation_admission
+from .cache import cached_quotation
+from .consumers import quotation_job_group
+from .engines import get_quotation_engine
+from .models import Quotation, QuotationJob
+from .serializers import QuotationJobSerializer
+from .services import persist_quotation, reconcile_quotation_totals
+
+logger = logging.getLogger(__name__)
+
+
+def notify_quotation_job(job):
+    """Push the job's current state to websocket clients watching it"""
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            quotation_job_group(job.job_id),
+            {'type': 'job.update', 'job': QuotationJobSerializer(job).data}
+        )
+    except Exception as e:
+        # Push is best effort; clients can always poll the status endpoint
+        logger.warning(f"Could not publish update for job {job.job_id}: {str(e)}")
+
+
+def _update_job(job, **fields):
+    for field, value in fields.items():
+        setattr(job, field, value)
+    job.save(update_fields=[*fields, 'updated_at'])
+    notify_quotation_job(job)
+
+
+@shared_task(name='jmss.apps.core.tasks.generate_quotation_task')
+def generate_quotation_task(job_id):
+    """Run the quotation engine for a job and persist the result through the bulk path
+
+    Tasks are acknowledged late, so a job can be redelivered after its worker
+    died. The quotation is stored in the same transaction that marks the job
+    succeeded, under a lock on the job row, so a redelivery never stores it twice.
+    """
+    job = QuotationJob.objects.select_related('project').get(job_id=job_id)
+    if job.status == 'succeeded':
+        return job.quotation_id
+
+    _update_job(job, status='running', started_at=timezone.now())
+    try:
+        # Worker concurrency bounds the engine here; only the inference timeout applies
+        ai_quotation = cached_quotation(get_quotation_engine(), job.project_specs, quotation_admission().deadline())
+        with transaction.atomic():
+            stored = QuotationJob.objects.select_for_update().values_list('quotation_id', flat=True).get(pk=job.pk)
+            if stored is not None:
+                quotation = Quotation.objects.get(pk=stored)
+            else:
+                quotation = persist_quotation(job.project, ai_quotation)
+            job.status, job.quotation, job.finished_at = 'succeeded', quotation, timezone.now()
+            job.save(update_fields=['status', 'quotation', 'finished_at', 'updated_at'])
+    except Exception as e:
+        logger.error(f"Quotation job {job_id} failed: {str(e)}")
+        _update_job(job, status='failed', error=str(e), finished_at=timezone.now())
+        raise
+
+    notify_quotation_job(job)
+    return quotation.pk
+
+
+@shared_task(name='jmss.apps.core.tasks.reconcile_quotation_totals_task')
+def reconcile_quotation_totals_task():
+    """Periodic check of incrementally maintained totals against their lines"""
+    drifted = reconcile_quotation_totals()
+    if drifted:
+        logger.warning(f"Corrected drifted totals on {len(drifted)} quotations")
+    return len(drifted)
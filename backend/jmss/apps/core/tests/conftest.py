@@ -0,0 +1,30 @@
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from rest_framework.test import APIClient
+
+from jmss.apps.core.models import Project
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Request coalescing and engine results live in the cache, across test transactions"""
+    for cache in caches.all():
+        cache.clear()
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username='owner', password='secret')
+
+
+@pytest.fixture
+def api_client(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+@pytest.fixture
+def project(user):
+    return Project.objects.create(project_id='PRJ-TEST-001', name='Test house', user=user, location='Nairobi')
@@ -0,0 +1,87 @@
+"""
+Admission control: a saturated engine answers 429 or 503 with Retry-After.
+"""
+
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from jmss.apps.core.admission import AdmissionController, EngineSaturated, EngineTimeout, EngineUnavailable
+from jmss.apps.core.engines import engine_executor
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+def controller(timeout=5.0, queue_size=0, queue_timeout=0.05):
+    return AdmissionController('test', max_concurrent=1, timeout=timeout, queue_size=queue_size,
+                               queue_timeout=queue_timeout, retry_after=7)
+
+
+def test_full_queue_is_rejected_with_429():
+    admission = controller(queue_size=0)
+    with admission.admit():
+        with pytest.raises(EngineSaturated) as rejected:
+            admission.acquire()
+    assert type(rejected.value) is EngineSaturated
+    assert (rejected.value.status_code, rejected.value.wait) == (429, 7)
+    # The slot is free again once the holder leaves
+    with admission.admit():
+        pass
+
+
+def test_queued_request_without_a_slot_is_rejected_with_503():
+    admission = controller(queue_size=1, queue_timeout=0.05)
+    with admission.admit():
+        with pytest.raises(EngineUnavailable) as rejected:
+            admission.acquire()
+    assert rejected.value.status_code == 503
+
+
+def test_slow_engine_call_times_out_and_keeps_its_slot_until_it_stops():
+    admission = controller(timeout=0.05)
+    finish = threading.Event()
+
+    def slow(deadline):
+        finish.wait(5)
+        return 'late'
+
+    with pytest.raises(EngineTimeout) as timed_out:
+        async_to_sync(admission.run)(engine_executor(), slow)
+    assert timed_out.value.status_code == 503
+
+    # The abandoned call still holds the only slot
+    with pytest.raises(EngineSaturated):
+        admission.acquire()
+    finish.set()
+    assert admission._slots.acquire(timeout=1)
+
+
+def test_saturated_generate_returns_429_with_retry_after(api_client, project, monkeypatch):
+    admission = controller(queue_size=0)
+    monkeypatch.setattr('jmss.apps.core.views.quotation_admission', lambda: admission)
+
+    with admission.admit():
+        response = api_client.post(f'/api/projects/{project.pk}/generate_quotation/', SPECS, format='json')
+
+    assert response.status_code == 429
+    assert response['Retry-After'] == '7'
+
+
+def test_async_generate_timeout_returns_503_with_retry_after(user, project, monkeypatch):
+    admission = controller(timeout=0.05)
+    finish = threading.Event()
+    monkeypatch.setattr('jmss.apps.core.async_views.quotation_admission', lambda: admission)
+    monkeypatch.setattr('jmss.apps.core.async_views.create_quotation', lambda *args: finish.wait(5))
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+
+    try:
+        response = client.post(f'/api/async/projects/{project.pk}/generate_quotation/', SPECS, format='json')
+    finally:
+        finish.set()
+
+    assert response.status_code == 503
+    assert response['Retry-After'] == '7'
@@ -0,0 +1,131 @@
+"""
+Websocket consumers: streamed design generation and quotation job updates.
+"""
+
+import asyncio
+import threading
+
+import pytest
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+
+from jmss.apps.core.consumers import DesignGenerationConsumer
+from jmss.apps.core.models import QuotationJob
+from jmss.apps.core.routing import websocket_urlpatterns
+from jmss.apps.core.tasks import notify_quotation_job
+
+REQUIREMENTS = {'building_area': 120, 'bedrooms': 3}
+
+
+class SteppedEngine:
+    """Design engine stand-in; when ``blocking`` each option waits for a release of ``steps``"""
+
+    def __init__(self, blocking=False):
+        self.blocking = blocking
+        self.steps = threading.Semaphore(0)
+        self.produced = 0
+
+    def iter_designs(self, requirements, num_variations=3, seed=None, deadline=None):
+        for index in range(num_variations):
+            if self.blocking:
+                self.steps.acquire(timeout=5)
+            self.produced += 1
+            yield {'design_id': f'D{index}', 'requirements': requirements}
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    engine = SteppedEngine()
+    monkeypatch.setattr('jmss.apps.core.consumers.get_design_engine', lambda: engine)
+    return engine
+
+
+def communicator(user):
+    connection = WebsocketCommunicator(DesignGenerationConsumer.as_asgi(), '/ws/designs/generate/')
+    connection.scope['user'] = user
+    return connection
+
+
+def test_streams_started_designs_completed(user, engine):
+    async def run():
+        connection = communicator(user)
+        connected, _ = await connection.connect()
+        assert connected
+        await connection.send_json_to({'requirements': REQUIREMENTS, 'variations': 3})
+        messages = [await connection.receive_json_from(timeout=5) for _ in range(5)]
+        await connection.disconnect()
+        return messages
+
+    messages = async_to_sync(run)()
+
+    assert [message['type'] for message in messages] == ['started', 'design', 'design', 'design', 'completed']
+    assert messages[0]['variations'] == 3
+    assert [message['index'] for message in messages[1:4]] == [0, 1, 2]
+    assert [message['design']['design_id'] for message in messages[1:4]] == ['D0', 'D1', 'D2']
+    assert messages[4]['count'] == 3
+
+
+def test_disconnect_cancels_remaining_designs(user, engine):
+    engine.blocking = True
+
+    async def run():
+        connection = communicator(user)
+        await connection.connect()
+        await connection.send_json_to({'requirements': REQUIREMENTS, 'variations': 5})
+        assert (await connection.receive_json_from(timeout=5))['type'] == 'started'
+        engine.steps.release()
+        assert (await connection.receive_json_from(timeout=5))['type'] == 'design'
+        await connection.disconnect()
+        # Keep the loop running: the step in flight may finish, but no further one starts
+        engine.steps.release(5)
+        await asyncio.sleep(0.3)
+
+    async_to_sync(run)()
+    assert engine.produced <= 2
+
+
+def test_rejects_anonymous_and_invalid_requests(user, engine):
+    async def run():
+        anonymous = WebsocketCommunicator(DesignGenerationConsumer.as_asgi(), '/ws/designs/generate/')
+        connected, code = await anonymous.connect()
+        assert not connected and code == 4401
+
+        connection = communicator(user)
+        await connection.connect()
+        await connection.send_json_to({'requirements': REQUIREMENTS, 'variations': 0})
+        replies = [await connection.receive_json_from(timeout=5)]
+        await connection.send_json_to({'requirements': REQUIREMENTS, 'seed': 'lucky'})
+        replies.append(await connection.receive_json_from(timeout=5))
+        await connection.disconnect()
+        return replies
+
+    bad_variations, bad_seed = async_to_sync(run)()
+    assert bad_variations['type'] == 'error'
+    assert bad_seed == {'type': 'error', 'error': 'seed must be an integer'}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_job_updates_reach_the_owner_only(project, django_user_model):
+    job = QuotationJob.objects.create(job_id='job-ws', project=project, project_specs={})
+    other = django_user_model.objects.create_user(username='other', password='secret')
+
+    async def run():
+        stranger = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/quotation-jobs/{job.job_id}/')
+        stranger.scope['user'] = other
+        connected, code = await stranger.connect()
+        assert not connected and code == 4403
+
+        owner = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f'/ws/quotation-jobs/{job.job_id}/')
+        owner.scope['user'] = project.user
+        connected, _ = await owner.connect()
+        assert connected
+        job.status = 'running'
+        await database_sync_to_async(notify_quotation_job)(job)
+        update = await owner.receive_json_from(timeout=5)
+        await owner.disconnect()
+        return update
+
+    update = async_to_sync(run)()
+    assert (update['job_id'], update['status']) == ('job-ws', 'running')
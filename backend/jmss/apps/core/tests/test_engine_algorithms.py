@@ -0,0 +1,145 @@
+"""
+Small deterministic cases for the quotation engine's road, supplier, sourcing and routing algorithms.
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from jmss.apps.core.engines import QUOTATION_CONFIG_PATH, _ensure_ai_models_path
+
+_ensure_ai_models_path()
+from quotation_engine.quotation_ai import create_quotation_engine  # noqa: E402
+from quotation_engine.roads import RoadNetwork  # noqa: E402
+from quotation_engine.routing import FleetRouter  # noqa: E402
+from quotation_engine.sourcing import SourcingOptimizer  # noqa: E402
+from quotation_engine.suppliers import SupplierIndex  # noqa: E402
+
+EDGES = [
+    ('Nairobi', 'Junction', 10),
+    ('Junction', 'Thika', 30),
+    ('Nairobi', 'Thika', 50),
+    ('Junction', 'Ruiru', 5),
+    ('Nairobi', 'Mombasa', 480),
+]
+
+
+@pytest.fixture
+def network():
+    return RoadNetwork.from_edges(EDGES)
+
+
+def test_shortest_path_runs_through_the_junction(network):
+    assert network.distance('Nairobi', 'Thika') == 40
+    assert network.distance('Westlands, Nairobi', 'thika') == 40
+    assert network.distance('Mombasa', 'Ruiru') == 495
+
+
+def test_unknown_town_has_no_distance(network):
+    distances = network.distances(['Nairobi', 'Atlantis'], ['Thika', 'Nairobi'])
+
+    assert distances[0] == 40 and math.isnan(distances[1])
+    assert network.distance('Atlantis', 'Nairobi') is None
+
+
+def test_nearest_suppliers_are_filtered_by_category():
+    index = SupplierIndex([
+        {'id': 'CEM-NBI', 'location': 'Nairobi', 'coordinates': [-1.286, 36.817], 'categories': ['cement']},
+        {'id': 'STEEL-NBI', 'location': 'Nairobi', 'coordinates': [-1.290, 36.820], 'categories': ['steel']},
+        {'id': 'CEM-MSA', 'location': 'Mombasa', 'coordinates': [-4.043, 39.668], 'categories': ['cement']},
+        {'id': 'ALL-NKR', 'location': 'Nakuru', 'coordinates': [-0.303, 36.080], 'categories': None},
+    ])
+
+    nearest = index.nearest_suppliers('cement', (-1.292, 36.822), k=3)
+
+    assert [supplier['id'] for supplier in nearest] == ['CEM-NBI', 'ALL-NKR', 'CEM-MSA']
+    assert nearest[0]['distance_km'] < 1 < nearest[1]['distance_km'] < nearest[2]['distance_km']
+    assert [supplier['id'] for supplier in index.nearest_suppliers('steel', (-1.292, 36.822), k=5)] == [
+        'STEEL-NBI', 'ALL-NKR'
+    ]
+    assert index.categories == ['cement', 'steel']
+
+
+def flat_fee_delivery(loads, distances):
+    return np.where(loads > 0, 5.0, 0.0)
+
+
+def test_minimum_order_is_repaired_and_savings_are_against_the_single_supplier():
+    unit_costs = np.array([
+        [10.0, 14.0, 8.0],
+        [30.0, 20.0, 28.0],
+        [25.0, 30.0, 30.0],
+    ])
+    # The cheapest goods per line would order 8 from supplier 2, under its minimum of 50
+    result = SourcingOptimizer(flat_fee_delivery).optimize(
+        unit_costs, quantities=np.ones(3), weights=np.ones(3), distances=np.zeros(3),
+        min_order=np.array([0.0, 0.0, 50.0])
+    )
+
+    assert result['assignment'].tolist() == [0, 1, 0]
+    assert result['min_order_violations'] == []
+    assert (result['goods_cost'], result['total_cost']) == (55.0, 65.0)
+    # Supplier 1 alone: 64 of goods plus one delivery
+    assert (result['baseline_supplier'], result['baseline_cost'], result['savings']) == (1, 69.0, 4.0)
+
+
+class Transport:
+    """One truck type, with distances from a small road network"""
+    vehicle_capacity = {'lorry': 1000}
+    fuel_consumption = {'lorry': 5}
+    fuel_cost_per_liter = 200.0
+    cost_per_km = {'lorry': 100}
+    loading_cost = 1000
+
+    def __init__(self, network):
+        self.network = network
+
+    def distance_matrix(self, towns):
+        rows = self.network.rows(towns)
+        return self.network.matrix[np.ix_(rows, rows)].astype(np.float64)
+
+
+def test_clarke_wright_merges_nearby_drops_within_capacity(network):
+    drops = [
+        {'drop_id': 'ruiru', 'origin': 'Nairobi', 'destination': 'Ruiru', 'load_kg': 300},
+        {'drop_id': 'thika', 'origin': 'Nairobi', 'destination': 'Thika', 'load_kg': 400},
+        # Same town as the second drop, but together they would overload the truck
+        {'drop_id': 'thika-heavy', 'origin': 'Nairobi', 'destination': 'Thika', 'site': 'B', 'load_kg': 900},
+    ]
+
+    plan = FleetRouter(Transport(network)).plan(drops)
+
+    routes = sorted((route['load_kg'], [stop['drop_id'] for stop in route['stops']]) for route in plan['routes'])
+    assert routes == [(700, ['ruiru', 'thika']), (900, ['thika-heavy'])]
+    assert all(route['load_kg'] <= 1000 for route in plan['routes'])
+    merged = next(route for route in plan['routes'] if len(route['stops']) == 2)
+    assert merged['distance_km'] == 90  # Nairobi, Ruiru, Thika and back instead of 30 + 80 km
+    assert plan['summary']['routed_distance_km'] == 170 < plan['summary']['baseline_distance_km'] == 190
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return create_quotation_engine(QUOTATION_CONFIG_PATH)
+
+
+def test_compare_suppliers_baskets(engine):
+    lines = [
+        {'item_code': 'C001', 'category': 'concrete', 'quantity': 10},
+        {'item_code': 'S001', 'category': 'steel', 'quantity': 200},
+    ]
+
+    comparison = engine.compare_suppliers(lines, 'nairobi', supplier_ids=['SUP001', 'SUP002'])
+
+    baskets = {basket['supplier_id']: basket for basket in comparison['baskets']}
+    goods = np.array(comparison['goods'])
+    for s, supplier in enumerate(comparison['suppliers']):
+        basket = baskets[supplier['id']]
+        assert basket['complete'] and basket['lines_covered'] == 2
+        assert basket['goods_cost'] == pytest.approx(goods[:, s].sum(), abs=0.01)
+        assert basket['total_cost'] == pytest.approx(basket['goods_cost'] + basket['transport_cost'], abs=0.01)
+    # Same catalog goods, so the local supplier wins on delivery
+    assert baskets['SUP001']['transport_cost'] < baskets['SUP002']['transport_cost']
+    assert comparison['baskets'][0] == baskets['SUP001']
+    assert comparison['best_single_supplier'] == 'SUP001'
+    assert comparison['mixed_basket']['total_cost'] <= baskets['SUP001']['total_cost'] + 0.01
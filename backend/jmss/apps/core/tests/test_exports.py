@@ -0,0 +1,107 @@
+"""
+Streaming quotation exports in CSV, JSON-lines and XLSX.
+"""
+
+import csv
+import io
+import json
+import zipfile
+from collections import Counter
+from datetime import timedelta
+from xml.etree import ElementTree
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.handlers.asgi import ASGIRequest
+from django.utils import timezone
+
+from jmss.apps.core.exports import export_response
+from jmss.apps.core.models import PaymentSchedule, Project, Quotation, QuotationItem, TransportCost
+from jmss.apps.core.services import build_project_specs, create_quotation
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+SHEET = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+@pytest.fixture
+def quotations(project):
+    specs = build_project_specs(project, SPECS)
+    return [create_quotation(project, specs) for _ in range(2)]
+
+
+def expected_counts(quotations=None):
+    pks = [quotation.pk for quotation in quotations or Quotation.objects.all()]
+    return {
+        'quotations': len(pks),
+        'items': QuotationItem.objects.filter(quotation__in=pks).count(),
+        'transport': TransportCost.objects.filter(quotation__in=pks).count(),
+        'payments': PaymentSchedule.objects.filter(quotation__in=pks).count(),
+    }
+
+
+def download(api_client, fmt, **params):
+    response = api_client.get('/api/quotations/export/', {'fmt': fmt, **params})
+    assert response.status_code == 200
+    return b''.join(response.streaming_content)
+
+
+def test_csv(api_client, quotations):
+    rows = list(csv.DictReader(io.StringIO(download(api_client, 'csv').decode('utf-8'))))
+
+    assert Counter(row['section'] for row in rows) == expected_counts()
+    item = next(row for row in rows if row['section'] == 'items')
+    stored = QuotationItem.objects.get(quotation__quotation_id=item['quotation_id'], item_code=item['item_code'])
+    assert item['total'] == str(stored.total)
+
+
+def test_jsonl(api_client, quotations):
+    records = [json.loads(line) for line in download(api_client, 'jsonl').decode('utf-8').splitlines()]
+
+    assert Counter(record['section'] for record in records) == expected_counts()
+    totals = {record['quotation_id']: record['total_amount'] for record in records if record['section'] == 'quotations'}
+    assert totals == {quotation.quotation_id: str(quotation.total_amount) for quotation in quotations}
+
+
+def test_xlsx(api_client, quotations):
+    package = zipfile.ZipFile(io.BytesIO(download(api_client, 'xlsx')))
+    assert package.testzip() is None
+
+    workbook = ElementTree.fromstring(package.read('xl/workbook.xml'))
+    names = [sheet.get('name') for sheet in workbook.iter(f'{SHEET}sheet')]
+    assert names == ['Quotations', 'Items', 'Transport', 'Payments']
+
+    counts = expected_counts()
+    for index, name in enumerate(names, start=1):
+        sheet = ElementTree.fromstring(package.read(f'xl/worksheets/sheet{index}.xml'))
+        rows = list(sheet.iter(f'{SHEET}row'))
+        assert len(rows) == counts[name.lower()] + 1  # header row
+
+
+def test_export_all_filters(api_client, user, quotations):
+    other = Project.objects.create(project_id='PRJ-TEST-002', name='Other house', user=user, location='Mombasa')
+    other_quotation = create_quotation(other, build_project_specs(other, SPECS))
+
+    def exported(**params):
+        rows = csv.DictReader(io.StringIO(download(api_client, 'csv', **params).decode('utf-8')))
+        return {row['quotation_id'] for row in rows if row['section'] == 'quotations'}
+
+    assert exported() == {quotation.quotation_id for quotation in [*quotations, other_quotation]}
+    assert exported(project='PRJ-TEST-002') == {other_quotation.quotation_id}
+    tomorrow = timezone.localdate() + timedelta(days=1)
+    assert exported(created_after=tomorrow.isoformat()) == set()
+    assert exported(created_before=tomorrow.isoformat(), project='PRJ-TEST-001') == {
+        quotation.quotation_id for quotation in quotations
+    }
+    assert api_client.get('/api/quotations/export/', {'created_after': 'yesterday'}).status_code == 400
+
+
+def test_asgi_requests_get_an_async_stream(quotations):
+    request = ASGIRequest({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []}, io.BytesIO())
+    response = export_response(Quotation.objects.all(), 'jsonl', 'export', request)
+    assert response.is_async
+
+    async def consume():
+        return b''.join([chunk async for chunk in response.streaming_content])
+
+    records = [json.loads(line) for line in async_to_sync(consume)().decode('utf-8').splitlines()]
+    assert Counter(record['section'] for record in records) == expected_counts()
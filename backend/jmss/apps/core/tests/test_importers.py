@@ -0,0 +1,89 @@
+"""
+Re-importing price history upserts on (material, supplier, location, effective_date),
+and re-importing supplier items only overwrites the columns the file provides.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from jmss.apps.core.importers import CatalogImporter
+from jmss.apps.core.models import Material, MaterialItem, PriceHistory, Supplier
+
+PRICES = [
+    {'material_id': 'CEM-01', 'effective_date': '2026-01-01', 'unit_price': '750'},
+    {'material_id': 'CEM-01', 'effective_date': '2026-01-01', 'unit_price': '760', 'location': 'Nairobi'},
+    {'material_id': 'CEM-01', 'effective_date': '2026-01-01', 'unit_price': '740', 'supplier_id': 'SUP-01'},
+]
+
+
+@pytest.fixture(autouse=True)
+def catalog(db):
+    Material.objects.create(material_id='CEM-01', name='Cement 50kg', category='concrete',
+                            unit_of_measure='bag', base_price=Decimal('750'))
+    Supplier.objects.create(supplier_id='SUP-01', name='Supplier', contact_email='s@example.com',
+                            phone='0700000000', location='Nairobi', county='Nairobi')
+
+
+def stored_prices():
+    return sorted(
+        PriceHistory.objects.values_list('supplier__supplier_id', 'location', 'unit_price'),
+        key=lambda row: (row[0] or '', row[1])
+    )
+
+
+def test_price_reimport_updates_in_place():
+    CatalogImporter('prices').run(PRICES)
+    CatalogImporter('prices').run([{**row, 'unit_price': str(int(row['unit_price']) + 10)} for row in PRICES])
+
+    assert stored_prices() == [
+        (None, '', Decimal('760.00')),
+        (None, 'Nairobi', Decimal('770.00')),
+        ('SUP-01', '', Decimal('750.00')),
+    ]
+
+
+def test_last_duplicate_in_a_file_wins():
+    CatalogImporter('prices').run([PRICES[0], {**PRICES[0], 'unit_price': '755'}])
+
+    assert stored_prices() == [(None, '', Decimal('755.00'))]
+
+
+def test_catalog_price_changes_on_one_day_keep_one_entry():
+    row = {'material_id': 'CEM-01', 'name': 'Cement 50kg', 'category': 'concrete', 'unit_of_measure': 'bag'}
+    CatalogImporter('materials').run([{**row, 'base_price': '780'}])
+    CatalogImporter('materials').run([{**row, 'base_price': '790'}])
+
+    assert stored_prices() == [(None, '', Decimal('790.00'))]
+
+
+def stored_item():
+    return MaterialItem.objects.values('category', 'estimate_id', 'unit_price', 'total_cost').get(item_id='ITM-01')
+
+
+def test_item_reimport_keeps_columns_the_file_omits():
+    item = {'item_id': 'ITM-01', 'material_id': 'CEM-01', 'supplier_id': 'SUP-01', 'unit_price': '700'}
+    CatalogImporter('items').run([{**item, 'category': 'binders', 'estimate_id': 'EST-7', 'total_cost': '7000'}])
+
+    CatalogImporter('items').run([{**item, 'unit_price': '720'}])
+
+    assert stored_item() == {'category': 'binders', 'estimate_id': 'EST-7',
+                             'unit_price': Decimal('720.00'), 'total_cost': Decimal('7000.00')}
+
+
+def test_item_columns_are_taken_row_by_row():
+    item = {'material_id': 'CEM-01', 'supplier_id': 'SUP-01', 'unit_price': '700'}
+    CatalogImporter('items').run([
+        {**item, 'item_id': 'ITM-00'},
+        {**item, 'item_id': 'ITM-01', 'category': 'binders', 'estimate_id': 'EST-7', 'total_cost': '7000'},
+    ])
+
+    # As in JSON-lines, where only a later row carries a column
+    CatalogImporter('items').run([
+        {**item, 'item_id': 'ITM-00', 'unit_price': '710'},
+        {**item, 'item_id': 'ITM-01', 'unit_price': '720', 'category': 'cement'},
+    ])
+
+    assert stored_item() == {'category': 'cement', 'estimate_id': 'EST-7',
+                             'unit_price': Decimal('720.00'), 'total_cost': Decimal('7000.00')}
+    assert MaterialItem.objects.get(item_id='ITM-00').category == 'concrete'
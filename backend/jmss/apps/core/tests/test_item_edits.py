@@ -0,0 +1,87 @@
+"""
+Line edits keep quotation totals in step with their lines, and bad values are 400s.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from jmss.apps.core.models import Quotation, QuotationItem
+from jmss.apps.core.services import build_project_specs, create_quotation, reconcile_quotation_totals
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+@pytest.fixture
+def quotation(project):
+    return create_quotation(project, build_project_specs(project, SPECS))
+
+
+def lines(quotation, count=2):
+    return list(quotation.items.order_by('pk')[:count])
+
+
+def test_update_item_maintains_totals(api_client, quotation):
+    item = lines(quotation, 1)[0]
+    response = api_client.post(f'/api/quotations/{quotation.pk}/update_item/', {
+        'item_id': item.pk, 'quantity': '3.456', 'unit_rate': 1234.5
+    }, format='json')
+
+    assert response.status_code == 200
+    item.refresh_from_db()
+    assert (item.quantity, item.total) == (Decimal('3.46'), Decimal('4271.37'))
+    assert reconcile_quotation_totals(fix=False) == []
+
+
+def test_batch_update_items_maintains_totals(api_client, quotation):
+    first, second = lines(quotation)
+    quotation.refresh_from_db()
+    subtotal = quotation.subtotal - first.total - second.total
+    response = api_client.post(f'/api/quotations/{quotation.pk}/batch_update_items/', {
+        'items': [
+            {'item_id': first.pk, 'quantity': 2},
+            {'item_id': second.pk, 'unit_rate': '99.99', 'description': 'Repriced'},
+        ],
+        'new_items': [{'description': 'Site cabin', 'quantity': 1, 'unit_rate': 25000}],
+    }, format='json')
+
+    assert response.status_code == 200
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert second.description == 'Repriced'
+    quotation.refresh_from_db()
+    assert quotation.subtotal == subtotal + first.total + second.total + Decimal('25000.00')
+    assert reconcile_quotation_totals(fix=False) == []
+
+
+@pytest.mark.parametrize('action, payload', [
+    ('update_item', {'quantity': '1e20'}),
+    ('update_item', {'unit_rate': 'lots'}),
+    ('update_item', {'unit_rate': 'NaN'}),
+    ('update_item', {'quantity': 99999999, 'unit_rate': 99999999}),  # each fits, their total does not
+    ('add_item', {'quantity': 1, 'unit_rate': '1e20'}),
+    ('batch_update_items', {'items': [{'quantity': '1e20'}]}),
+    ('batch_update_items', {'new_items': [{'quantity': 'Infinity'}]}),
+])
+def test_values_that_do_not_fit_are_rejected(api_client, quotation, action, payload):
+    item = lines(quotation, 1)[0]
+    if action == 'update_item':
+        payload = {'item_id': item.pk, **payload}
+    for change in payload.get('items', []):
+        change['item_id'] = item.pk
+    before = Quotation.objects.values('subtotal', 'total_amount').get(pk=quotation.pk)
+
+    response = api_client.post(f'/api/quotations/{quotation.pk}/{action}/', payload, format='json')
+
+    assert response.status_code == 400
+    assert Quotation.objects.values('subtotal', 'total_amount').get(pk=quotation.pk) == before
+    assert QuotationItem.objects.get(pk=item.pk).total == item.total
+
+
+def test_unknown_item_in_batch_is_rejected(api_client, quotation):
+    other = create_quotation(quotation.project, build_project_specs(quotation.project, SPECS))
+    response = api_client.post(f'/api/quotations/{quotation.pk}/batch_update_items/', {
+        'items': [{'item_id': lines(other, 1)[0].pk, 'quantity': 1}]
+    }, format='json')
+
+    assert response.status_code == 400
@@ -0,0 +1,35 @@
+"""
+Header-forced request profiles are reserved for staff users.
+"""
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, override_settings
+from rest_framework.authtoken.models import Token
+
+from jmss.apps.core.profiling import request_profile
+
+
+def forced_request(user=None, token=None):
+    headers = {'HTTP_X_PROFILE_REQUEST': '1'}
+    if token:
+        headers['HTTP_AUTHORIZATION'] = f'Token {token.key}'
+    request = RequestFactory().get('/api/quotations/', **headers)
+    request.user = user or AnonymousUser()
+    return request
+
+
+@override_settings(PROFILING={'SAMPLE_RATE': 0.0})
+def test_header_ignored_for_anonymous_and_non_staff(user):
+    assert request_profile(forced_request()) is None
+    assert request_profile(forced_request(user)) is None
+    assert request_profile(forced_request(token=Token.objects.create(user=user))) is None
+
+
+@override_settings(PROFILING={'SAMPLE_RATE': 0.0})
+def test_header_forces_profile_for_staff(user):
+    user.is_staff = True
+    user.save()
+
+    assert request_profile(forced_request(user)).forced
+    # Token clients are authenticated by DRF inside the view, after the middleware
+    assert request_profile(forced_request(token=Token.objects.create(user=user))).forced
@@ -0,0 +1,56 @@
+"""
+Engine result caching and coalescing of repeated generate requests.
+"""
+
+from jmss.apps.core.cache import cached_quotation
+from jmss.apps.core.models import Quotation
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+class CountingEngine:
+    version = '1'
+    data_version = 'catalog-1'
+
+    def __init__(self):
+        self.calls = 0
+
+    def generate_detailed_quotation(self, project_specs, deadline=None):
+        self.calls += 1
+        return {'calls': self.calls}
+
+
+def generate(api_client, project, specs=SPECS, **headers):
+    return api_client.post(f'/api/projects/{project.pk}/generate_quotation/', specs, format='json', headers=headers)
+
+
+def test_repeat_request_in_window_returns_the_same_quotation(api_client, project):
+    first = generate(api_client, project)
+    second = generate(api_client, project)
+
+    assert first.status_code == second.status_code == 201
+    assert first.data['id'] == second.data['id']
+    assert Quotation.objects.count() == 1
+    # Different specs are a different request
+    assert generate(api_client, project, {**SPECS, 'bedrooms': 3}).data['id'] != first.data['id']
+
+
+def test_idempotency_key_replays_and_rejects_a_different_body(api_client, project):
+    first = generate(api_client, project, Idempotency_Key='order-42')
+    replay = generate(api_client, project, Idempotency_Key='order-42')
+    assert first.data['id'] == replay.data['id']
+
+    response = generate(api_client, project, {**SPECS, 'floors': 2}, Idempotency_Key='order-42')
+
+    assert response.status_code == 422
+    assert Quotation.objects.count() == 1
+
+
+def test_cached_result_misses_when_the_data_version_changes():
+    engine = CountingEngine()
+    assert cached_quotation(engine, SPECS) == cached_quotation(engine, dict(reversed(SPECS.items()))) == {'calls': 1}
+
+    engine.data_version = 'catalog-2'
+
+    assert cached_quotation(engine, SPECS) == {'calls': 2}
+    assert engine.calls == 2
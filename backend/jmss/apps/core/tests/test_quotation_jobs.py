@@ -0,0 +1,87 @@
+"""
+Asynchronous quotation generation, with Celery running tasks eagerly.
+"""
+
+import pytest
+
+from jmss.apps.core.models import Quotation, QuotationJob
+from jmss.apps.core.services import build_project_specs
+from jmss.apps.core.tasks import generate_quotation_task
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+def enqueue(api_client, project):
+    return api_client.post(f'/api/projects/{project.pk}/generate_quotation/?async=1', SPECS, format='json')
+
+
+def test_enqueue_returns_pending_job(api_client, project, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        response = enqueue(api_client, project)
+
+    assert response.status_code == 202
+    assert response.data['status'] == 'pending'
+    assert response.data['websocket_path'] == f"/ws/quotation-jobs/{response.data['job_id']}/"
+    # The task is sent only once the job row is committed
+    assert len(callbacks) == 1
+    assert QuotationJob.objects.get(job_id=response.data['job_id']).status == 'pending'
+
+
+def test_job_succeeds_with_its_quotation(api_client, project, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        response = enqueue(api_client, project)
+
+    job = QuotationJob.objects.get(job_id=response.data['job_id'])
+    assert job.status == 'succeeded'
+    assert job.started_at and job.finished_at
+    assert job.quotation.project == project
+    assert Quotation.objects.count() == 1
+
+
+def test_redelivered_job_stores_one_quotation(project):
+    job = QuotationJob.objects.create(job_id='job-redelivered', project=project,
+                                      project_specs=build_project_specs(project, SPECS))
+    first = generate_quotation_task(job.job_id)
+    # Redelivered (late ack) before the worker finished its updates
+    QuotationJob.objects.filter(pk=job.pk).update(status='running')
+    second = generate_quotation_task(job.job_id)
+
+    job.refresh_from_db()
+    assert first == second == job.quotation_id
+    assert job.status == 'succeeded'
+    assert Quotation.objects.count() == 1
+
+
+def test_job_failure_is_recorded(api_client, project, django_capture_on_commit_callbacks, monkeypatch):
+    def broken_engine(*args, **kwargs):
+        raise RuntimeError('engine unavailable')
+
+    monkeypatch.setattr('jmss.apps.core.tasks.cached_quotation', broken_engine)
+    # Eager tasks propagate their exceptions (CELERY_TASK_EAGER_PROPAGATES)
+    with pytest.raises(RuntimeError):
+        with django_capture_on_commit_callbacks(execute=True):
+            enqueue(api_client, project)
+
+    job = QuotationJob.objects.get(project=project)
+    assert job.status == 'failed'
+    assert job.error == 'engine unavailable'
+    assert job.quotation is None
+    assert not Quotation.objects.exists()
+
+
+def test_status_endpoint(api_client, project, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        job_id = enqueue(api_client, project).data['job_id']
+
+    response = api_client.get(f'/api/quotation-jobs/{job_id}/')
+    assert response.status_code == 200
+    assert response.data['status'] == 'succeeded'
+    assert response.data['quotation'] == QuotationJob.objects.get(job_id=job_id).quotation_id
+
+
+def test_status_endpoint_hides_other_users_jobs(api_client, project, django_user_model):
+    other = django_user_model.objects.create_user(username='other', password='secret')
+    api_client.force_authenticate(other)
+    job = QuotationJob.objects.create(job_id='job-private', project=project, project_specs=SPECS)
+
+    assert api_client.get(f'/api/quotation-jobs/{job.job_id}/').status_code == 404
@@ -0,0 +1,38 @@
+"""
+Query counts of the quotation list and detail endpoints, independent of the number of rows.
+"""
+
+import pytest
+
+from jmss.apps.core.services import build_project_specs, create_quotation
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+@pytest.fixture
+def quotations(project):
+    specs = build_project_specs(project, SPECS)
+    return [create_quotation(project, specs) for _ in range(3)]
+
+
+def test_list_queries(api_client, quotations, django_assert_num_queries):
+    # Page count, then the page with projects joined and line counts annotated
+    with django_assert_num_queries(2):
+        response = api_client.get('/api/quotations/')
+
+    assert response.status_code == 200
+    assert len(response.data['results']) == len(quotations)
+    assert all(row['item_count'] > 0 for row in response.data['results'])
+
+
+def test_detail_queries(api_client, quotations, django_assert_num_queries):
+    quotation = quotations[0]
+    assert quotation.items.count() > 1 and quotation.transport_costs.exists()
+
+    # The quotation with its project and owner, then the prefetched lines and transport trips
+    with django_assert_num_queries(3):
+        response = api_client.get(f'/api/quotations/{quotation.pk}/')
+
+    assert response.status_code == 200
+    assert len(response.data['items']) == quotation.items.count()
+    assert len(response.data['transport_costs']) == quotation.transport_costs.count()
@@ -0,0 +1,61 @@
+"""
+Repricing open quotations from a price-change set keeps their totals reconciled.
+"""
+
+from decimal import Decimal
+
+import pytest
+
+from jmss.apps.core.models import Quotation, QuotationItem
+from jmss.apps.core.services import (
+    build_project_specs, create_quotation, reconcile_quotation_totals, reprice_open_quotations
+)
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+CHANGES = [
+    {'item_code': 'C001', 'ratio': '1.1'},
+    {'item_code': 'S001', 'supplier_id': 'SUP001', 'unit_rate': '90.00'},
+]
+
+
+@pytest.fixture
+def quotations(project):
+    specs = build_project_specs(project, SPECS)
+    draft, sent, accepted = (create_quotation(project, specs) for _ in range(3))
+    Quotation.objects.filter(pk=sent.pk).update(status='sent')
+    Quotation.objects.filter(pk=accepted.pk).update(status='accepted')
+    return draft, sent, accepted
+
+
+def snapshot():
+    return {
+        'lines': sorted(QuotationItem.objects.values_list('pk', 'unit_rate', 'total')),
+        'totals': sorted(Quotation.objects.values_list('pk', 'subtotal', 'tax_amount', 'total_amount')),
+    }
+
+
+def test_reprice_keeps_totals_reconciled(quotations):
+    draft, sent, accepted = quotations
+    rates = dict(QuotationItem.objects.filter(quotation=draft).values_list('item_code', 'unit_rate'))
+    accepted_before = Quotation.objects.values_list('total_amount', flat=True).get(pk=accepted.pk)
+
+    report = reprice_open_quotations(CHANGES)
+
+    assert report['line_updates'] == 4 and report['quotations_updated'] == 2
+    for quotation in (draft, sent):
+        repriced = dict(QuotationItem.objects.filter(quotation=quotation).values_list('item_code', 'unit_rate'))
+        assert repriced['C001'] == (rates['C001'] * Decimal('1.1')).quantize(Decimal('0.01'))
+        assert repriced['S001'] == Decimal('90.00')
+        assert repriced['C002'] == rates['C002']
+    assert Quotation.objects.values_list('total_amount', flat=True).get(pk=accepted.pk) == accepted_before
+    assert reconcile_quotation_totals(fix=False) == []
+
+
+def test_dry_run_rolls_back(quotations):
+    before = snapshot()
+
+    report = reprice_open_quotations(CHANGES, dry_run=True)
+
+    assert report['dry_run'] and report['line_updates'] == 4 and report['subtotal_change']
+    assert snapshot() == before
+    assert reconcile_quotation_totals(fix=False) == []
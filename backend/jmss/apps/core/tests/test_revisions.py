@@ -0,0 +1,85 @@
+"""
+Delta-encoded quotation revisions: checkpoints, materialization and diffs.
+"""
+
+import pytest
+
+from jmss.apps.core.models import QuotationItem, QuotationRevision
+from jmss.apps.core.revisions import capture_state, diff_revisions, materialize_revision, record_revision
+from jmss.apps.core.services import apply_item_changes, build_project_specs, create_quotation
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+@pytest.fixture
+def quotation(project, settings):
+    settings.QUOTATION_REVISIONS = {'CHECKPOINT_INTERVAL': 3}
+    return create_quotation(project, build_project_specs(project, SPECS))
+
+
+def first_line(quotation):
+    return quotation.items.order_by('pk').first()
+
+
+def test_revisions_materialize_between_checkpoints(quotation):
+    states = {}
+    for quantity in range(1, 9):
+        apply_item_changes(quotation, updates=[{'item_id': first_line(quotation).pk, 'quantity': quantity}])
+        revision, created = record_revision(quotation)
+        assert created
+        states[revision.number] = capture_state(quotation)
+
+    checkpoints = QuotationRevision.objects.filter(quotation=quotation, snapshot__isnull=False)
+    assert sorted(checkpoints.values_list('number', flat=True)) == [1, 4, 7]
+    for number, state in states.items():
+        assert materialize_revision(quotation, number) == state
+    with pytest.raises(QuotationRevision.DoesNotExist):
+        materialize_revision(quotation, 9)
+
+
+def test_unchanged_state_returns_the_latest_revision(quotation):
+    first, _ = record_revision(quotation)
+    apply_item_changes(quotation, updates=[{'item_id': first_line(quotation).pk, 'quantity': 2}])
+    latest, created = record_revision(quotation)
+
+    again, created_again = record_revision(quotation)
+
+    assert created and not created_again
+    assert again.pk == latest.pk and latest.number == first.number + 1
+    assert QuotationRevision.objects.filter(quotation=quotation).count() == 2
+
+
+def test_diff_forward_and_back(quotation):
+    changed, removed = quotation.items.order_by('pk')[:2]
+    record_revision(quotation)
+    apply_item_changes(quotation, updates=[{'item_id': changed.pk, 'quantity': '7'}],
+                       additions=[{'item_code': 'EXTRA1', 'quantity': 1, 'unit_rate': 500}])
+    record_revision(quotation)
+    QuotationItem.objects.filter(pk=removed.pk).delete()
+    record_revision(quotation)
+    added = QuotationItem.objects.get(quotation=quotation, item_code='EXTRA1')
+
+    forward = diff_revisions(quotation, 1, 3)
+
+    assert [row['id'] for row in forward['items']['added']] == [str(added.pk)]
+    assert [row['id'] for row in forward['items']['removed']] == [str(removed.pk)]
+    assert forward['items']['changed'] == [{
+        'id': str(changed.pk),
+        'item_code': changed.item_code,
+        'changes': {
+            'quantity': {'from': str(changed.quantity), 'to': '7.00'},
+            'total': {'from': str(changed.total), 'to': str(QuotationItem.objects.get(pk=changed.pk).total)},
+        },
+    }]
+    assert set(forward['totals']) == {'subtotal', 'tax_amount', 'total_amount'}
+    assert forward['transport'] == forward['payments'] == {'added': [], 'removed': [], 'changed': []}
+
+    back = diff_revisions(quotation, 3, 1)
+
+    assert back['items']['added'] == forward['items']['removed']
+    assert back['items']['removed'] == forward['items']['added']
+    assert back['items']['changed'][0]['changes']['quantity'] == {'from': '7.00', 'to': str(changed.quantity)}
+    assert back['totals'] == {
+        field: {'from': values['to'], 'to': values['from']} for field, values in forward['totals'].items()
+    }
+    assert diff_revisions(quotation, 2, 2)['items'] == {'added': [], 'removed': [], 'changed': []}
@@ -0,0 +1,61 @@
+"""
+Writes that change a user's variance analysis retire its cached periods.
+"""
+
+import pytest
+
+from jmss.apps.core.models import Quotation
+from jmss.apps.core.services import build_project_specs, create_quotation, reconcile_quotation_totals
+
+SPECS = {'building_area': 150, 'floors': 1, 'bedrooms': 2}
+
+
+@pytest.fixture
+def quotation(project, django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks(execute=True):
+        return create_quotation(project, build_project_specs(project, SPECS))
+
+
+def revised_total(api_client, **params):
+    response = api_client.get('/api/quotations/variance/', params)
+    assert response.status_code == 200
+    return sum(period['revised_total'] for period in response.data['periods'])
+
+
+def test_quotation_delete(api_client, quotation, django_capture_on_commit_callbacks):
+    assert revised_total(api_client) > 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert api_client.delete(f'/api/quotations/{quotation.pk}/').status_code == 204
+
+    assert revised_total(api_client) == 0
+
+
+def test_quotation_status_update(api_client, quotation, django_capture_on_commit_callbacks):
+    assert revised_total(api_client, status='accepted') == 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = api_client.patch(f'/api/quotations/{quotation.pk}/', {'status': 'accepted'}, format='json')
+    assert response.status_code == 200
+
+    assert revised_total(api_client, status='accepted') > 0
+
+
+def test_project_delete(api_client, project, quotation, django_capture_on_commit_callbacks):
+    assert revised_total(api_client) > 0
+
+    with django_capture_on_commit_callbacks(execute=True):
+        assert api_client.delete(f'/api/projects/{project.pk}/').status_code == 204
+
+    assert revised_total(api_client) == 0
+
+
+def test_reconcile_fix(api_client, quotation):
+    assert revised_total(api_client, status='draft') > 0
+
+    # Drift the totals and change the status behind the views' backs
+    Quotation.objects.filter(pk=quotation.pk).update(subtotal=0, status='sent')
+    assert revised_total(api_client, status='draft') > 0  # still cached
+
+    assert reconcile_quotation_totals() == [quotation.pk]
+    assert revised_total(api_client, status='draft') == 0
@@ -1,7 +1,7 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import async_views, views
 
 router = DefaultRouter()
 router.register(r'profiles', views.UserProfileViewSet)
@@ -11,8 +11,13 @@ router.register(r'material-items', views.MaterialItemViewSet)
 router.register(r'projects', views.ProjectViewSet)
 router.register(r'designs', views.DesignDraftViewSet)
 router.register(r'quotations', views.QuotationViewSet)
+router.register(r'quotation-jobs', views.QuotationJobViewSet)
 router.register(r'bim-models', views.BimModelViewSet)
 
 urlpatterns = [
+    # Async (ASGI) endpoints for the heavy actions
+    path('api/async/projects/<int:pk>/generate_quotation/', async_views.generate_quotation),
+    path('api/async/designs/generate/', async_views.generate_designs),
+    path('api/async/bim-models/export_ifc/', async_views.export_ifc),
     path('api/', include(router.urls)),
 ]
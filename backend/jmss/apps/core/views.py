@@ -4,16 +4,31 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.urls import reverse
+from django.utils.dateparse import parse_date
 from .models import *
 from .serializers import *
-import sys
-import os
+from .admission import EngineSaturated, quotation_admission
+from .analytics import invalidate_variance_cache, variance_analysis
+from .cache import coalesce_generation, IdempotencyKeyReused
+from .exports import FORMATS, export_response
+from .metrics import stage
+from .profiling import attached
+from .revisions import diff_revisions, materialize_revision, record_revision, revision_summary
+from .services import (
+    EDITABLE_ITEM_FIELDS, apply_item_changes, build_project_specs, compare_quotation_suppliers, create_quotation,
+    plan_delivery_routes, reprice_quotation
+)
+from .tasks import generate_quotation_task
+import logging
+import uuid
 
-# Add AI models to Python path
-ai_models_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), '..', '..', 'ai_models')
-sys.path.append(ai_models_path)
+logger = logging.getLogger(__name__)
 
-from quotation_engine.quotation_ai import create_quotation_engine
+def _invalidate_variance_on_commit(user_id):
+    """Retire the user's cached variance analysis once the current write commits"""
+    transaction.on_commit(lambda: invalidate_variance_cache(user_id))
 
 class UserProfileViewSet(viewsets.ModelViewSet):
     queryset = UserProfile.objects.all()
@@ -67,112 +82,97 @@ class ProjectViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # Variance is grouped by project location
+        _invalidate_variance_on_commit(self.request.user.pk)
+    
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        _invalidate_variance_on_commit(self.request.user.pk)
+    
     @action(detail=True, methods=['post'])
     def generate_quotation(self, request, pk=None):
         """Generate AI-powered detailed quotation for project"""
         project = self.get_object()
         
         # Get project specifications from request
-        project_specs = {
-            'name': project.name,
-            'location': project.location,
-            'project_type': project.project_type,
-            'building_area': request.data.get('building_area', 120),
-            'floors': request.data.get('floors', 1),
-            'bedrooms': request.data.get('bedrooms', 3),
-            'bathrooms': request.data.get('bathrooms', 2),
-            'budget': project.budget_amount or 2500000
-        }
+        project_specs = build_project_specs(project, request.data)
+        
+        if str(request.query_params.get('async', request.data.get('async', ''))).lower() in ('1', 'true'):
+            return self._enqueue_quotation(request, project, project_specs)
         
         try:
-            # Initialize AI quotation engine
-            config_path = os.path.join(ai_models_path, 'quotation_engine', 'config.json')
-            quotation_engine = create_quotation_engine(config_path)
-            
-            # Generate detailed quotation
-            ai_quotation = quotation_engine.generate_detailed_quotation(project_specs)
-            
-            # Create quotation in database
-            quotation = Quotation.objects.create(
-                quotation_id=ai_quotation['quotation_id'],
-                project=project,
-                subtotal=ai_quotation['totals']['subtotal'],
-                transport_total=ai_quotation['totals']['transport_total'],
-                tax_amount=ai_quotation['totals']['tax_amount'],
-                total_amount=ai_quotation['totals']['grand_total'],
-                ai_confidence_score=0.85
-            )
-            
-            # Create quotation items
-            for item_data in ai_quotation['items']:
-                supplier = None
-                if item_data.get('supplier_id'):
-                    supplier, created = Supplier.objects.get_or_create(
-                        supplier_id=item_data['supplier_id'],
-                        defaults={
-                            'name': item_data['supplier_name'],
-                            'location': item_data['supplier_location'],
-                            'contact_email': 'info@supplier.com',
-                            'phone': '0700000000',
-                            'county': item_data['supplier_location'].title()
-                        }
-                    )
-                
-                QuotationItem.objects.create(
-                    quotation=quotation,
-                    item_code=item_data['item_code'],
-                    description=item_data['description'],
-                    category=item_data['category'],
-                    unit=item_data['unit'],
-                    quantity=item_data['quantity'],
-                    unit_rate=item_data['unit_rate'],
-                    total=item_data['total'],
-                    supplier=supplier,
-                    supplier_confidence=item_data.get('price_confidence', 0.85)
-                )
-            
-            # Create transport costs
-            for transport_data in ai_quotation['transport_breakdown']:
-                if 'item_code' in transport_data:
-                    item = QuotationItem.objects.filter(
-                        quotation=quotation,
-                        item_code=transport_data['item_code']
-                    ).first()
-                    
-                    if item:
-                        TransportCost.objects.create(
-                            quotation=quotation,
-                            item=item,
-                            origin_location=transport_data.get('supplier_location', 'Unknown'),
-                            destination_location=project.location,
-                            distance_km=transport_data['distance_km'],
-                            vehicle_type=transport_data['vehicle_type'],
-                            fuel_cost=transport_data['fuel_cost'],
-                            driver_cost=transport_data['driver_cost'],
-                            loading_cost=transport_data['loading_cost'],
-                            total_transport_cost=transport_data['total_transport_cost']
-                        )
-            
-            # Create payment schedule
-            for schedule_data in ai_quotation['payment_schedule']:
-                PaymentSchedule.objects.create(
-                    schedule_id=f"PAY-{quotation.quotation_id}-{schedule_data['phase'][:3].upper()}",
-                    quotation=quotation,
-                    phase=schedule_data['phase'],
-                    due_date=schedule_data['due_date'],
-                    amount=schedule_data['amount']
+            # Identical concurrent requests (double-clicks, retries) share one computation;
+            # a saturated engine rejects with 429/503 and Retry-After
+            with quotation_admission().admit() as deadline:
+                quotation_pk = attached(request, coalesce_generation)(
+                    request.user.pk, project.pk, project_specs,
+                    lambda: create_quotation(project, project_specs, deadline).pk,
+                    idempotency_key=request.headers.get('Idempotency-Key')
                 )
+            quotation = Quotation.objects.with_details().get(pk=quotation_pk)
             
-            # Update project status
-            project.status = 'quotation'
-            project.save()
-            
-            serializer = QuotationSerializer(quotation)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            with stage('quotation', 'serialization'):
+                data = QuotationSerializer(quotation).data
+            return Response(data, status=status.HTTP_201_CREATED)
             
+        except IdempotencyKeyReused:
+            return Response(
+                {'error': 'Idempotency-Key was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        except EngineSaturated:
+            raise
         except Exception as e:
             logger.error(f"Error generating quotation: {str(e)}")
             return Response({'error': f'Failed to generate quotation: {str(e)}'}, status=500)
+    
+    def _enqueue_quotation(self, request, project, project_specs):
+        """Queue generation on the quotation workers and return the job for polling"""
+        def create_job():
+            job = QuotationJob.objects.create(
+                job_id=uuid.uuid4().hex,
+                project=project,
+                project_specs=project_specs
+            )
+            transaction.on_commit(
+                lambda: generate_quotation_task.apply_async(args=[job.job_id], task_id=job.job_id)
+            )
+            return job.pk
+        
+        try:
+            job_pk = coalesce_generation(
+                request.user.pk, project.pk, {**project_specs, 'async': True}, create_job,
+                idempotency_key=request.headers.get('Idempotency-Key')
+            )
+        except IdempotencyKeyReused:
+            return Response(
+                {'error': 'Idempotency-Key was already used for a different request'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        
+        job = QuotationJob.objects.select_related('quotation').get(pk=job_pk)
+        data = QuotationJobSerializer(job).data
+        data['status_url'] = request.build_absolute_uri(
+            reverse('quotationjob-detail', kwargs={'job_id': job.job_id})
+        )
+        data['websocket_path'] = f'/ws/quotation-jobs/{job.job_id}/'
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+class QuotationJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of asynchronous quotation generation jobs"""
+    queryset = QuotationJob.objects.all()
+    serializer_class = QuotationJobSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'job_id'
+    
+    def get_queryset(self):
+        return (
+            QuotationJob.objects.filter(project__user=self.request.user)
+            .select_related('quotation')
+            .order_by('-created_at')
+        )
 
 class DesignDraftViewSet(viewsets.ModelViewSet):
     queryset = DesignDraft.objects.all()
@@ -208,7 +208,186 @@ class QuotationViewSet(viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Quotation.objects.filter(project__user=self.request.user)
+        queryset = Quotation.objects.filter(project__user=self.request.user).order_by('-created_at')
+        if self.action == 'list':
+            return queryset.with_summary()
+        if self.action in ('retrieve', 'update', 'partial_update'):
+            return queryset.with_details()
+        return queryset
+    
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return QuotationListSerializer
+        return QuotationSerializer
+    
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        # Variance can be filtered by quotation status
+        _invalidate_variance_on_commit(self.request.user.pk)
+    
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        _invalidate_variance_on_commit(self.request.user.pk)
+    
+    def _detail_response(self, quotation):
+        """Serialize a freshly prefetched copy (edits invalidate the prefetch cache)"""
+        quotation = Quotation.objects.with_details().get(pk=quotation.pk)
+        return Response(QuotationSerializer(quotation, context=self.get_serializer_context()).data)
+    
+    def _export(self, request, quotations, filename):
+        # 'format' is taken by DRF's format suffixes, so the export format is 'fmt'
+        fmt = request.query_params.get('fmt', 'csv').lower()
+        if fmt not in FORMATS:
+            return Response({'error': f"fmt must be one of: {', '.join(FORMATS)}"}, status=400)
+        return export_response(quotations, fmt, filename, request)
+    
+    @action(detail=True, methods=['get'])
+    def export(self, request, pk=None):
+        """Stream one quotation's BOQ lines, transport costs and payment schedule"""
+        quotation = self.get_object()
+        return self._export(request, Quotation.objects.filter(pk=quotation.pk), quotation.quotation_id)
+    
+    @action(detail=False, methods=['get'], url_path='export')
+    def export_all(self, request):
+        """Stream all the user's quotations, optionally for one project and a created date range"""
+        quotations = Quotation.objects.filter(project__user=request.user)
+        
+        project = request.query_params.get('project')
+        if project:
+            quotations = quotations.filter(project__project_id=project)
+        
+        for param, lookup in (('created_after', 'created_at__date__gte'), ('created_before', 'created_at__date__lte')):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    day = parse_date(value)
+                except ValueError:
+                    day = None
+                if day is None:
+                    return Response({'error': f'{param} must be a YYYY-MM-DD date'}, status=400)
+                quotations = quotations.filter(**{lookup: day})
+        
+        return self._export(request, quotations, f"quotations-{timezone.now():%Y%m%d}")
+    
+    @action(detail=True, methods=['get'])
+    def reprice(self, request, pk=None):
+        """Reprice the quotation's lines from the price history as of ``as_of`` (default today)"""
+        quotation = self.get_object()
+        value = request.query_params.get('as_of')
+        try:
+            as_of = parse_date(value) if value else timezone.localdate()
+        except ValueError:
+            as_of = None
+        if as_of is None:
+            return Response({'error': 'as_of must be a YYYY-MM-DD date'}, status=400)
+        return Response(reprice_quotation(quotation, as_of))
+    
+    @action(detail=True, methods=['get'], url_path='supplier-comparison')
+    def supplier_comparison(self, request, pk=None):
+        """Every line priced against every eligible supplier, with full and mixed baskets
+        
+        A comma-separated ``suppliers`` list replaces the nearest suppliers per category.
+        """
+        quotation = self.get_object()
+        supplier_ids = request.query_params.get('suppliers')
+        if supplier_ids is not None:
+            supplier_ids = [s.strip() for s in supplier_ids.split(',') if s.strip()]
+        return Response(compare_quotation_suppliers(quotation, supplier_ids=supplier_ids))
+    
+    @action(detail=True, methods=['get', 'post'])
+    def revisions(self, request, pk=None):
+        """List the quotation's revisions, or record its current state as a new one (POST, optional note)"""
+        quotation = self.get_object()
+        if request.method == 'POST':
+            revision, created = record_revision(
+                quotation, note=str(request.data.get('note', '')), user=request.user
+            )
+            return Response(revision_summary(revision), status=201 if created else 200)
+        
+        revisions = quotation.revisions.select_related('created_by').order_by('number')
+        return Response([revision_summary(revision) for revision in revisions])
+    
+    @action(detail=True, methods=['get'], url_path=r'revisions/(?P<number>\d+)')
+    def revision(self, request, pk=None, number=None):
+        """Full state of one revision, rebuilt from its nearest checkpoint"""
+        quotation = self.get_object()
+        try:
+            state = materialize_revision(quotation, int(number))
+        except QuotationRevision.DoesNotExist:
+            return Response({'error': 'Revision not found'}, status=404)
+        return Response({'number': int(number), **state})
+    
+    @action(detail=True, methods=['get'], url_path='revisions/diff')
+    def revision_diff(self, request, pk=None):
+        """Totals and lines that differ between revisions ``from`` and ``to``"""
+        quotation = self.get_object()
+        try:
+            first, second = int(request.query_params['from']), int(request.query_params['to'])
+        except (KeyError, ValueError):
+            return Response({'error': 'from and to must be revision numbers'}, status=400)
+        try:
+            return Response(diff_revisions(quotation, first, second))
+        except QuotationRevision.DoesNotExist:
+            return Response({'error': 'Revision not found'}, status=404)
+    
+    @action(detail=False, methods=['get'])
+    def variance(self, request):
+        """Quoted against revised unit rates and totals of the user's quotations over time
+        
+        ``by`` is category, location or supplier and ``period`` week, month, quarter
+        or year; ``start``/``end`` dates and a comma-separated ``status`` narrow it.
+        """
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            if value:
+                try:
+                    dates[param] = parse_date(value)
+                except ValueError:
+                    dates[param] = None
+                if dates[param] is None:
+                    return Response({'error': f'{param} must be a YYYY-MM-DD date'}, status=400)
+        statuses = [s.strip() for s in request.query_params.get('status', '').split(',') if s.strip()]
+        
+        try:
+            return Response(variance_analysis(
+                request.user,
+                by=request.query_params.get('by', 'category'),
+                period=request.query_params.get('period', 'month'),
+                statuses=statuses,
+                **dates
+            ))
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
+    
+    @action(detail=False, methods=['get'], url_path='route-plan')
+    def route_plan(self, request):
+        """Plan shared multi-drop truck routes for the deliveries of the user's quotations
+        
+        Defaults to accepted quotations; ``status``, ``project`` and a comma-separated
+        ``quotations`` list narrow the selection and ``max_route_km`` caps a route.
+        """
+        quotations = Quotation.objects.filter(
+            project__user=request.user, status=request.query_params.get('status', 'accepted')
+        )
+        
+        project = request.query_params.get('project')
+        if project:
+            quotations = quotations.filter(project__project_id=project)
+        quotation_ids = request.query_params.get('quotations')
+        if quotation_ids:
+            quotations = quotations.filter(quotation_id__in=[q.strip() for q in quotation_ids.split(',') if q.strip()])
+        
+        max_route_km = request.query_params.get('max_route_km')
+        if max_route_km is not None:
+            try:
+                max_route_km = float(max_route_km)
+            except ValueError:
+                max_route_km = -1.0
+            if not max_route_km > 0:
+                return Response({'error': 'max_route_km must be a positive number'}, status=400)
+        
+        return Response(plan_delivery_routes(quotations, max_route_km=max_route_km))
     
     @action(detail=False, methods=['post'])
     def generate(self, request):
@@ -231,65 +410,45 @@ class QuotationViewSet(viewsets.ModelViewSet):
     def update_item(self, request, pk=None):
         """Update individual quotation item"""
         quotation = self.get_object()
-        item_id = request.data.get('item_id')
+        change = {field: request.data[field] for field in EDITABLE_ITEM_FIELDS if field in request.data}
+        change['item_id'] = request.data.get('item_id')
         
         try:
-            item = QuotationItem.objects.get(id=item_id, quotation=quotation)
-            
-            # Update item fields
-            for field in ['quantity', 'unit_rate', 'description']:
-                if field in request.data:
-                    setattr(item, field, request.data[field])
-            
-            # Recalculate total
-            item.total = item.quantity * item.unit_rate
-            item.save()
-            
-            # Recalculate quotation totals
-            subtotal = sum(item.total for item in quotation.items.all())
-            transport_total = sum(tc.total_transport_cost for tc in quotation.transport_costs.all())
-            tax_amount = (subtotal + transport_total) * quotation.tax_rate
-            
-            quotation.subtotal = subtotal
-            quotation.transport_total = transport_total
-            quotation.tax_amount = tax_amount
-            quotation.total_amount = subtotal + transport_total + tax_amount
-            quotation.save()
-            
-            serializer = self.get_serializer(quotation)
-            return Response(serializer.data)
-            
+            apply_item_changes(quotation, updates=[change])
         except QuotationItem.DoesNotExist:
             return Response({'error': 'Item not found'}, status=404)
+        except (TypeError, ValueError):
+            return Response({'error': 'item_id, quantity and unit_rate must be numbers within range'}, status=400)
+        
+        return self._detail_response(quotation)
     
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         """Add new item to quotation"""
         quotation = self.get_object()
         
-        item = QuotationItem.objects.create(
-            quotation=quotation,
-            item_code=request.data.get('item_code', f'CUSTOM{QuotationItem.objects.filter(quotation=quotation).count() + 1}'),
-            description=request.data.get('description', ''),
-            category=request.data.get('category', 'custom'),
-            unit=request.data.get('unit', 'pcs'),
-            quantity=request.data.get('quantity', 1),
-            unit_rate=request.data.get('unit_rate', 0),
-            total=request.data.get('quantity', 1) * request.data.get('unit_rate', 0)
-        )
+        try:
+            apply_item_changes(quotation, additions=[request.data])
+        except (TypeError, ValueError):
+            return Response({'error': 'quantity and unit_rate must be numbers within range'}, status=400)
         
-        # Recalculate quotation totals
-        subtotal = sum(item.total for item in quotation.items.all())
-        transport_total = quotation.transport_total
-        tax_amount = (subtotal + transport_total) * quotation.tax_rate
+        return self._detail_response(quotation)
+    
+    @action(detail=True, methods=['post'])
+    def batch_update_items(self, request, pk=None):
+        """Apply many line edits ('items') and additions ('new_items') in one transaction"""
+        quotation = self.get_object()
         
-        quotation.subtotal = subtotal
-        quotation.tax_amount = tax_amount
-        quotation.total_amount = subtotal + transport_total + tax_amount
-        quotation.save()
+        try:
+            apply_item_changes(
+                quotation,
+                updates=request.data.get('items', []),
+                additions=request.data.get('new_items', [])
+            )
+        except (QuotationItem.DoesNotExist, KeyError, TypeError, ValueError):
+            return Response({'error': 'Invalid or unknown item in batch'}, status=400)
         
-        serializer = self.get_serializer(quotation)
-        return Response(serializer.data)
+        return self._detail_response(quotation)
 
 class BimModelViewSet(viewsets.ModelViewSet):
     queryset = BimModel.objects.all()
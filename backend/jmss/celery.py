@@ -0,0 +1,23 @@
+"""
+Celery application for jmss.
+"""
+
+import os
+from celery import Celery
+from celery.signals import worker_init
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'jmss.settings.development')
+
+app = Celery('jmss')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks(['jmss.apps.core'])
+
+
+@worker_init.connect
+def preload_ai_engines(**kwargs):
+    """Build the configured engines in the worker master before the pool forks"""
+    from django.conf import settings
+
+    if settings.AI_PRELOAD_ENGINES:
+        from jmss.apps.core.engines import preload_engines
+        preload_engines()
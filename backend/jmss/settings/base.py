@@ -49,6 +49,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'jmss.apps.core.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -149,6 +150,31 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Set CELERY_TASK_ALWAYS_EAGER=True (with CELERY_BROKER_URL=memory://) to run tasks inline, e.g. in tests
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = True
+CELERY_TASK_ACKS_LATE = True
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Quotation tasks run on their own queue so its workers scale separately:
+#   celery -A jmss worker -Q quotations
+CELERY_TASK_ROUTES = {
+    'jmss.apps.core.tasks.generate_quotation_task': {'queue': 'quotations'},
+    'jmss.apps.core.tasks.reconcile_quotation_totals_task': {'queue': 'quotations'},
+}
+CELERY_BEAT_SCHEDULE = {
+    'reconcile-quotation-totals': {
+        'task': 'jmss.apps.core.tasks.reconcile_quotation_totals_task',
+        'schedule': 60 * 60,  # hourly
+    },
+}
+
+# Channels (websocket push for job progress)
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': 'channels_redis.core.RedisChannelLayer',
+        'CONFIG': {'hosts': [os.environ.get('REDIS_URL', 'redis://localhost:6379/0')]},
+    }
+}
 
 # AI Model Configuration
 AI_MODELS = {
@@ -164,6 +190,73 @@ AI_MODELS = {
     }
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://localhost:6379/0'),
+    }
+}
+
+# Quotation result cache and request coalescing (see apps/core/cache.py)
+QUOTATION_CACHE = {
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60,  # engine results
+    'DEDUP_WINDOW': 30,  # identical generate requests without an Idempotency-Key
+    'IDEMPOTENCY_TTL': 24 * 60 * 60,
+    'LOCK_TIMEOUT': 120,
+}
+
+# Threads per process that run AI engine work for async consumers and views.
+# This caps concurrent engine calls per ASGI worker; admitted requests queue on the pool.
+AI_ENGINE_WORKERS = int(os.environ.get('AI_ENGINE_WORKERS', 2))
+# Engines a gunicorn/Celery master builds before forking so workers share them
+# copy-on-write, e.g. "quotation,design" (empty: each worker loads on first use)
+AI_PRELOAD_ENGINES = [name for name in os.environ.get('AI_PRELOAD_ENGINES', '').split(',') if name]
+# Upper bound on design options a single websocket request may ask for
+DESIGN_MAX_VARIATIONS = 12
+
+# Engine admission control: concurrency and timeouts come from each engine's
+# config.json `deployment` section; these bound the wait queue in front of it
+AI_ADMISSION = {
+    'QUEUE_SIZE': int(os.environ.get('AI_ADMISSION_QUEUE_SIZE', 8)),
+    'QUEUE_TIMEOUT': 2.0,  # seconds a queued request waits before a 503
+    'RETRY_AFTER': 5,  # seconds
+}
+
+# Quotation engine: price catalog comes from the engine's config files ('files')
+# or from the Material/MaterialItem tables ('database'), re-checked every interval
+QUOTATION_ENGINE = {
+    'CATALOG_SOURCE': os.environ.get('QUOTATION_CATALOG_SOURCE', 'files'),
+    'CATALOG_RELOAD_INTERVAL': 30,  # seconds
+}
+
+# Delta-encoded quotation revisions (see apps/core/revisions.py)
+QUOTATION_REVISIONS = {
+    'CHECKPOINT_INTERVAL': 10,  # every 10th revision stores the full state
+}
+
+# Quoted vs revised rate analytics (see apps/core/analytics.py), cached per period
+VARIANCE_ANALYSIS = {
+    'ALIAS': 'default',
+    'TIMEOUT': 24 * 60 * 60,  # closed periods
+    'OPEN_PERIOD_TIMEOUT': 5 * 60,  # the period still taking quotations
+}
+
+# Prometheus metrics for the AI pipelines, scraped from /metrics. Under gunicorn
+# set PROMETHEUS_MULTIPROC_DIR so the endpoint aggregates every worker.
+METRICS = {
+    'ENABLED': os.environ.get('METRICS_ENABLED', 'False') == 'True',
+}
+
+# Sampling profiles of the AI endpoints, stored under profiles/ and summarised
+# with `manage.py profile_report`. Staff can force one with the X-Profile-Request header.
+PROFILING = {
+    'SAMPLE_RATE': float(os.environ.get('PROFILING_SAMPLE_RATE', 0.0)),
+    'INTERVAL': 0.005,  # seconds between stack samples
+    'DIRECTORY': BASE_DIR / 'profiles',
+}
+
 # File Upload Settings
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024  # 10MB
@@ -1,4 +1,6 @@
 
+import os
+
 from .base import *
 
 DEBUG = True
@@ -13,6 +15,9 @@ DATABASES = {
     }
 }
 
+# daphne's runserver serves the ASGI application (async views and websockets)
+INSTALLED_APPS = ['daphne'] + INSTALLED_APPS
+
 # Development CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
@@ -43,9 +48,18 @@ AI_MODELS.update({
 LOGGING['handlers']['console']['level'] = 'DEBUG'
 LOGGING['loggers']['jmss']['level'] = 'DEBUG'
 
-# Cache (Redis not required in development)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Cache and channel layer: in-process unless REDIS_URL is set. The Celery
+# workers are separate processes, so docker-compose sets REDIS_URL for every
+# service and they share the Redis cache and channel layer from base.py.
+if not os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+        }
     }
-}
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+"""
+Benchmark engine import cost and preload-then-fork memory sharing.
+
+Import: each scenario runs in a fresh interpreter and reports wall time and
+peak RSS for Django setup plus the core app, then with the quotation engine
+package (what every process paid when it was imported eagerly), then with the
+design engine's torch stack as well.
+
+Sharing (Linux): a parent forks workers that each serve one quotation and one
+design, once with every worker building its own engines and once with the
+engines preloaded in the parent. Each worker reports its private memory and
+PSS from /proc/self/smaps_rollup.
+
+Usage (from backend/):
+    python scripts/bench_engine_import.py [--settings jmss.settings.development] [--repeat 3] [--workers 4]
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SCENARIOS = {
+    'core app (lazy engines)': '',
+    '+ quotation engine': (
+        'from jmss.apps.core import engines; engines._ensure_ai_models_path(); '
+        'import quotation_engine.quotation_ai'
+    ),
+    '+ design engine (torch)': (
+        'from jmss.apps.core import engines; engines._ensure_ai_models_path(); '
+        'import quotation_engine.quotation_ai, generative_design.inference'
+    ),
+}
+
+IMPORT_PROBE = '''
+import json, resource, time
+start = time.perf_counter()
+import django
+django.setup()
+import jmss.urls, jmss.apps.core.views, jmss.apps.core.async_views, jmss.apps.core.tasks
+{extra}
+print(json.dumps({{
+    'seconds': time.perf_counter() - start,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'numpy': 'numpy' in __import__('sys').modules,
+    'torch': 'torch' in __import__('sys').modules,
+}}))
+'''
+
+SAMPLE_SPECS = {'name': 'Bench', 'location': 'nairobi', 'building_area': 150, 'floors': 2, 'bedrooms': 4}
+
+
+def run_import_probe(settings_module, extra):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    output = subprocess.run(
+        [sys.executable, '-c', IMPORT_PROBE.format(extra=extra)],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def bench_imports(settings_module, repeat):
+    print(f"Import cost (median of {repeat} fresh interpreters)")
+    print(f"{'scenario':<28} {'seconds':>8} {'peak RSS MB':>12}  heavy modules")
+    for name, extra in IMPORT_SCENARIOS.items():
+        runs = [run_import_probe(settings_module, extra) for _ in range(repeat)]
+        loaded = [module for module in ('numpy', 'torch') if runs[0][module]]
+        print(
+            f"{name:<28} {statistics.median(r['seconds'] for r in runs):>8.2f} "
+            f"{statistics.median(r['rss_mb'] for r in runs):>12.1f}  {', '.join(loaded) or '-'}"
+        )
+
+
+def smaps_rollup():
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) / 1024
+    return fields
+
+
+def serve_once():
+    from jmss.apps.core import engines
+
+    engines.get_quotation_engine().generate_detailed_quotation(SAMPLE_SPECS)
+    engines.get_design_engine().generate_design({'bedrooms': 3}, num_variations=2)
+
+
+def bench_sharing(workers, preload):
+    from jmss.apps.core import engines
+
+    if preload:
+        engines.preload_engines(['quotation', 'design'])
+
+    pipes = []
+    for _ in range(workers):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            serve_once()
+            memory = smaps_rollup()
+            os.write(write_fd, json.dumps({
+                'private_mb': memory.get('Private_Clean', 0) + memory.get('Private_Dirty', 0),
+                'pss_mb': memory.get('Pss', 0),
+            }).encode())
+            os._exit(0)
+        os.close(write_fd)
+        pipes.append((pid, read_fd))
+
+    results = []
+    for pid, read_fd in pipes:
+        with os.fdopen(read_fd) as f:
+            results.append(json.loads(f.read()))
+        os.waitpid(pid, 0)
+    return results
+
+
+def run_sharing(settings_module, workers):
+    print(f"\nWorker memory after serving one quotation and one design ({workers} forked workers)")
+    print(f"{'mode':<28} {'private MB/worker':>18} {'PSS MB/worker':>14}")
+    for preload in (False, True):
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+        code = (
+            'import django, json, sys; django.setup(); '
+            'sys.path.insert(0, "scripts"); import bench_engine_import as bench; '
+            f'print(json.dumps(bench.bench_sharing({workers}, {preload})))'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        mode = 'preload in master' if preload else 'load per worker'
+        print(
+            f"{mode:<28} {statistics.mean(r['private_mb'] for r in results):>18.1f} "
+            f"{statistics.mean(r['pss_mb'] for r in results):>14.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'jmss.settings.development'))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    bench_imports(args.settings, args.repeat)
+    if sys.platform.startswith('linux'):
+        run_sharing(args.settings, args.workers)
+
+
+if __name__ == '__main__':
+    main()